@@ -4,14 +4,13 @@
 """Postprocessing and analysis of data collected from the placement study
 
 """
-from functools import reduce
-
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import r2_score, mean_squared_error
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 import preprocessing_utils as proc_utils
+import io_utils
 import os
 
 
@@ -62,10 +61,11 @@ def main():
             # We are parsing the files based on the way that StretchSense data is reported from
             # their proprietary iOS Bluetooth application Columns are named manually based on
             # where each soft robotic sensor (SRS) SRS was positioned during the experiment
-            ssColNames = ['Seq', 'Sample', 'Time', 'DF', 'EVR', 'PF', 'INV']
-            stretchSenseData = pd.read_csv(participantsPath + participantID + '/' + SSFilename, \
-                                            names=ssColNames, skiprows=1, \
-                                            usecols=list(range(len(ssColNames))))
+            ssColNames = {'Sequence': 'Seq', 'Sample Number': 'Sample', 'Sensor1': 'DF', \
+                          'Sensor2': 'EVR', 'Sensor3': 'PF', 'Sensor4': 'INV'}
+            stretchSenseData, _ = io_utils.read_stretchsense_csv(participantsPath + participantID + '/' + \
+                                                                 SSFilename, num_channels=4)
+            stretchSenseData = stretchSenseData.rename(columns=ssColNames)
 
             # Inversion and eversion sensors were mounted backwards for this particular participant
             if "P301" in SSFilename:
@@ -75,8 +75,8 @@ def main():
             # it can be assumed that they will have the same file index in their respective list
 
             MCFilename = SSFilename.replace('-','_').replace('.csv','.exp')
-            moCapData = pd.read_csv(participantsPath + participantID + '/' + MCFilename, \
-                                    sep="\t", skiprows=7, usecols=list(range(3)))
+            moCapData, _ = io_utils.read_motion_monitor_exp(participantsPath + participantID + '/' + \
+                                                            MCFilename)
             # Convert frames to milliseconds based on frame rate of 100Hz
             moCapData[['Time']] = moCapData[['Frame #']] / moCapHz
 
@@ -84,16 +84,8 @@ def main():
             # Since SRS data was collected at roughly 25 Hz, but samples were not recorded
             # at consistent intervals, the approximate function was used to predict SRS values
             # as if the data was collected at a stable rate that matches the motion capture rate
-            DF = proc_utils.approximateStretchSense(stretchSenseData, "DF", moCapHz)
-            PF = proc_utils.approximateStretchSense(stretchSenseData, "PF", moCapHz)
-
-            INV = proc_utils.approximateStretchSense(stretchSenseData, "INV", moCapHz)
-            EVR = proc_utils.approximateStretchSense(stretchSenseData, "EVR", moCapHz)
-
-            # Combine the preprocessed StretchSense data
-            framesToMerge = [DF, PF, INV, EVR]
-            SSMatched = reduce(lambda left,right: pd.merge(left,right, how='left', on='Time'),\
-                               framesToMerge)
+            SSMatched = proc_utils.resampleStretchSense(stretchSenseData, \
+                                                        ['DF', 'PF', 'INV', 'EVR'], moCapHz)
 
             # Preprocess and model data based on file name (i.e. What movement are we analyzing?)
             # The following operation extracts the movement from the file name
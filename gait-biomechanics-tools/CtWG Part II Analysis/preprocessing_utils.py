@@ -14,10 +14,12 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-from scipy import interpolate, signal
+from scipy import signal
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import scale
 
+from signal_utils import best_lag, interp_columns
+
 plt.style.use('ggplot')
 plt.rcParams["axes.labelsize"] = 10
 plt.rcParams["axes.titlesize"] = 14
@@ -27,11 +29,43 @@ cmap = LinearSegmentedColormap.from_list(
     colors=['blue','red']
 )
 
+def resampleStretchSense(SSData: pd.DataFrame, sensors: List[str], moCapHz: int) -> pd.DataFrame:
+    """Interpolate several StretchSense channels to desired rate at once.
+
+    Takes the data from StretchSense and interpolates the requested sensor columns based on
+    the sampling rate of the MoCap system, in one pass over all of them. The result shares a
+    single time column, so no merging on time stamps is needed.
+
+    Args:
+        SSData (pd.DataFrame): Stretch Sensor data
+        sensors (List[str]): Identifiers of the sensors to process
+        moCapHz (int): frequency of Motion Capture
+
+    Returns:
+        approximatedMovement (pd.DataFrame): Interpolated Stretch Sensor data, with a Time
+                                             column followed by one column per sensor
+    """
+
+    if not all(str == type(sensor) for sensor in sensors):
+        raise TypeError("Sensor parameters must be strings!")
+
+    # Determine time stamps using indexing and MoCap Recording Rate
+    newInput = np.arange(start = SSData["Time"].iloc[0],\
+                           stop = SSData["Time"].iloc[-1],\
+                           step = (1 / moCapHz))
+
+    approximatedValues = interp_columns(SSData["Time"].to_numpy(), SSData[sensors].to_numpy(), newInput)
+
+    approximatedMovement = pd.DataFrame(approximatedValues, columns = sensors)
+    approximatedMovement.insert(0, 'Time', newInput)
+
+    return approximatedMovement
+
 def approximateStretchSense(SSData: pd.DataFrame, sensor: str, moCapHz: int) -> pd.DataFrame:
     """Interpolate StretchSense values to desired rate.
     
     Takes the data from StretchSense and interpolates it based on the sampling rate of 
-    the MoCap system.
+    the MoCap system. Use resampleStretchSense to process several sensors.
     
     Args:
         SSData (pd.DataFrame): Stretch Sensor data
@@ -45,19 +79,7 @@ def approximateStretchSense(SSData: pd.DataFrame, sensor: str, moCapHz: int) ->
     if str != type(sensor):
         raise TypeError("Sensor parameter must be string!")
 
-    # Determine time stamps using indexing and MoCap Recording Rate
-    newInput = np.arange(start = SSData["Time"].iloc[0],\
-                           stop = SSData["Time"].iloc[-1],\
-                           step = (1 / moCapHz))
-
-    approximateSensorValue = interpolate.interp1d(list(SSData["Time"].values),\
-                                                  list(SSData[sensor].values),\
-                                                  fill_value='extrapolate')
-
-    data = {'Time': newInput, sensor: approximateSensorValue(newInput)}
-    approximatedMovement = pd.DataFrame(data, columns = ['Time', sensor])
-
-    return approximatedMovement
+    return resampleStretchSense(SSData, [sensor], moCapHz)
 
 def adjustForDelayAndCombine(SSData: pd.DataFrame, MCData: pd.DataFrame,\
                              SSMovementName: str, MCMovementName: str,\
@@ -293,13 +315,15 @@ def plotResiduals(combinedData: pd.DataFrame, model: LinearRegression, \
 
     return residualPlot
 
-def ccf(x : pd.Series, y : pd.Series) -> int:
+def ccf(x : pd.Series, y : pd.Series, max_lag: int = None) -> int:
     """Performs cross correlation on passed data.
 
-    Helper function which produces the same output as R's ccf() function.
+    Helper function which produces the same output as R's ccf() function. The
+    correlation is computed by FFT (see signal_utils.xcorr).
 
     Args:
         x, y (pd.Series): Numeric vector or time series
+        max_lag (int): Largest absolute lag to search, in samples (all lags if None)
     
     Returns:
         lag (int): lag index between input vectors
@@ -314,6 +338,5 @@ def ccf(x : pd.Series, y : pd.Series) -> int:
     x = (x - np.mean(x))
     y = (y - np.mean(y))
 
-    result = np.correlate(y, x, mode='full') / (np.std(x) * np.std(y) * arr_length)
-    lag = (len(x) - 1) - result.argmax()
+    lag, _ = best_lag(x, y, max_lag=max_lag)
     return lag
@@ -9,9 +9,9 @@ import os
 import glob
 import pandas as pd
 import numpy as np
-from scipy.signal import savgol_filter
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+
+from regression_utils import fit_linear
+from signal_utils import savgol_frame
 
 
 def main():
@@ -22,8 +22,11 @@ def main():
     participantsPath = os.getcwd() + "/../motionanalyzr/Sample Datasets/SRS Gait Study/"
     participantsFolders = os.listdir(participantsPath)
 
-    resultsTable = pd.DataFrame(columns=['Participant', 'Trial', 'Foot', 'Gait Cycle', \
-                                        'Movement', 'MAE', 'RMSE', 'AdjRsquared'])
+    # Gait cycle descriptions, summed StretchSense signals and joint angles, fit together below
+    gaitCycles = []
+    SSData = []
+    invData = []
+    flexData = []
 
     for participantID in participantsFolders:
         gaitCycleFiles = glob.glob(participantsPath + participantID + '/Gait Cycles/*.csv')
@@ -40,38 +43,10 @@ def main():
             invCol = cycleData.columns.to_list()[1]
             flexCol = cycleData.columns.to_list()[2]
 
-            cycleData[ssColumns] = cycleData[ssColumns].apply(lambda x : savgol_filter(x, 39, 3))
-            SSData = cycleData[ssColumns].sum(axis=1).to_frame()
-
-            invModel = LinearRegression().fit(SSData, cycleData[[invCol]])
-
-            invPredicted = invModel.predict(SSData)
-            modelVerification = pd.DataFrame({'Actual' : cycleData[invCol],\
-                                         'Predicted' : np.array(invPredicted).flatten()}, \
-                                         columns= ['Actual','Predicted'])
-            invModel_rmse = round(np.sqrt(mean_squared_error(\
-                                             modelVerification[['Actual']],\
-                                             modelVerification[['Predicted']])), 4)
-            invModel_mae = round(mean_absolute_error(\
-                                             modelVerification[['Actual']],\
-                                             modelVerification[['Predicted']]), 4)
-            invModel_adjR_2 = round(r2_score(modelVerification[['Actual']],\
-                                    modelVerification[['Predicted']]), 4)
-
-            flexModel = LinearRegression().fit(SSData, cycleData[[flexCol]])
-
-            flexPredicted = flexModel.predict(SSData)
-            modelVerification = pd.DataFrame({'Actual' : cycleData[flexCol],\
-                                         'Predicted' : np.array(flexPredicted).flatten()}, \
-                                         columns= ['Actual','Predicted'])
-            flexModel_rmse = round(np.sqrt(mean_squared_error(\
-                                             modelVerification[['Actual']],\
-                                             modelVerification[['Predicted']])), 4)
-            flexModel_mae = round(mean_absolute_error(\
-                                             modelVerification[['Actual']],\
-                                             modelVerification[['Predicted']]), 4)
-            flexModel_adjR_2 = round(r2_score(modelVerification[['Actual']],\
-                                    modelVerification[['Predicted']]), 4)
+            cycleData[ssColumns] = savgol_frame(cycleData[ssColumns], 39, 3)
+            SSData.append(cycleData[ssColumns].sum(axis=1).to_numpy())
+            invData.append(cycleData[invCol].to_numpy())
+            flexData.append(cycleData[flexCol].to_numpy())
 
             if "WALK" in trialName:
                 trialType = "Flat Surface (FS)"
@@ -81,25 +56,25 @@ def main():
             foot = trialName[-4:-2]
             gaitCycle = trialName[-1]
 
-            resultsTable = resultsTable.append({'Participant' : participantID,\
-                                                'Trial' : trialType,\
-                                                'Foot' : foot,\
-                                                'Gait Cycle' : gaitCycle,\
-                                                'Movement' : "Inversion",\
-                                                'RMSE' : invModel_rmse,\
-                                                'MAE' : invModel_mae,\
-                                                'AdjRsquared' : invModel_adjR_2},\
-                                                ignore_index=True)
-                                            
-            resultsTable = resultsTable.append({'Participant' : participantID,\
-                                                'Trial' : trialType,\
-                                                'Foot' : foot,\
-                                                'Gait Cycle' : gaitCycle,\
-                                                'Movement' : "Flexion",\
-                                                'RMSE' : flexModel_rmse,\
-                                                'MAE' : flexModel_mae,\
-                                                'AdjRsquared' : flexModel_adjR_2},\
-                                                ignore_index=True)
+            gaitCycles.append((participantID, trialType, foot, gaitCycle))
+
+    # Inversion models of all gait cycles, then flexion models, fit in one batch
+    models = fit_linear(SSData + SSData, invData + flexData)
+
+    resultsRows = []
+    for i, (participantID, trialType, foot, gaitCycle) in enumerate(gaitCycles):
+        for movement, model in [("Inversion", i), ("Flexion", len(gaitCycles) + i)]:
+            resultsRows.append({'Participant' : participantID,\
+                                'Trial' : trialType,\
+                                'Foot' : foot,\
+                                'Gait Cycle' : gaitCycle,\
+                                'Movement' : movement,\
+                                'RMSE' : round(models['rmse'][model], 4),\
+                                'MAE' : round(models['mae'][model], 4),\
+                                'AdjRsquared' : round(models['r2'][model], 4)})
+
+    resultsTable = pd.DataFrame(resultsRows, columns=['Participant', 'Trial', 'Foot', 'Gait Cycle', \
+                                                      'Movement', 'MAE', 'RMSE', 'AdjRsquared'])
     resultsTable.to_csv('./GaitResults.csv', index=False)
 
 if __name__ == "__main__":
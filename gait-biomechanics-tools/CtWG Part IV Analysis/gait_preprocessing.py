@@ -4,12 +4,11 @@
 """Gait study preprocessing file.
 
 """
-from functools import reduce
-
 import pandas as pd
 import os
 import glob
 import preprocessing_utils as proc_utils
+import io_utils
 from sklearn.preprocessing import scale
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -64,11 +63,6 @@ def main():
                 ["RightINV03.csv", "RT_INV03.exp"]]
     trialLookupTable = pd.DataFrame(lut_trial, columns=['StretchSenseName', 'MoCapName'])
 
-    ssColNames = ["Sequence", "Sample Number", "Time", "Sensor1", "Sensor2", "Sensor3", \
-                  "Sensor4", "Sensor5", "Sensor6", "Sensor7", "Sensor8", "Sensor9", \
-                  "Sensor10", "Sensor11", "Sensor12", "Sensor13", "Sensor14", "Sensor15", \
-                  "Sensor16", "Sensor17", "Sensor18", "Sensor19", "Sensor20"]
-
     for participantID in participantsFolders:
         SSFiles = glob.glob(participantsPath + participantID + '/StretchSense/*.csv')
 
@@ -83,20 +77,17 @@ def main():
 
         for SSFilename in SSFiles:
             
-            SS = pd.read_csv(SSFilename, skiprows=1, names=ssColNames, \
-                             usecols=list(range(len(ssColNames))))
-
-            # Trick to remove SPI channels that weren't recorded, i.e. have all zeroes
-            SS = SS.loc[:, (SS != 0).any(axis=0)]
+            # SPI channels that weren't recorded, i.e. have all zeroes, are left out while reading
+            SS, channels = io_utils.read_stretchsense_csv(SSFilename, drop_unused=True)
 
             # Conditional statement based on which Module was connected first
             # Right foot module connects first
-            if "Sensor1" in SS.columns:
+            if 1 in channels:
                 SS = SS.rename(columns={"Sensor1" : "SSRightPF", "Sensor2" : "SSRightINV",
                                         "Sensor3" : "SSRightDF", "Sensor4" : "SSRightEVR",
                                         "Sensor17" : "SSLeftPF", "Sensor18" : "SSLeftINV",
                                         "Sensor19" : "SSLeftDF", "Sensor20" : "SSLeftEVR"})
-            elif "Sensor11" in SS.columns:
+            elif 11 in channels:
                 SS = SS.rename(columns={"Sensor11" : "SSRightPF", "Sensor12" : "SSRightINV",
                                         "Sensor13" : "SSRightDF", "Sensor14" : "SSRightEVR",
                                         "Sensor7" : "SSLeftPF", "Sensor8" : "SSLeftINV",
@@ -117,10 +108,7 @@ def main():
             #trialName = trialLookupTable[trialLookupTable['StretchSenseName'] == fn[-1]]
             trialName = trialLookupTable.loc[trialLookupTable['StretchSenseName'] == fn[-1], 'MoCapName']
             MCFilename = path + "/" + fn[0] + "_" + trialName.iloc[0]
-            mcColNames = ['Frame #', 'L Foot Inversion', 'L Ankle Flexion', \
-                                     'R Foot Inversion', 'R Ankle Flexion']
-            MC = pd.read_csv(MCFilename, sep="\t", skiprows=9, names=mcColNames, \
-                             usecols=list(range(len(mcColNames))))
+            MC, _ = io_utils.read_motion_monitor_exp(MCFilename)
             
             # Convert frames to milliseconds based on frame rate of 200Hz
             MC[['Time']] = MC[['Frame #']] / moCapHz
@@ -130,27 +118,9 @@ def main():
             
             print("Processing: %s; %s" % (SSFilename.split('/')[-1], MCFilename.split('/')[-1]))
 
-            SSRightPF = proc_utils.approximateStretchSense(SS, "SSRightPF", moCapHz)
-            SSRightINV = proc_utils.approximateStretchSense(SS, "SSRightINV", moCapHz)
-            SSRightDF = proc_utils.approximateStretchSense(SS, "SSRightDF", moCapHz)
-            SSRightEVR = proc_utils.approximateStretchSense(SS, "SSRightEVR", moCapHz)
-
-            # Combine the preprocessed StretchSense data
-            framesToMerge = [SSRightPF, SSRightINV, SSRightDF, SSRightEVR]
-            rightFoot = reduce(lambda left,right: pd.merge(left,right, how='left', on='Time'),\
-                            framesToMerge)
-
-            SSLeftPF = proc_utils.approximateStretchSense(SS, "SSLeftPF", moCapHz)
-            SSLeftINV = proc_utils.approximateStretchSense(SS, "SSLeftINV", moCapHz)
-            SSLeftDF = proc_utils.approximateStretchSense(SS, "SSLeftDF", moCapHz)
-            SSLeftEVR = proc_utils.approximateStretchSense(SS, "SSLeftEVR", moCapHz)
-
-            # Combine the preprocessed StretchSense data
-            framesToMerge = [SSLeftPF, SSLeftINV, SSLeftDF, SSLeftEVR]
-            leftFoot = reduce(lambda left,right: pd.merge(left,right, how='left', on='Time'),\
-                            framesToMerge)
-
-            SS = rightFoot.merge(leftFoot, on='Time', how='left')
+            # Resample all StretchSense channels to the MoCap rate onto one shared time base
+            SS = proc_utils.resampleStretchSense(SS, ['SSRightPF', 'SSRightINV', 'SSRightDF', 'SSRightEVR',
+                                                      'SSLeftPF', 'SSLeftINV', 'SSLeftDF', 'SSLeftEVR'], moCapHz)
 
             # Line up feet separately
             leftSS = SS[['Time', 'SSLeftPF', 'SSLeftINV', 'SSLeftDF', 'SSLeftEVR']].copy()
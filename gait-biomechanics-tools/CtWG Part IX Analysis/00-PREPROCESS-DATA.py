@@ -8,7 +8,9 @@ import click
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.signal as sg
+
+from io_utils import read_lab_manager_export, read_motion_monitor_exp, write_trial
+from signal_utils import best_lag, resample_frames, savgol_frame
 
 # Input/Output Directories
 SRC_DATA_DIR = "../Sample Datasets/Part IX SRS Prototype Validation Study"
@@ -67,6 +69,7 @@ HOTFIX_TRIMS = {
 # Signal Processing Parameters
 ALIGN_WINDOW_LEN = pd.Timedelta(seconds=2.0)
 OUTPUT_SAMP_RATE_HZ = 125.0
+ALIGN_WINDOW_SAMPLES = int(ALIGN_WINDOW_LEN / pd.Timedelta(seconds=1.0 / OUTPUT_SAMP_RATE_HZ))  # Max. alignment lag
 
 
 # region PRE: Prepare Destination Directory #
@@ -122,20 +125,12 @@ for k in TRIALS.keys():
     MC_FILE = TRIALS[k]["MC_FILE"]
     click.echo(f"\n\nLoading {MC_FILE}... ", nl=False)
 
-    # Load metadata from file header
-    for i, line in enumerate(open(MC_FILE)):
-        if i == 2:  # Read recording timestamp
-            time_str = " ".join(line.split("\t")[1:3])
-            epoch = pd.to_datetime(time_str, format="%d-%m-%Y %H:%M:%S:%f")
-            epoch = pytz.timezone(MC_TIMEZONE).localize(epoch, is_dst=None).astimezone(pytz.UTC)
-        if i == 3:  # Read recording sampling rate
-            samp_rate_hz = float(line.split("\t")[0])
-            secs_per_samp = 1. / samp_rate_hz
-        if i == 4:  # Read recording data capture period
-            rec_time_s = float(line.split("\t")[0])
-
-    # Load file into pandas DataFrame and print basic info
-    df = pd.read_csv(MC_FILE, delimiter="\t", skiprows=9, header=0, usecols=lambda x: x in MC_COL_NAMES)
+    # Load file and metadata from its header into pandas DataFrame
+    df, metadata = read_motion_monitor_exp(MC_FILE, usecols=lambda x: x in MC_COL_NAMES)
+    epoch = pytz.timezone(MC_TIMEZONE).localize(metadata["timestamp"], is_dst=None).astimezone(pytz.UTC)
+    samp_rate_hz = metadata["sampling_rate_hz"]
+    secs_per_samp = 1. / samp_rate_hz
+    rec_time_s = metadata["capture_period_s"]
     click.echo("Done.\n")
 
     # 1: b: i: Use header data to generate DatetimeIndex
@@ -176,13 +171,12 @@ for k in TRIALS.keys():
     click.echo(f"\n\nLoading {SS_FILE}... ", nl=False)
 
     # Load file into pandas DataFrame
-    df = pd.read_csv(SS_FILE, header=0, index_col=0, date_parser=lambda x: pd.to_datetime(x, unit="us", utc=True))
+    df = read_lab_manager_export(SS_FILE)
     click.echo("Done.\n")
 
     # 1: c: i: Interpolate to reconcile offset indicies
     click.echo(f"1: c: i: Interpolate to reconcile offset indicies... ", nl=False)
-    new_idx = pd.date_range(df.index.min(), df.index.max(), freq=f"{1000./OUTPUT_SAMP_RATE_HZ}ms", name="Time")
-    df = df.reindex(df.index.union(new_idx)).interpolate("cubic").reindex(new_idx)
+    df = resample_frames([df], OUTPUT_SAMP_RATE_HZ)
     click.echo("Done.\n")
 
     # 1: c: ii: Round values
@@ -242,17 +236,13 @@ for k in TRIALS.keys():
 click.echo("1: d: Combine MC and SS data to single DataFrame.")
 for k in TRIALS.keys():
     click.echo(f"Combining MC and SS data for trial {k}... ", nl=False)
-    df = pd.merge(TRIALS[k]["MC_DATA"], TRIALS[k]["SS_DATA"], how="outer", left_index=True, right_index=True)
+
+    # 1: d: i: Interpolate both onto one time base to reconcile offset indicies (no outer merge needed)
+    df = resample_frames([TRIALS[k]["MC_DATA"], TRIALS[k]["SS_DATA"]], OUTPUT_SAMP_RATE_HZ)
     click.echo("Done.\n")
 
     df.info()
 
-    # 1: d: i: Interpolate to reconcile offset indicies
-    click.echo(f"1: d: i: Interpolate to reconcile offset indicies... ", nl=False)
-    new_idx = pd.date_range(df.index.min(), df.index.max(), freq=f"{1000./OUTPUT_SAMP_RATE_HZ}ms", name="Time")
-    df = df.reindex(df.index.union(new_idx)).interpolate("cubic").reindex(new_idx)
-    click.echo("Done.\n")
-
     TRIALS[k]["MC_SS_DATA"] = df
 
 # endregion #
@@ -262,11 +252,7 @@ for k in TRIALS.keys():
 
 for k in TRIALS.keys():
     click.echo(f"\n2: Aligning MC and SS data for trial {k}.")
-    mc_ss_data = TRIALS[k]["MC_SS_DATA"].copy()
-
-    for column in mc_ss_data:
-        # Low-pass each series
-        mc_ss_data[column] = sg.savgol_filter(mc_ss_data[column], 51, 3)
+    mc_ss_data = savgol_frame(TRIALS[k]["MC_SS_DATA"], 51, 3)  # Low-pass each series
     
     mc_flx = mc_ss_data["R_FLX"]
     mc_iev = mc_ss_data["R_IEV"]
@@ -321,17 +307,17 @@ for k in TRIALS.keys():
         # plt.show()
         # plt.close()
 
-    flx_xcorr = np.correlate(mc_flx.fillna(value=0.0), ss_flx.fillna(value=0.0), mode="full")
-    iev_xcorr = np.correlate(mc_iev.fillna(value=0.0), ss_iev.fillna(value=0.0), mode="full")
-    flx_lag = np.argmax(flx_xcorr) - (len(flx_xcorr) // 2)
-    iev_lag = np.argmax(iev_xcorr) - (len(flx_xcorr) // 2)
+    # FLX and IEV in one batched call, searching lags within the alignment window only
+    (flx_lag, iev_lag), (flx_score, iev_score) = best_lag(
+        np.stack([mc_flx.fillna(value=0.0), mc_iev.fillna(value=0.0)]),
+        np.stack([ss_flx.fillna(value=0.0), ss_iev.fillna(value=0.0)]), max_lag=ALIGN_WINDOW_SAMPLES)
     flx_lag_ms = flx_lag * 8.0
     iev_lag_ms = iev_lag * 8.0
 
-    print(f"FLX Lag: {flx_lag} ({flx_lag_ms}ms), Score: {np.max(flx_xcorr)}")
-    print(f"IEV Lag: {iev_lag} ({iev_lag_ms}ms), Score: {np.max(iev_xcorr)}")
+    print(f"FLX Lag: {flx_lag} ({flx_lag_ms}ms), Score: {flx_score}")
+    print(f"IEV Lag: {iev_lag} ({iev_lag_ms}ms), Score: {iev_score}")
 
-    lag_ms = flx_lag if np.max(flx_xcorr) > np.max(iev_xcorr) else iev_lag
+    lag_ms = flx_lag if flx_score > iev_score else iev_lag
     TRIALS[k]["MC_SS_DATA"]["R_DFX"] = TRIALS[k]["MC_SS_DATA"]["R_DFX"].shift(lag_ms)
     TRIALS[k]["MC_SS_DATA"]["R_PFX"] = TRIALS[k]["MC_SS_DATA"]["R_PFX"].shift(lag_ms)
     TRIALS[k]["MC_SS_DATA"]["R_INV"] = TRIALS[k]["MC_SS_DATA"]["R_INV"].shift(lag_ms)
@@ -362,7 +348,7 @@ for k in TRIALS.keys():
     frame1 = plt.gca()
     frame1.axes.get_xaxis().set_visible(False)
 
-    if np.max(flx_xcorr) >= np.max(iev_xcorr):
+    if flx_score >= iev_score:
         plt.subplot(2, 2, 3, facecolor="#dddddd")
     else:
         plt.subplot(2, 2, 3)
@@ -374,7 +360,7 @@ for k in TRIALS.keys():
     frame1.axes.get_xaxis().set_visible(False)
 
 
-    if np.max(flx_xcorr) < np.max(iev_xcorr):
+    if flx_score < iev_score:
         plt.subplot(2, 2, 4, facecolor="#dddddd")
     else:
         plt.subplot(2, 2, 4)
@@ -444,17 +430,17 @@ for k in TRIALS.keys():
             # plt.show()
             # plt.close()
 
-        flx_xcorr = np.correlate(mc_flx.fillna(value=0.0), ss_flx.fillna(value=0.0), mode="full")
-        iev_xcorr = np.correlate(mc_iev.fillna(value=0.0), ss_iev.fillna(value=0.0), mode="full")
-        flx_lag = np.argmax(flx_xcorr) - (len(flx_xcorr) // 2)
-        iev_lag = np.argmax(iev_xcorr) - (len(flx_xcorr) // 2)
+        # FLX and IEV in one batched call, searching lags within the alignment window only
+        (flx_lag, iev_lag), (flx_score, iev_score) = best_lag(
+            np.stack([mc_flx.fillna(value=0.0), mc_iev.fillna(value=0.0)]),
+            np.stack([ss_flx.fillna(value=0.0), ss_iev.fillna(value=0.0)]), max_lag=ALIGN_WINDOW_SAMPLES)
         flx_lag_ms = flx_lag * 8.0
         iev_lag_ms = iev_lag * 8.0
 
-        print(f"FLX Lag: {flx_lag} ({flx_lag_ms}ms), Score: {np.max(flx_xcorr)}")
-        print(f"IEV Lag: {iev_lag} ({iev_lag_ms}ms), Score: {np.max(iev_xcorr)}")
+        print(f"FLX Lag: {flx_lag} ({flx_lag_ms}ms), Score: {flx_score}")
+        print(f"IEV Lag: {iev_lag} ({iev_lag_ms}ms), Score: {iev_score}")
 
-        lag_ms = flx_lag if np.max(flx_xcorr) > np.max(iev_xcorr) else iev_lag
+        lag_ms = flx_lag if flx_score > iev_score else iev_lag
         TRIALS[k]["MC_SS_DATA"]["L_DFX"] = TRIALS[k]["MC_SS_DATA"]["L_DFX"].shift(lag_ms)
         TRIALS[k]["MC_SS_DATA"]["L_PFX"] = TRIALS[k]["MC_SS_DATA"]["L_PFX"].shift(lag_ms)
         TRIALS[k]["MC_SS_DATA"]["L_INV"] = TRIALS[k]["MC_SS_DATA"]["L_INV"].shift(lag_ms)
@@ -485,7 +471,7 @@ for k in TRIALS.keys():
         frame1 = plt.gca()
         frame1.axes.get_xaxis().set_visible(False)
 
-        if np.max(flx_xcorr) >= np.max(iev_xcorr):
+        if flx_score >= iev_score:
             plt.subplot(2, 2, 3, facecolor="#dddddd")
         else:
             plt.subplot(2, 2, 3)
@@ -497,7 +483,7 @@ for k in TRIALS.keys():
         frame1.axes.get_xaxis().set_visible(False)
 
 
-        if np.max(flx_xcorr) < np.max(iev_xcorr):
+        if flx_score < iev_score:
             plt.subplot(2, 2, 4, facecolor="#dddddd")
         else:
             plt.subplot(2, 2, 4)
@@ -512,6 +498,7 @@ for k in TRIALS.keys():
         plt.close()
 
     TRIALS[k]["MC_SS_DATA"].to_csv(os.path.join(DEST_DATA_DIR, k + ".csv"))
+    write_trial(TRIALS[k]["MC_SS_DATA"], os.path.join(DEST_DATA_DIR, k))
         
 
 # endregion #
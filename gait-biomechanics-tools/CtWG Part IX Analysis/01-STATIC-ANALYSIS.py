@@ -9,10 +9,10 @@ import click
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.signal as sg
 
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error
+from io_utils import read_trial
+from regression_utils import fit_linear
+from signal_utils import savgol_frame
 
 SRC_DATA_DIR = "./00-PREPROCESSED-DATA"
 DEST_DATA_DIR = "./01-STATIC-ANALYSIS"
@@ -56,25 +56,27 @@ if len(existing_files) != 0:
 
 # region 1: Generate Linear Model #
 
+# Each trial is loaded and filtered once, and all trials are fit in one batch
+FIT_KEYS = list(itertools.product(PARTICIPANTS, CONFIGURATIONS, MOVEMENTS))
+X = []
+y = []
+for p, c, m in FIT_KEYS:
+    mc_ss_data = read_trial(os.path.join(SRC_DATA_DIR, f"{p}_{m}_{c}"))
+    mc_ss_data = savgol_frame(mc_ss_data, 15, 3)  # 15 Hz cutoff @ 125 Hz sampling rate
+    mc_ss_data.dropna(how="any", inplace=True)
+
+    X.append(mc_ss_data[MOVEMENT_MAP[m][0]].to_numpy())
+    y.append(mc_ss_data[MOVEMENT_MAP[m][1]].to_numpy())
+
+FIT_RESULTS = fit_linear(X, y)
+
 for p in PARTICIPANTS:
     for score in ["R^2", "RMSE"]:
         print(f"{p}\t\t", end="")
         for c in CONFIGURATIONS:
             for m in MOVEMENTS:
-                mc_ss_data = pd.read_csv(os.path.join(SRC_DATA_DIR, f"{p}_{m}_{c}.csv"), header=0, index_col=0, parse_dates=True)
-                mc_ss_data.dropna(how="any", inplace=True)
-
-                for column in mc_ss_data:
-                    mc_ss_data[column] = sg.savgol_filter(mc_ss_data[column], 15, 3)  # 15 Hz cutoff @ 125 Hz sampling rate
-
-                X = mc_ss_data[MOVEMENT_MAP[m][0]].to_numpy().reshape(-1, 1)
-                y = mc_ss_data[MOVEMENT_MAP[m][1]].to_numpy()
-                reg = LinearRegression().fit(X, y)
-
-                if score == "R^2":
-                    print(f"{reg.score(X, y)}\t", end="")
-                else:
-                    print(f"{mean_squared_error(y, reg.predict(X), squared=False)}\t", end="")
+                i = FIT_KEYS.index((p, c, m))
+                print(f"{FIT_RESULTS['r2' if score == 'R^2' else 'rmse'][i]}\t", end="")
 
                 # if reg.score(X, y) < 0.8:
                 #     plt.subplot(2,1,1)
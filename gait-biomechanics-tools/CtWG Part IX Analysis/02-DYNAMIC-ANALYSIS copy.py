@@ -9,10 +9,10 @@ import click
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.signal as sg
 
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, mean_absolute_error
+from io_utils import read_trial
+from regression_utils import fit_linear
+from signal_utils import savgol_frame
 
 SRC_DATA_DIR = "./00-PREPROCESSED-DATA"
 DEST_DATA_DIR = "./01-DYNAMIC-ANALYSIS"
@@ -46,40 +46,26 @@ if len(existing_files) != 0:
 # endregion #
 
 
-# region 1: Generate Linear Model #
-
-total = 0
-total_num = 0
-
-for p in PARTICIPANTS:
-    for c in CONFIGURATIONS:
-        for meas in ["L_FLX", "L_IEV", "R_FLX", "R_IEV"]:
-            X = None
-            y = None
-
-            for t in TRIALS:
-                mc_ss_data = pd.read_csv(os.path.join(SRC_DATA_DIR, f"{p}_{t}_{c}.csv"), header=0, index_col=0, parse_dates=True)
-                mc_ss_data.dropna(how="any", inplace=True)
-                mc_ss_data = mc_ss_data[:int(len(mc_ss_data)*0.85)]
-
-                for column in mc_ss_data:
-                    mc_ss_data[column] = sg.savgol_filter(mc_ss_data[column], 31, 3)  # 6.9 Hz cutoff @ 125 Hz sampling rate (L = 25)
-                
-                if X is None:
-                    X = mc_ss_data[MEAS_MAP[meas]].to_numpy()
-                else:
-                    X = np.append(X, mc_ss_data[MEAS_MAP[meas]].to_numpy(), axis=0)
-                
-                if y is None:
-                    y = mc_ss_data[meas].to_numpy()
-                else:
-                    y = np.append(y, mc_ss_data[meas].to_numpy(), axis=0)
-
-            reg = LinearRegression().fit(X, y)
-            adj_r2 = 1 - (1-reg.score(X, y))*(len(y)-1)/(len(y)-X.shape[1]-1)
-            total += adj_r2
-            total_num += 1
-
-print(f"AVG: {total / total_num}")
+# region 1: Load Trials #
+# Each trial is loaded, filtered and trimmed once, then pooled per participant, configuration and measurement below
+TRIAL_DATA = {}
+for p, t, c in itertools.product(PARTICIPANTS, TRIALS, CONFIGURATIONS):
+    mc_ss_data = read_trial(os.path.join(SRC_DATA_DIR, f"{p}_{t}_{c}"))
+    mc_ss_data = savgol_frame(mc_ss_data, 31, 3)  # 6.9 Hz cutoff @ 125 Hz sampling rate (L = 25)
+    mc_ss_data.dropna(how="any", inplace=True)
+    TRIAL_DATA[f"{p}_{t}_{c}"] = mc_ss_data[:int(len(mc_ss_data)*0.85)]
+# endregion #
+
+
+# region 2: Generate Linear Model #
+
+# One pooled fit per participant, configuration and measurement, all fit in one batch
+FIT_KEYS = list(itertools.product(PARTICIPANTS, CONFIGURATIONS, ["L_FLX", "L_IEV", "R_FLX", "R_IEV"]))
+FIT_RESULTS = fit_linear(
+    [np.concatenate([TRIAL_DATA[f"{p}_{t}_{c}"][MEAS_MAP[meas]].to_numpy() for t in TRIALS], axis=0)
+     for p, c, meas in FIT_KEYS],
+    [np.concatenate([TRIAL_DATA[f"{p}_{t}_{c}"][meas].to_numpy() for t in TRIALS], axis=0) for p, c, meas in FIT_KEYS])
+
+print(f"AVG: {np.mean(FIT_RESULTS['adj_r2'])}")
 
 # endregion #
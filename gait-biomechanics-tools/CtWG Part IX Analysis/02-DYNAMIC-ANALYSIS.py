@@ -2,6 +2,7 @@
 
 import glob
 import itertools
+import json
 import os
 import pytz
 
@@ -9,10 +10,10 @@ import click
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.signal as sg
 
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, mean_absolute_error
+from io_utils import read_trial
+from regression_utils import fit_linear
+from signal_utils import savgol_frame
 
 SRC_DATA_DIR = "./00-PREPROCESSED-DATA"
 DEST_DATA_DIR = "./01-DYNAMIC-ANALYSIS"
@@ -50,9 +51,34 @@ if len(existing_files) != 0:
 # endregion #
 
 
-# region 1: Generate Linear Model #
-total = 0
-total_num = 0
+# region 1: Load Trials #
+# Each trial is loaded, filtered and trimmed once; every fit below uses these copies
+TRIAL_DATA = {}
+for p, t, c in itertools.product(PARTICIPANTS, TRIALS, CONFIGURATIONS):
+    mc_ss_data = read_trial(os.path.join(SRC_DATA_DIR, f"{p}_{t}_{c}"))
+    mc_ss_data = savgol_frame(mc_ss_data, 27, 3)  # 6.9 Hz cutoff @ 125 Hz sampling rate (L = 25)
+    mc_ss_data.dropna(how="any", inplace=True)
+    TRIAL_DATA[f"{p}_{t}_{c}"] = mc_ss_data[:int(len(mc_ss_data)*0.85)]
+# endregion #
+
+
+# region 2: Generate Linear Model #
+calibrations = {}  # Fitted models per recording, exported for the lab manager's live calibrated channels
+fits = {}
+
+# All recordings and measurements are fit in one batch
+FIT_KEYS = list(itertools.product(TRIAL_DATA.keys(), ["L_FLX", "L_IEV", "R_FLX", "R_IEV"]))
+FIT_RESULTS = fit_linear([TRIAL_DATA[recording][MEAS_MAP[meas]].to_numpy() for recording, meas in FIT_KEYS],
+                         [TRIAL_DATA[recording][meas].to_numpy() for recording, meas in FIT_KEYS])
+
+for i, (recording, meas) in enumerate(FIT_KEYS):
+    calibrations.setdefault(recording, []).append({
+        "name": meas, "units": "deg", "inputs": MEAS_MAP[meas],
+        "coefficients": FIT_RESULTS["coef"][i].tolist(), "intercept": float(FIT_RESULTS["intercept"][i])})
+
+    fits[f"{recording}_{meas}"] = {"y": TRIAL_DATA[recording][meas].to_numpy(), "y_pred": FIT_RESULTS["y_pred"][i],
+                                    "R^2": FIT_RESULTS["adj_r2"][i], "RMSE": FIT_RESULTS["rmse"][i],
+                                    "MAE": FIT_RESULTS["mae"][i]}
 
 print("\t\t\tBarefoot\t\t\tShoe")
 print("Part.\tTrial\tScore\tL_FLX\tL_IEV\tR_FLX\tR_IEV\tL_FLX\tL_IEV\tR_FLX\tR_IEV")
@@ -63,41 +89,31 @@ for p in PARTICIPANTS:
 
             for c in CONFIGURATIONS:
                 for meas in ["L_FLX", "L_IEV", "R_FLX", "R_IEV"]:
-                    mc_ss_data = pd.read_csv(os.path.join(SRC_DATA_DIR, f"{p}_{t}_{c}.csv"), header=0, index_col=0, parse_dates=True)
-                    mc_ss_data.dropna(how="any", inplace=True)
-                    mc_ss_data = mc_ss_data[:int(len(mc_ss_data)*0.85)]
-
-                    for column in mc_ss_data:
-                        mc_ss_data[column] = sg.savgol_filter(mc_ss_data[column], 27, 3)  # 6.9 Hz cutoff @ 125 Hz sampling rate (L = 25)
-
-                    X = mc_ss_data[MEAS_MAP[meas]].to_numpy()
-                    y = mc_ss_data[meas].to_numpy()
-                    reg = LinearRegression().fit(X, y)
-
-                    if score == "R^2":
-                        #print(f"{reg.score(X, y)}\t", end="")
-                        adj_r2 = 1 - (1-reg.score(X, y))*(len(y)-1)/(len(y)-X.shape[1]-1)
-                        total += adj_r2
-                        total_num += 1
-                        print(f"{adj_r2}\t", end="")
-                        if adj_r2 < 0.5:
-                            plt.figure()
-                            plt.plot(y)
-                            plt.plot(reg.predict(X))
-                            plt.grid()
-                            plt.legend(["Ground Truth", "Estimation"])
-                            plt.xlabel("Time (samples)")
-                            plt.ylabel("Angle (degrees)")
-                            plt.title(f"{p}_{t}_{c} {meas}")
-                            plt.show()
-                            plt.close()
-                    elif score == "RMSE":
-                        print(f"{mean_squared_error(y, reg.predict(X), squared=False)}\t", end="")
-                    else:
-                        print(f"{mean_absolute_error(y, reg.predict(X))}\t", end="")
-
-            
+                    fit = fits[f"{p}_{t}_{c}_{meas}"]
+                    print(f"{fit[score]}\t", end="")
+
+                    if score == "R^2" and fit["R^2"] < 0.5:
+                        plt.figure()
+                        plt.plot(fit["y"])
+                        plt.plot(fit["y_pred"])
+                        plt.grid()
+                        plt.legend(["Ground Truth", "Estimation"])
+                        plt.xlabel("Time (samples)")
+                        plt.ylabel("Angle (degrees)")
+                        plt.title(f"{p}_{t}_{c} {meas}")
+                        plt.show()
+                        plt.close()
+
             print("\n", end="")
 
-print(f"AVG: {total / total_num}")
+print(f"AVG: {np.mean(FIT_RESULTS['adj_r2'])}")
+# endregion #
+
+
+# region 3: Export Calibration Files #
+click.echo(f"\n3: Writing {len(calibrations)} calibration files to {DEST_DATA_DIR}... ", nl=False)
+for recording, models in calibrations.items():
+    with open(os.path.join(DEST_DATA_DIR, f"{recording}_calibration.json"), "w") as calibration_file:
+        json.dump({"models": models}, calibration_file, indent=2)
+click.echo("Done.")
 # endregion #
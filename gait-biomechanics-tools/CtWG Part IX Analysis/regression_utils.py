@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+
+"""Ordinary least-squares fits of many small linear models at once.
+
+    The studies fit one model per trial, measurement, configuration or gait cycle, thousands of fits of a few hundred to
+    a few thousand samples each. fit_linear solves them together: the centered samples of all fits are stacked into one
+    zero-padded array, factored with one batched QR decomposition, and scored with array operations, giving the
+    coefficients and the R^2, adjusted R^2, RMSE and MAE of every fit without per-fit model objects or metric calls.
+    The results match sklearn.linear_model.LinearRegression and sklearn.metrics to round-off.
+
+    Copies of this file are kept next to the scripts that use it; edit the one in Utility Scripts and copy it over.
+"""
+
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+
+def fit_linear(X: Sequence[np.ndarray], y: Sequence[np.ndarray]) -> Dict[str, Union[np.ndarray, List[np.ndarray]]]:
+    """Fits y[i] ~ X[i] @ coef[i] + intercept[i] by least squares for every i, all at once.
+
+    Equivalent to LinearRegression().fit(X[i], y[i]) for each i, with the minimum-norm solution for rank-deficient X[i]
+    like sklearn's. The fits may have different numbers of samples but must have the same number of features.
+
+    Args:
+        X (Sequence[np.ndarray]): features of each fit, 1-D for a single feature or 2-D with one feature per column
+        y (Sequence[np.ndarray]): targets of each fit, 1-D, as many samples as the fit's features
+
+    Returns:
+        fits (dict): "coef" (fits x features), "intercept", "r2", "adj_r2", "rmse", "mae" and "n" (number of samples),
+            arrays with one value per fit, and "y_pred", the list of fitted values of each fit. r2 follows
+            sklearn.metrics.r2_score for constant targets (1.0 for a perfect fit, else 0.0); adj_r2 is NaN for fits
+            with no more samples than features + 1. With no fits, every array is empty (coef is 0 x 0), so callers
+            can report an empty result.
+    """
+    X = [np.asarray(x, dtype=float).reshape(len(x), -1) for x in X]
+    y = [np.asarray(target, dtype=float).ravel() for target in y]
+    if len(X) != len(y):
+        raise ValueError(f"{len(X)} feature sets for {len(y)} target sets.")
+    if len(X) == 0:
+        return {"coef": np.empty((0, 0)), "intercept": np.empty(0), "r2": np.empty(0), "adj_r2": np.empty(0),
+                "rmse": np.empty(0), "mae": np.empty(0), "n": np.empty(0, dtype=int), "y_pred": []}
+
+    num_features = X[0].shape[1]
+    n = np.array([len(target) for target in y])
+    for i, (x, target) in enumerate(zip(X, y)):
+        if x.shape != (len(target), num_features):
+            raise ValueError(f"Fit {i} has features of shape {x.shape} for {len(target)} targets; "
+                             f"{num_features} features expected.")
+        if len(target) == 0:
+            raise ValueError(f"Fit {i} has no samples.")
+
+    # Centering removes the intercept from the least-squares problem; zero rows pad the fits to one length and add
+    # nothing to any fit's sums
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    fit_of_row = np.repeat(np.arange(len(X)), n)
+    row_in_fit = np.arange(n.sum()) - starts[fit_of_row]
+    X_all = np.concatenate(X)
+    y_all = np.concatenate(y)
+    x_means = np.add.reduceat(X_all, starts, axis=0) / n[:, np.newaxis]
+    y_means = np.add.reduceat(y_all, starts) / n
+
+    X_stack = np.zeros((len(X), n.max(), num_features))
+    y_stack = np.zeros((len(X), n.max()))
+    X_stack[fit_of_row, row_in_fit] = X_all - x_means[fit_of_row]
+    y_stack[fit_of_row, row_in_fit] = y_all - y_means[fit_of_row]
+
+    # X = QR, so the minimum-norm solution is pinv(R) Q^T y
+    q, r = np.linalg.qr(X_stack)
+    coef = (np.linalg.pinv(r) @ (np.swapaxes(q, 1, 2) @ y_stack[..., np.newaxis]))[..., 0]
+    intercept = y_means - np.sum(x_means * coef, axis=1)
+
+    residuals = y_stack - (X_stack @ coef[..., np.newaxis])[..., 0]
+    ss_res = np.sum(residuals ** 2, axis=1)
+    ss_tot = np.sum(y_stack ** 2, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(ss_tot > 0, 1.0 - ss_res / ss_tot, np.where(ss_res > 0, 0.0, 1.0))
+        dof = n - num_features - 1
+        adj_r2 = np.where(dof > 0, 1.0 - (1.0 - r2) * (n - 1) / dof, np.nan)
+
+    return {
+        "coef": coef,
+        "intercept": intercept,
+        "r2": r2,
+        "adj_r2": adj_r2,
+        "rmse": np.sqrt(ss_res / n),
+        "mae": np.sum(np.abs(residuals), axis=1) / n,
+        "n": n,
+        "y_pred": np.split(np.sum(X_all * coef[fit_of_row], axis=1) + intercept[fit_of_row], starts[1:]),
+    }
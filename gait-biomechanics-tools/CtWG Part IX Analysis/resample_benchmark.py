@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""Equivalence and speed benchmark of signal_utils.resample_frames.
+
+    Resamples every trial of the Part IX dataset the way 00-PREPROCESS-DATA.py does (SS data on its own, then MC and SS
+    data together), once with the pandas union-reindex-interpolate("cubic") idiom the script used before and once with
+    resample_frames, and reports the time each took and how far their outputs are apart.
+
+    The pandas idiom fits its splines on absolute epoch nanoseconds as float64, whose resolution (256 ns) is coarser
+    than the spacing errors a spline tolerates well; resample_frames fits on times relative to the first sample. The
+    outputs therefore differ by up to about 1e-3 on some trials, and agree to round-off with a reference fit on relative
+    times, which is reported as well.
+
+    Typical usage example:
+    python resample_benchmark.py --trials 20 --output resample.json
+"""
+
+import glob
+import json
+import os
+import time
+
+import click
+import numpy as np
+import pandas as pd
+from scipy.interpolate import interp1d
+
+from io_utils import read_lab_manager_export, read_motion_monitor_exp
+from signal_utils import resample_frames
+
+SRC_DATA_DIR = "../Sample Datasets/Part IX SRS Prototype Validation Study"
+MC_COL_NAMES = {"L_Foot_Inversion": "L_IEV", "L_Foot_Flexion": "L_FLX",
+                "R_Foot_Inversion": "R_IEV", "R_Foot_Flexion": "R_FLX"}
+MC_TIMEZONE = "US/Central"
+OUTPUT_SAMP_RATE_HZ = 125.0
+
+
+def load_mc(mc_file: str) -> pd.DataFrame:
+    """Loads an MC file with a DatetimeIndex built from its header, as in 00-PREPROCESS-DATA.py."""
+    df, metadata = read_motion_monitor_exp(mc_file, usecols=lambda x: x in MC_COL_NAMES)
+    epoch = metadata["timestamp"].tz_localize(MC_TIMEZONE, ambiguous="raise").tz_convert("UTC")
+    secs_per_samp = 1. / metadata["sampling_rate_hz"]
+    rec_time_s = metadata["capture_period_s"]
+    df.index = pd.date_range(epoch, epoch + pd.Timedelta(seconds=rec_time_s), freq=f"{secs_per_samp}s", name="Time")
+    return df.rename(columns=MC_COL_NAMES).round(decimals=2)
+
+
+def legacy_resample(df: pd.DataFrame, rate_hz: float) -> pd.DataFrame:
+    """The resampling idiom previously used by the preprocessing scripts."""
+    new_idx = pd.date_range(df.index.min(), df.index.max(), freq=f"{1000. / rate_hz}ms", name="Time")
+    return df.reindex(df.index.union(new_idx)).interpolate("cubic").reindex(new_idx)
+
+
+def reference_resample(frames: list, new_idx: pd.DatetimeIndex) -> np.ndarray:
+    """Column by column cubic interp1d fit on times relative to the first output sample, the slow way."""
+    origin = new_idx.as_unit("ns").asi8[0]
+    t_new = (new_idx.as_unit("ns").asi8 - origin).astype(float)
+    columns = []
+    for frame in frames:
+        t = (frame.index.as_unit("ns").asi8 - origin).astype(float)
+        for col in frame.columns:
+            valid = frame[col].notna().to_numpy()
+            interpolator = interp1d(t[valid], frame[col].to_numpy()[valid], kind="cubic", bounds_error=False)
+            columns.append(interpolator(t_new))
+    return np.column_stack(columns)
+
+
+def max_abs_diff(a: np.ndarray, b: np.ndarray) -> float:
+    diff = np.abs(a - b)
+    return float(np.nanmax(diff)) if np.any(~np.isnan(diff)) else 0.0
+
+
+@click.command()
+@click.option("--data-dir", default=SRC_DATA_DIR, show_default=True, help="Part IX dataset directory.")
+@click.option("--trials", default=0, help="Number of trials to process (all if 0).")
+@click.option("--output", default=None, help="Write the results to this JSON file.")
+def main(data_dir: str, trials: int, output: str):
+    ss_files = sorted(glob.glob(os.path.join(data_dir, "*_SS")))
+    if trials > 0:
+        ss_files = ss_files[:trials]
+    if len(ss_files) == 0:
+        raise click.Abort(f"No trials found in {data_dir}.")
+
+    results = {"trials": 0, "legacy_s": 0.0, "engine_s": 0.0, "index_equal": True, "nan_masks_equal": True,
+               "max_abs_diff_ss": 0.0, "max_abs_diff_combined": 0.0, "max_abs_diff_reference": 0.0}
+    for ss_file in ss_files:
+        mc = load_mc(ss_file[:-3] + "_MC")
+        ss = read_lab_manager_export(ss_file)
+
+        start_s = time.perf_counter()
+        legacy_ss = legacy_resample(ss, OUTPUT_SAMP_RATE_HZ).round(decimals=2)
+        legacy = legacy_resample(pd.merge(mc, legacy_ss, how="outer", left_index=True, right_index=True),
+                                 OUTPUT_SAMP_RATE_HZ)
+        legacy_s = time.perf_counter() - start_s
+
+        start_s = time.perf_counter()
+        engine_ss = resample_frames([ss], OUTPUT_SAMP_RATE_HZ).round(decimals=2)
+        engine = resample_frames([mc, engine_ss], OUTPUT_SAMP_RATE_HZ)
+        engine_s = time.perf_counter() - start_s
+
+        results["trials"] += 1
+        results["legacy_s"] += legacy_s
+        results["engine_s"] += engine_s
+        results["index_equal"] &= bool(legacy.index.equals(engine.index) and legacy_ss.index.equals(engine_ss.index))
+        results["nan_masks_equal"] &= bool(np.array_equal(legacy.isna().to_numpy(), engine.isna().to_numpy()))
+        results["max_abs_diff_ss"] = max(results["max_abs_diff_ss"],
+                                         max_abs_diff(legacy_ss.to_numpy(), engine_ss.to_numpy()))
+        results["max_abs_diff_combined"] = max(results["max_abs_diff_combined"],
+                                               max_abs_diff(legacy.to_numpy(), engine.to_numpy()))
+        results["max_abs_diff_reference"] = max(results["max_abs_diff_reference"], max_abs_diff(
+            reference_resample([mc, engine_ss], engine.index), engine.to_numpy()))
+
+    results["speedup"] = results["legacy_s"] / results["engine_s"]
+    for key, value in results.items():
+        click.echo(f"{key:>24}: {value}")
+
+    if output is not None:
+        with open(output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
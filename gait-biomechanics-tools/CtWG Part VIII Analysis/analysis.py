@@ -9,10 +9,10 @@ import click
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.signal as sg
 
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, mean_absolute_error
+from io_utils import read_trial, trial_file
+from regression_utils import fit_linear
+from signal_utils import savgol_frame
 
 # Input/Output Directories
 SRC_DATA_DIR = "./AlanaDISDataPreprocessed"
@@ -21,22 +21,24 @@ SRC_DATA_DIR = "./AlanaDISDataPreprocessed"
 PARTICIPANTS = [f"P{'{:0>3}'.format(n)}" for n in range(1, 17)]  # P001 .. P016
 TRIALS = ["FLEX", "SQUAT", "WALK1", "WALK2", "WALK3", "WALK4", "WALK5", "WALK6"]
 
+# Recorded trials, all fit in one batch
+RECORDINGS = [f"{participant}_{trial}" for participant, trial in itertools.product(PARTICIPANTS, TRIALS)
+              if trial_file(os.path.join(SRC_DATA_DIR, f"{participant}_{trial}")) is not None]
+X = []
+y = []
+for recording in RECORDINGS:
+    df = read_trial(os.path.join(SRC_DATA_DIR, recording), usecols=["R_KNEE_FLX", "Channel 0"])
+    df = savgol_frame(df, 31, 3)
+    X.append(df["Channel 0"].to_numpy())
+    y.append(df["R_KNEE_FLX"].to_numpy())
+
+FIT_RESULTS = fit_linear(X, y)
+
 print("PARTICIPANT\tTRIAL\tR^2\tRMSE\tMAE")
 for participant, trial in itertools.product(PARTICIPANTS, TRIALS):
-    if not os.path.exists(os.path.join(SRC_DATA_DIR, f"{participant}_{trial}.csv")):
+    if f"{participant}_{trial}" not in RECORDINGS:
         print(f"{participant}\t{trial}\t-\t-\t-")
         continue
 
-    df = pd.read_csv(os.path.join(SRC_DATA_DIR, f"{participant}_{trial}.csv"), header=0, index_col=0, parse_dates=True)
-    for col in df:
-        df[col] = sg.savgol_filter(df[col], 31, 3)
-    
-    X = df["Channel 0"].to_numpy().reshape(-1, 1)
-    y = df["R_KNEE_FLX"].to_numpy()
-    reg = LinearRegression().fit(X, y)
-
-    r2_score = reg.score(X, y)
-    rmse_score = mean_squared_error(y, reg.predict(X), squared=False)
-    mae_score = mean_absolute_error(y, reg.predict(X))
-
-    print(f"{participant}\t{trial}\t{r2_score}\t{rmse_score}\t{mae_score}")
\ No newline at end of file
+    i = RECORDINGS.index(f"{participant}_{trial}")
+    print(f"{participant}\t{trial}\t{FIT_RESULTS['r2'][i]}\t{FIT_RESULTS['rmse'][i]}\t{FIT_RESULTS['mae'][i]}")
\ No newline at end of file
@@ -9,9 +9,10 @@ import click
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy.signal as sg
 
-from sklearn.linear_model import LinearRegression
+from io_utils import read_lab_manager_export, read_motion_monitor_exp, write_trial
+from regression_utils import fit_linear
+from signal_utils import best_lag, resample_frames, savgol_frame
 
 # Input/Output Directories
 SRC_DATA_DIR = "./AlanaDISData"
@@ -62,20 +63,11 @@ for participant, trial in itertools.product(PARTICIPANTS, TRIALS):
         click.echo(f"Missing {SS_FILE}. Skipping trial...")
         continue
 
-    # Load metadata from file header
-    for i, line in enumerate(open(MC_FILE)):
-        if i == 2:  # Read recording timestamp
-            time_str = " ".join(line.split("\t")[1:3])
-            epoch = pd.to_datetime(time_str, format="%d-%m-%Y %H:%M:%S:%f")
-            epoch = pytz.timezone(MC_TIMEZONE).localize(epoch, is_dst=None).astimezone(pytz.UTC)
-        if i == 3:  # Read recording sampling rate
-            samp_rate_hz = float(line.split("\t")[0])
-            secs_per_samp = 1. / samp_rate_hz
-        if i == 4:  # Read recording data capture period
-            rec_time_s = float(line.split("\t")[0])
-
-    # Load file into pandas DataFrame and print basic info
-    df = pd.read_csv(MC_FILE, delimiter="\t", skiprows=8, header=0, usecols=lambda x: x in MC_COL_NAMES)
+    # Load file and metadata from its header into pandas DataFrame
+    df, metadata = read_motion_monitor_exp(MC_FILE, usecols=lambda x: x in MC_COL_NAMES)
+    epoch = pytz.timezone(MC_TIMEZONE).localize(metadata["timestamp"], is_dst=None).astimezone(pytz.UTC)
+    secs_per_samp = 1. / metadata["sampling_rate_hz"]
+    rec_time_s = metadata["capture_period_s"]
     click.echo("Done.\n")
 
     # 1: b: i: Use header data to generate DatetimeIndex
@@ -92,7 +84,7 @@ for participant, trial in itertools.product(PARTICIPANTS, TRIALS):
     EXP_DATA[f"{participant}_{trial}"]["MOCAP"] = df
 
     # Load file into pandas DataFrame
-    df = pd.read_csv(SS_FILE, header=0, index_col=0, date_parser=lambda x: pd.to_datetime(x, unit="us", utc=True), usecols=lambda x: "0" in x)
+    df = read_lab_manager_export(SS_FILE, usecols=lambda x: "0" in x)
     click.echo("Done.\n")
 
     # 1: c: ii: Round values
@@ -104,15 +96,12 @@ for participant, trial in itertools.product(PARTICIPANTS, TRIALS):
 
 
 
-    df = pd.merge(EXP_DATA[f"{participant}_{trial}"]["MOCAP"], EXP_DATA[f"{participant}_{trial}"]["STRETCHSENSE"], how="outer", left_index=True, right_index=True)
-    new_idx = pd.date_range(df.index.min(), df.index.max(), freq=f"{1000./OUTPUT_SAMP_RATE_HZ}ms", name="Time")
-    df = df.reindex(df.index.union(new_idx)).interpolate("cubic").reindex(new_idx)
+    df = resample_frames([EXP_DATA[f"{participant}_{trial}"]["MOCAP"],
+                          EXP_DATA[f"{participant}_{trial}"]["STRETCHSENSE"]], OUTPUT_SAMP_RATE_HZ)
     EXP_DATA[f"{participant}_{trial}"] = df.copy()
 
     # Cross correlate
-    for column in df:
-        # Low-pass each series
-        df[column] = sg.savgol_filter(df[column], 51, 3)
+    df = savgol_frame(df, 51, 3)  # Low-pass each series
 
     mc_flx = df["R_KNEE_FLX"]  
     ss_flx = df["Channel 0"]
@@ -130,18 +119,16 @@ for participant, trial in itertools.product(PARTICIPANTS, TRIALS):
     mc_flx /= np.std(mc_flx)
     ss_flx /= np.std(ss_flx)
 
-    flx_xcorr = np.correlate(mc_flx.fillna(value=0.0), ss_flx.fillna(value=0.0), mode="full")
-    flx_lag = np.argmax(flx_xcorr) - (len(flx_xcorr) // 2)
+    flx_lag, _ = best_lag(mc_flx.fillna(value=0.0), ss_flx.fillna(value=0.0))
     flx_lag_ms = int(flx_lag * (1000. / OUTPUT_SAMP_RATE_HZ))
 
     EXP_DATA[f"{participant}_{trial}"]["Channel 0"] = EXP_DATA[f"{participant}_{trial}"]["Channel 0"].shift(flx_lag)
     EXP_DATA[f"{participant}_{trial}"].dropna(how="any", inplace=True)
 
-    X = EXP_DATA[f"{participant}_{trial}"]["Channel 0"].to_numpy().reshape(-1, 1)
+    X = EXP_DATA[f"{participant}_{trial}"]["Channel 0"].to_numpy()
     y = EXP_DATA[f"{participant}_{trial}"]["R_KNEE_FLX"].to_numpy()
-    reg = LinearRegression().fit(X, y)
 
-    if reg.score(X, y) < 0.9:
+    if fit_linear([X], [y])["r2"][0] < 0.9:
         plt.figure()
         plt.plot(EXP_DATA[f"{participant}_{trial}"]["R_KNEE_FLX"].reset_index(drop=True))
         plt.plot(EXP_DATA[f"{participant}_{trial}"]["Channel 0"].reset_index(drop=True))
@@ -156,6 +143,7 @@ for participant, trial in itertools.product(PARTICIPANTS, TRIALS):
             EXP_DATA[f"{participant}_{trial}"] = EXP_DATA[f"{participant}_{trial}"][:trimval]
 
     EXP_DATA[f"{participant}_{trial}"].to_csv(os.path.join(DEST_DATA_DIR, f"{participant}_{trial}" + ".csv"))
+    write_trial(EXP_DATA[f"{participant}_{trial}"], os.path.join(DEST_DATA_DIR, f"{participant}_{trial}"))
 
     # plt.figure()
 
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+
+"""Signal processing helpers shared by the analysis scripts.
+
+    Cross-correlation for aligning StretchSense and Motion Capture recordings. Correlations are computed with FFTs,
+    optionally only over a bounded window of lags, and several signal pairs can be correlated in one call.
+
+    Linear interpolation of several signals sharing a time base onto a new time base in one pass, for resampling
+    StretchSense recordings to the Motion Capture rate.
+
+    Cubic-spline resampling of recordings with DatetimeIndexes onto a common, regular time base. The spline is fit on
+    int64 nanosecond time stamps for all columns sharing the same valid samples at once, which gives the result of
+    pandas' union-reindex-interpolate("cubic") idiom without building the union index or merging recordings first.
+
+    Savitzky-Golay low-pass filtering of all columns of a recording at once, filtering each run of non-NaN samples on
+    its own so that NaN gaps and unequal column spans do not spread NaNs into the data or require dropping rows first.
+
+    Copies of this file are kept next to the scripts that use it; edit the one in Utility Scripts and copy it over.
+"""
+
+import functools
+from typing import List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy.fft import next_fast_len
+from scipy.interpolate import make_interp_spline
+from scipy.ndimage import correlate1d
+
+
+def xcorr(a: np.ndarray, v: np.ndarray, max_lag: Union[int, None] = None,
+          normalize: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Cross-correlates signals by FFT.
+
+    Equivalent to np.correlate(a, v, mode="full") restricted to the lags of interest, in O(n log n) instead of O(n^2).
+    The correlation at lag k is sum(a[n + k] * v[n]), so a positive lag means that a lags behind v; v.shift(k) lines v
+    up with a.
+
+    Args:
+        a, v (np.ndarray): signals, 1-D, or 2-D with one signal per row to correlate several pairs (row i of a with
+            row i of v) at once. NaNs must be removed or filled beforehand.
+        max_lag (int): largest absolute lag to compute, in samples. All lags are computed if None.
+        normalize (bool): divide by sqrt(sum(a ** 2) * sum(v ** 2)) of each pair, giving correlation coefficients for
+            zero-mean signals
+
+    Returns:
+        lags (np.ndarray): the lags, in samples, from most negative to most positive
+        corr (np.ndarray): the correlation at each lag, with one row per pair for 2-D input
+    """
+    a = np.asarray(a, dtype=float)
+    v = np.asarray(v, dtype=float)
+    n_a, n_v = a.shape[-1], v.shape[-1]
+
+    min_lag, top_lag = -(n_v - 1), n_a - 1
+    if max_lag is not None:
+        min_lag, top_lag = max(min_lag, -max_lag), min(top_lag, max_lag)
+    span = max(-min_lag, top_lag)
+
+    # Padding to the longer signal plus the largest lag keeps the circular correlation free of wrap-around
+    n_fft = next_fast_len(max(n_a, n_v) + span)
+    circular = np.fft.irfft(np.fft.rfft(a, n_fft) * np.conj(np.fft.rfft(v, n_fft)), n_fft)
+    corr = np.concatenate((circular[..., n_fft + min_lag:], circular[..., :top_lag + 1]), axis=-1) \
+        if min_lag < 0 else circular[..., min_lag:top_lag + 1]
+
+    if normalize:
+        scale = np.sqrt(np.sum(a ** 2, axis=-1) * np.sum(v ** 2, axis=-1))
+        corr = corr / np.where(scale > 0, scale, 1.0)[..., np.newaxis]
+
+    return np.arange(min_lag, top_lag + 1), corr
+
+
+def best_lag(a: np.ndarray, v: np.ndarray, max_lag: Union[int, None] = None,
+             normalize: bool = False) -> Tuple[Union[int, np.ndarray], Union[float, np.ndarray]]:
+    """Finds the lag of maximum cross-correlation of signals. See xcorr.
+
+    Args:
+        a, v (np.ndarray): signals, 1-D or 2-D with one pair per row
+        max_lag (int): largest absolute lag searched, in samples. All lags are searched if None.
+        normalize (bool): score with correlation coefficients instead of raw products
+
+    Returns:
+        lag (int or np.ndarray): lag of the maximum, per pair for 2-D input
+        score (float or np.ndarray): correlation at that lag, per pair for 2-D input
+    """
+    lags, corr = xcorr(a, v, max_lag=max_lag, normalize=normalize)
+    i_max = np.argmax(corr, axis=-1)
+    score = np.take_along_axis(corr, np.expand_dims(i_max, -1), axis=-1)[..., 0]
+    if corr.ndim == 1:
+        return int(lags[i_max]), float(score)
+    return lags[i_max], score
+
+
+def interp_columns(x: np.ndarray, y: np.ndarray, x_new: np.ndarray) -> np.ndarray:
+    """Linearly interpolates the columns of y, sampled at x, at x_new.
+
+    Equivalent to scipy.interpolate.interp1d(x, y, axis=0, fill_value="extrapolate")(x_new), but the bracketing
+    samples and weights are found once for all columns.
+
+    Args:
+        x (np.ndarray): sample times, 1-D; sorted here if they are not increasing
+        y (np.ndarray): samples, 1-D or 2-D with one signal per column
+        x_new (np.ndarray): times to interpolate at; values outside of x are extrapolated from the end segments
+
+    Returns:
+        y_new (np.ndarray): the interpolated samples, with one row per time of x_new
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_new = np.asarray(x_new, dtype=float)
+
+    if np.any(np.diff(x) < 0):
+        order = np.argsort(x, kind="stable")
+        x, y = x[order], y[order]
+
+    hi = np.clip(np.searchsorted(x, x_new), 1, len(x) - 1)
+    lo = hi - 1
+    weight = (x_new - x[lo]) / (x[hi] - x[lo])
+    if y.ndim > 1:
+        weight = weight[:, np.newaxis]
+    return y[lo] + weight * (y[hi] - y[lo])
+
+
+def resample_cubic(x: np.ndarray, y: np.ndarray, x_new: np.ndarray) -> np.ndarray:
+    """Interpolates the columns of y, sampled at x, at x_new with not-a-knot cubic splines.
+
+    Each column is fit through its non-NaN samples only, so NaN gaps are bridged by the spline, and is NaN at the times
+    of x_new outside the span of its non-NaN samples, as with pandas' interpolate("cubic"). Columns with the same NaN
+    pattern share one fit. Columns with fewer than 4 samples are all NaN.
+
+    Args:
+        x (np.ndarray): sample times in integer nanoseconds, 1-D and unique; sorted here if they are not increasing
+        y (np.ndarray): samples, 1-D, or 2-D with one signal per column
+        x_new (np.ndarray): times to interpolate at, in integer nanoseconds
+
+    Returns:
+        y_new (np.ndarray): the interpolated samples, with one row per time of x_new
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=float)
+    x_new = np.asarray(x_new, dtype=np.int64)
+    y_2d = y.reshape(len(x), -1)
+
+    if np.any(np.diff(x) < 0):
+        order = np.argsort(x, kind="stable")
+        x, y_2d = x[order], y_2d[order]
+
+    # Splines are fit in seconds from the first sample, where float64 keeps sub-nanosecond resolution
+    origin = x[0] if len(x) > 0 else 0
+    t = (x - origin) / 1.E9
+    t_new = (x_new - origin) / 1.E9
+
+    y_new = np.full((len(x_new), y_2d.shape[1]), np.nan)
+    valid = ~np.isnan(y_2d)
+    groups = {}
+    for col in range(y_2d.shape[1]):
+        groups.setdefault(np.packbits(valid[:, col]).tobytes(), []).append(col)
+
+    for cols in groups.values():
+        rows = valid[:, cols[0]]
+        if np.count_nonzero(rows) < 4:
+            continue
+
+        t_valid = t[rows]
+        inside = np.flatnonzero((t_new >= t_valid[0]) & (t_new <= t_valid[-1]))
+        spline = make_interp_spline(t_valid, y_2d[np.ix_(rows, cols)], k=3, axis=0)
+        y_new[np.ix_(inside, cols)] = spline(t_new[inside])
+
+    return y_new.reshape((len(x_new),) + y.shape[1:])
+
+
+def resample_frames(frames: List[pd.DataFrame], rate_hz: float, name: str = "Time") -> pd.DataFrame:
+    """Resamples recordings onto one regular time base with cubic splines. See resample_cubic.
+
+    Equivalent to outer-merging the frames on their indexes, then
+    df.reindex(df.index.union(new_idx)).interpolate("cubic").reindex(new_idx), where new_idx spans all frames at
+    rate_hz, but each frame is interpolated from its own time stamps.
+
+    Args:
+        frames (List[pd.DataFrame]): recordings with DatetimeIndexes and numeric columns
+        rate_hz (float): output sampling rate
+        name (str): name of the output index
+
+    Returns:
+        resampled (pd.DataFrame): the columns of all frames, in order, on the new DatetimeIndex
+    """
+    start = min(frame.index.min() for frame in frames)
+    end = max(frame.index.max() for frame in frames)
+    new_idx = pd.date_range(start, end, freq=f"{1000. / rate_hz}ms", name=name)
+    x_new = new_idx.as_unit("ns").asi8
+
+    resampled = [pd.DataFrame(resample_cubic(frame.index.as_unit("ns").asi8, frame.to_numpy(dtype=float), x_new),
+                              index=new_idx, columns=frame.columns) for frame in frames]
+    return pd.concat(resampled, axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _savgol_projection(window_length: int, polyorder: int) -> np.ndarray:
+    """Matrix mapping a window of samples to the values of their least-squares polynomial fit, cached per filter.
+
+    Its middle row holds the Savitzky-Golay smoothing coefficients; its first and last window_length // 2 rows give the
+    fitted values at the ends of a segment, as savgol_filter's mode="interp" computes them.
+    """
+    t = np.arange(window_length) - window_length // 2
+    vander = np.vander(t, polyorder + 1, increasing=True)
+    projection = vander @ np.linalg.pinv(vander)
+    projection.flags.writeable = False
+    return projection
+
+
+def savgol_columns(y: np.ndarray, window_length: int, polyorder: int) -> np.ndarray:
+    """Savitzky-Golay filters the columns of y, run of non-NaN samples by run.
+
+    Equivalent to scipy.signal.savgol_filter(y, window_length, polyorder, axis=0) (mode="interp") on data without NaNs.
+    Otherwise each run of consecutive non-NaN samples of a column is filtered as a signal of its own and NaNs stay NaN;
+    runs shorter than window_length are left unfiltered, and y without samples is returned as is. Columns with the same
+    NaN pattern are filtered together, and the filter coefficients are computed once per (window_length, polyorder).
+
+    Args:
+        y (np.ndarray): samples, 1-D, or 2-D with one signal per column
+        window_length (int): filter window length, in samples; odd
+        polyorder (int): order of the fitted polynomials, less than window_length
+
+    Returns:
+        y_filt (np.ndarray): the filtered samples, shaped like y
+    """
+    if window_length % 2 != 1:
+        raise ValueError(f"window_length must be odd, not {window_length}.")
+    if polyorder >= window_length:
+        raise ValueError(f"polyorder ({polyorder}) must be less than window_length ({window_length}).")
+
+    y = np.asarray(y, dtype=float)
+    if len(y) == 0:
+        return y
+    y_2d = y.reshape(len(y), -1)
+    projection = _savgol_projection(window_length, polyorder)
+    half = window_length // 2
+
+    y_filt = np.full(y_2d.shape, np.nan)
+    valid = ~np.isnan(y_2d)
+    groups = {}
+    for col in range(y_2d.shape[1]):
+        groups.setdefault(np.packbits(valid[:, col]).tobytes(), []).append(col)
+
+    for cols in groups.values():
+        # Runs of valid samples start where the mask steps up and end where it steps down
+        steps = np.diff(np.concatenate(([0], valid[:, cols[0]].astype(np.int8), [0])))
+        for start, end in zip(np.flatnonzero(steps == 1), np.flatnonzero(steps == -1)):
+            run = y_2d[start:end, cols]
+            if end - start < window_length:
+                y_filt[start:end, cols] = run
+                continue
+
+            filtered = correlate1d(run, projection[half], axis=0, mode="constant")
+            filtered[:half] = projection[:half] @ run[:window_length]
+            filtered[-half:] = projection[-half:] @ run[-window_length:]
+            y_filt[start:end, cols] = filtered
+
+    return y_filt.reshape(y.shape)
+
+
+def savgol_frame(df: pd.DataFrame, window_length: int, polyorder: int) -> pd.DataFrame:
+    """Savitzky-Golay filters all columns of a DataFrame at once. See savgol_columns.
+
+    Args:
+        df (pd.DataFrame): recording with numeric columns
+        window_length (int): filter window length, in samples; odd
+        polyorder (int): order of the fitted polynomials
+
+    Returns:
+        filtered (pd.DataFrame): the filtered columns, with the index and column names of df
+    """
+    return pd.DataFrame(savgol_columns(df.to_numpy(dtype=float), window_length, polyorder), index=df.index,
+                        columns=df.columns)
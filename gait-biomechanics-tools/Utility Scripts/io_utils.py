@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+
+"""Readers for the data files used by the analysis scripts.
+
+    Lab manager exports (SSTK lab manager CSV files) have one row per time stamp, in integer microseconds since the
+    epoch, and one column per sensor channel. The channels of every device are named Channel 0, Channel 1, ... so the
+    names repeat when several devices were recorded, and each row only has values in the columns of the device that
+    sampled at its time stamp.
+
+    MotionMonitor exports (.exp files) start with a header of "value(s)<TAB>// description" lines (user, evaluation
+    date, source file name and recording timestamp, sampling rate, data capture period, then study-specific fields),
+    followed by a tab-separated table with a frame or sample number column and one column per angle.
+
+    StretchSense iOS app exports have a "Sequence, Sample Number, Time, Sensor Value" header line, then one line per
+    sample with the sequence and sample numbers, the time in seconds since the recording started, and the value of every
+    SPI channel of the connected modules (10 or 20 columns; channels without a sensor read 0.0). Every line ends with a
+    NUL byte.
+
+    Preprocessed trials are stored as NPZ files (uncompressed numpy archives) next to their CSV files: the time stamps
+    as int64 nanoseconds since the epoch (UTC), the time zone, the column names, and one float64 array per column, so
+    that a trial loads without parsing text and a subset of its columns loads without reading the others. A trial's
+    NPZ file is only read if it is at least as recent as its CSV file, so re-preprocessed or edited CSV files are not
+    shadowed by stale NPZ files, and a trial reads the same from either file.
+
+    Copies of this file are kept next to the scripts that use it; edit the one in Utility Scripts and copy it over.
+"""
+
+import csv
+import io
+import os
+from typing import Callable, Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+TRIAL_STORE_EXT = ".npz"
+
+
+def lab_manager_column_names(header: List[str]) -> List[str]:
+    """De-duplicates the channel names of a lab manager export header, device by device.
+
+    A device's columns start where a channel name repeats. The channels of the first device keep their names, those of
+    device d get the suffix ".d" (Channel 0, ..., Channel 0.1, ...), the names pandas.read_csv gives duplicates.
+
+    Args:
+        header (List[str]): the channel names, without the time stamp column
+
+    Returns:
+        names (List[str]): the unique column names
+    """
+    names = []
+    device = 0
+    device_names = set()
+    for name in header:
+        if name in device_names:
+            device += 1
+            device_names = set()
+        device_names.add(name)
+        names.append(name if device == 0 else f"{name}.{device}")
+    return names
+
+
+def read_lab_manager_export(file_path: str, usecols: Union[Callable[[str], bool], List[str], None] = None,
+                            name: Union[str, None] = None) -> pd.DataFrame:
+    """Reads a lab manager export into a DataFrame with a UTC DatetimeIndex.
+
+    The time stamps are parsed as int64 and converted in one step, and only the selected columns are converted.
+
+    Args:
+        file_path (str): path of the CSV file
+        usecols (Callable or List[str]): columns to read, either a callable evaluated on the channel names as they are
+            in the file (like read_csv's, e.g. lambda x: "0" in x selects Channel 0 of every device), or a list of
+            de-duplicated names (see lab_manager_column_names). All columns are read if None.
+        name (str): name of the index
+
+    Returns:
+        data (pd.DataFrame): one column per selected channel, in file order, indexed by time stamp
+    """
+    with open(file_path, newline="") as export_file:
+        header = next(csv.reader(export_file))[1:]
+    names = lab_manager_column_names(header)
+
+    if usecols is None:
+        positions = list(range(len(names)))
+    elif callable(usecols):
+        positions = [i for i, raw_name in enumerate(header) if usecols(raw_name)]
+    else:
+        missing = set(usecols) - set(names)
+        if len(missing) > 0:
+            raise ValueError(f"Columns {sorted(missing)} not in {file_path}.")
+        positions = [i for i, col_name in enumerate(names) if col_name in usecols]
+
+    # Column 0 holds the time stamps; channel i is file column i + 1
+    data = pd.read_csv(file_path, header=None, skiprows=1, usecols=[0] + [i + 1 for i in positions],
+                       names=["timestamp_us"] + [names[i] for i in positions], index_col=0,
+                       dtype={"timestamp_us": np.int64, **{names[i]: np.float64 for i in positions}}, engine="c")
+    data.index = pd.to_datetime(data.index.to_numpy(), unit="us", utc=True)
+    data.index.name = name
+    return data
+
+
+def read_motion_monitor_exp(file_path: str, usecols: Union[Callable[[str], bool], List[str], None] = None) \
+        -> Tuple[pd.DataFrame, dict]:
+    """Reads a MotionMonitor export and its header metadata in one pass over the file.
+
+    The frame/sample number column is read as int64 and the angle columns as float64. Only the selected columns are
+    parsed.
+
+    Args:
+        file_path (str): path of the .exp file
+        usecols (Callable or List[str]): columns to read, either a callable evaluated on the column names or a list of
+            names. All named columns are read if None.
+
+    Returns:
+        data (pd.DataFrame): the selected columns, in file order
+        metadata (dict): "source" (recording name), "timestamp" (recording start as a naive pd.Timestamp, in the
+            local time of the recording computer; dates are day first, with - or / separators), "sampling_rate_hz",
+            "capture_period_s", and "fields", all header lines as {description: [values]}
+    """
+    fields = {}
+    header_values = []
+    with open(file_path) as exp_file:
+        # Header lines until the column names, skipping blank lines
+        while True:
+            line = exp_file.readline()
+            if line == "":
+                raise ValueError(f"No column names in {file_path}.")
+            if "//" in line:
+                values, description = line.split("//", 1)
+                values = values.rstrip().split("\t")
+                fields[description.strip()] = values
+                header_values.append(values)
+            elif line.strip() != "":
+                columns = line.rstrip("\r\n").split("\t")
+                break
+
+        if usecols is None:
+            positions = [i for i, name in enumerate(columns) if name != ""]
+        elif callable(usecols):
+            positions = [i for i, name in enumerate(columns) if name != "" and usecols(name)]
+        else:
+            missing = set(usecols) - set(columns)
+            if len(missing) > 0:
+                raise ValueError(f"Columns {sorted(missing)} not in {file_path}.")
+            positions = [i for i, name in enumerate(columns) if name in usecols]
+
+        if len(positions) == 0:
+            raise ValueError(f"No columns selected from {file_path}.")
+
+        # The table is read from where the header ended; rows may end with a tab, so columns are picked by position
+        values = np.loadtxt(exp_file, dtype=np.float64, delimiter="\t", usecols=positions, ndmin=2)
+
+    data = pd.DataFrame(values, columns=[columns[i] for i in positions])
+    if positions[0] == 0:
+        data[columns[0]] = data[columns[0]].astype(np.int64)
+
+    metadata = {
+        "source": header_values[2][0],
+        "timestamp": pd.to_datetime(" ".join(header_values[2][1:3]).replace("/", "-"), format="%d-%m-%Y %H:%M:%S:%f"),
+        "sampling_rate_hz": float(header_values[3][0]),
+        "capture_period_s": float(header_values[4][0]),
+        "fields": fields,
+    }
+    return data, metadata
+
+
+def read_stretchsense_csv(file_path: str, num_channels: Union[int, None] = None, drop_unused: bool = False,
+                          dtype: type = np.float64) -> Tuple[pd.DataFrame, Dict[int, int]]:
+    """Reads a StretchSense iOS app export.
+
+    The samples are parsed straight into one float array, and unused channels are found on that array, so no per-column
+    parsing or filtering of a DataFrame is needed.
+
+    Args:
+        file_path (str): path of the CSV file
+        num_channels (int): number of channels to read, from the first; all channels are read if None
+        drop_unused (bool): leave out the channels that are 0.0 in every sample
+        dtype (type): dtype of the sensor values; np.float32 halves their memory
+
+    Returns:
+        data (pd.DataFrame): Sequence (float64), Sample Number (int64), Time (float64), and one SensorN column per
+            channel read, N being the channel number from 1
+        channels (Dict[int, int]): the column index in data of each channel read, by channel number
+    """
+    with open(file_path, "rb") as ss_file:
+        ss_file.readline()  # Column names, which do not name the channels
+        body = ss_file.read().replace(b"\x00", b"")
+
+    # The channel count is taken from the first sample, as the header line does not give it
+    first_line = body[:body.find(b"\n")]
+    num_fields = len([field for field in first_line.split(b",") if field.strip() != b""])
+    if num_channels is None:
+        num_channels = num_fields - 3
+    elif num_channels > num_fields - 3:
+        raise ValueError(f"{file_path} has {num_fields - 3} channels, {num_channels} requested.")
+
+    values = np.loadtxt(io.BytesIO(body), dtype=np.float64, delimiter=",", usecols=range(3 + num_channels), ndmin=2)
+
+    sensor_values = values[:, 3:]
+    channel_numbers = np.arange(1, num_channels + 1)
+    if drop_unused:
+        used = np.any(sensor_values != 0.0, axis=0)
+        sensor_values = sensor_values[:, used]
+        channel_numbers = channel_numbers[used]
+
+    data = pd.DataFrame(sensor_values.astype(dtype, copy=False), columns=[f"Sensor{n}" for n in channel_numbers])
+    data.insert(0, "Time", values[:, 2])
+    data.insert(0, "Sample Number", values[:, 1].astype(np.int64))
+    data.insert(0, "Sequence", values[:, 0])
+    return data, {int(n): 3 + i for i, n in enumerate(channel_numbers)}
+
+
+def write_trial(data: pd.DataFrame, file_path: str, dtype: type = np.float64) -> None:
+    """Writes a preprocessed trial with a DatetimeIndex to the trial store.
+
+    Args:
+        data (pd.DataFrame): the trial, with numeric columns
+        file_path (str): path of the file to write, without extension
+        dtype (type): dtype the columns are stored as; with np.float32, which halves the file size, read_trial returns
+            the values rounded to float32 precision rather than those of the CSV file
+    """
+    arrays = {f"col{i}": data[column].to_numpy(dtype=dtype) for i, column in enumerate(data.columns)}
+    np.savez(file_path + TRIAL_STORE_EXT, time_ns=data.index.as_unit("ns").asi8,
+             time_zone=np.array("" if data.index.tz is None else str(data.index.tz)),
+             index_name=np.array("" if data.index.name is None else data.index.name),
+             columns=np.array([str(column) for column in data.columns]), **arrays)
+
+
+def trial_file(file_path: str) -> Union[str, None]:
+    """Returns the file a trial is read from, or None if it has neither an NPZ nor a CSV file.
+
+    The NPZ file is used if there is no CSV file or if it was modified at the same time as or after the CSV file;
+    otherwise the CSV file is used, as the NPZ file holds older data.
+
+    Args:
+        file_path (str): path of the trial, without extension
+    """
+    npz_path = file_path + TRIAL_STORE_EXT
+    csv_path = file_path + ".csv"
+    if os.path.exists(npz_path) and (not os.path.exists(csv_path) or
+                                     os.path.getmtime(npz_path) >= os.path.getmtime(csv_path)):
+        return npz_path
+    if os.path.exists(csv_path):
+        return csv_path
+    return None
+
+
+def read_trial(file_path: str, usecols: Union[List[str], None] = None, cache: bool = False) -> pd.DataFrame:
+    """Reads a preprocessed trial from its NPZ file, or from its CSV file if it has no up-to-date NPZ file.
+
+    See trial_file for which file is read. Either way the columns are float64 and the index is a nanosecond
+    DatetimeIndex, so a trial stored by write_trial with its default dtype reads identically from both files.
+
+    Args:
+        file_path (str): path of the trial, without extension
+        usecols (List[str]): columns to read, in this order; all columns are read if None
+        cache (bool): write the trial's NPZ file when the trial is read from its CSV file, so that the next read is fast
+
+    Returns:
+        data (pd.DataFrame): the trial, indexed by time
+    """
+    trial_path = trial_file(file_path)
+    if trial_path is None:
+        raise FileNotFoundError(f"No trial file for {file_path}.")
+
+    if not trial_path.endswith(TRIAL_STORE_EXT):
+        data = pd.read_csv(trial_path, header=0, index_col=0, parse_dates=True)
+        # Time stamps written with and without fractional seconds are not parsed by parse_dates
+        index = data.index if isinstance(data.index, pd.DatetimeIndex) else pd.to_datetime(data.index, format="ISO8601")
+        data.index = index.as_unit("ns")
+        data = data.astype(np.float64)
+        if cache:
+            write_trial(data, file_path)
+        return data if usecols is None else data[usecols]
+
+    with np.load(trial_path) as store:
+        columns = list(store["columns"])
+        if usecols is None:
+            usecols = columns
+        missing = set(usecols) - set(columns)
+        if len(missing) > 0:
+            raise ValueError(f"Columns {sorted(missing)} not in {trial_path}.")
+
+        index = pd.DatetimeIndex(store["time_ns"].astype("datetime64[ns]"), name=str(store["index_name"]) or None)
+        time_zone = str(store["time_zone"])
+        if time_zone != "":
+            index = index.tz_localize("UTC").tz_convert(time_zone)
+        data = pd.DataFrame({column: store[f"col{columns.index(column)}"].astype(np.float64, copy=False)
+                             for column in usecols}, index=index)
+    return data
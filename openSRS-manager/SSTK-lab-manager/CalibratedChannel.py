@@ -0,0 +1,142 @@
+"""Contains the CalibratedChannel class definition.
+
+    A CalibratedChannel applies a fitted linear model, for example a joint angle estimated from SRS capacitance, to its
+    input channels as one matrix product per ingested batch. Models are loaded from calibration files written by the
+    analysis scripts (see gait-biomechanics-tools/CtWG Part IX Analysis/02-DYNAMIC-ANALYSIS.py), which are JSON files of
+    the form:
+
+    {"models": [{"name": "R_FLX", "units": "deg", "inputs": ["R_PFX", "R_DFX", "R_INV", "R_EVR"],
+                 "coefficients": [0.41, -0.12, 0.08, 0.02], "intercept": -231.5}]}
+
+    Examples:
+    for model in loadCalibration("P001_WALK1_SHOE_calibration.json"):
+        virtualDevice.addDerivedChannel(CalibratedChannel(model, sensorServiceItemModel.sensorChannels()))
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from PyQt5.QtCore import QObject, Qt
+
+import DerivedChannel as dc
+import SensorChannel as sc
+import SensorServiceItem as ssi
+
+
+def loadCalibration(file_path: str) -> List[Dict[str, Any]]:
+    """Reads and validates the linear models in a calibration file.
+
+    Raises:
+        OSError: the file cannot be read
+        ValueError: the file is not a valid calibration file
+    """
+    with open(file_path) as calibration_file:
+        try:
+            calibration = json.load(calibration_file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{file_path} is not valid JSON: {e}")
+
+    models = calibration.get("models") if isinstance(calibration, dict) else None
+    if not isinstance(models, list) or len(models) == 0:
+        raise ValueError(f"{file_path} does not contain a list of models.")
+
+    for model in models:
+        missing = {"name", "inputs", "coefficients", "intercept"} - set(model)
+        if len(missing) > 0:
+            raise ValueError(f"Model {model.get('name', '?')} is missing {', '.join(sorted(missing))}.")
+        if len(model["inputs"]) == 0 or len(model["inputs"]) != len(model["coefficients"]):
+            raise ValueError(f"Model {model['name']} needs one coefficient per input.")
+
+    return models
+
+
+class CalibratedChannel(dc.DerivedChannel):
+    """DerivedChannel computing a linear model of its inputs, y = X @ coefficients + intercept.
+
+    Inputs are aligned as in DerivedChannel. The cost of evaluating each batch is measured against the time the batch
+    spans at the driving input's sampling rate, and a warning is logged if the model falls behind real time.
+
+    Args:
+        model: linear model as returned by loadCalibration
+        sensor_channels: channels the model's inputs are resolved from
+
+    Keyword Args:
+        disp_dec_places: initial value for the display_decimal_places property
+        parent: VirtualDevice holding the channel
+
+    Raises:
+        ValueError: an input of the model does not resolve to exactly one channel
+    """
+
+    # region Class Initializer
+
+    def __init__(self, model: Dict[str, Any], sensor_channels: List[sc.SensorChannel], disp_dec_places: int = 1,
+                 parent: QObject = None):
+        self.__coefficients = np.asarray(model["coefficients"], dtype=np.float64)
+        self.__intercept = float(model["intercept"])
+
+        # Equivalent expression, shown to the user and validated like any derived channel
+        terms = [f"{coef!r} * {{{name}}}" for coef, name in zip(model["coefficients"], model["inputs"])]
+        expression = " + ".join(terms + [repr(self.__intercept)])
+        super(CalibratedChannel, self).__init__(model["name"], expression, sensor_channels,
+                                                units_name=model.get("units", ""), disp_dec_places=disp_dec_places,
+                                                parent=parent)
+
+        # Per-batch evaluation cost
+        self.__batch_cost_us = 0.0
+        self.__max_batch_cost_us = 0.0
+        self.__over_budget_batches = 0
+
+    # endregion
+
+    # region Property Getters
+
+    @property
+    def batch_cost_us(self) -> float:
+        """Exponential moving average of the time taken to evaluate one batch, in microseconds."""
+
+        return self.__batch_cost_us
+
+    @property
+    def max_batch_cost_us(self) -> float:
+        """Longest time taken to evaluate one batch, in microseconds."""
+
+        return self.__max_batch_cost_us
+
+    # endregion
+
+    # region Instance Methods
+
+    def evaluate(self, values: List[np.ndarray]) -> np.ndarray:
+        __doc__ = dc.DerivedChannel.evaluate.__doc__  # Inherit docstring
+        start_s = time.perf_counter()
+        result = np.column_stack(values) @ self.__coefficients + self.__intercept
+        cost_us = (time.perf_counter() - start_s) * 1.E6
+
+        self.__batch_cost_us = cost_us if self.__batch_cost_us == 0.0 else 0.9 * self.__batch_cost_us + 0.1 * cost_us
+        self.__max_batch_cost_us = max(self.__max_batch_cost_us, cost_us)
+
+        rate_hz = self.inputs[0].parent().samplingRate()
+        if rate_hz > 0.0 and cost_us > len(result) / rate_hz * 1.E6:
+            self.__over_budget_batches += 1
+            if self.__over_budget_batches == 1:
+                logging.warning(f"Calibrated channel {self.display_name} took {cost_us:.0f} us for {len(result)} "
+                                f"samples, longer than they span at {rate_hz} Hz.")
+
+        return result
+
+    # endregion
+
+    # region SensorServiceItem Implementation
+
+    def data(self, role: Qt.ItemDataRole = None) -> Any:
+        __doc__ = ssi.SensorServiceItem.data.__doc__  # Inherit docstring
+        if role == Qt.ToolTipRole:
+            return (f"{self.expression}\nBatch cost: {self.__batch_cost_us:.1f} us average, "
+                    f"{self.__max_batch_cost_us:.1f} us max")
+        return super(CalibratedChannel, self).data(role)
+
+    # endregion
@@ -0,0 +1,103 @@
+"""Contains the ClockModel class definition.
+
+    A ClockModel maps a device's clock onto the host clock. Drivers periodically exchange times with their device: the
+    host notes its clock when it sends a request (t_send) and when the reply arrives (t_receive), and the reply carries
+    the device clock (t_device). As in NTP, the device time is assumed to have been read halfway through the exchange,
+    and the exchange's round-trip delay bounds the error of that assumption.
+
+    The model fits host = device + offset + skew * (device - reference) by least squares over the most recent
+    exchanges, keeping only the exchanges with the shortest round trips, and converts whole arrays of device timestamps
+    at once. Timestamps of every device converted with its own model share the host clock, so recordings from several
+    devices are aligned as they arrive.
+
+    Examples:
+    model = ClockModel()
+    model.addExchange(t_send_us, t_device_us, t_receive_us)
+    host_timestamps_us = model.toHost(device_timestamps_us)
+"""
+
+from collections import deque
+from typing import Union
+
+import numpy as np
+
+
+class ClockModel:
+    """Offset and skew of a device clock relative to the host clock.
+
+    Keyword Args:
+        max_exchanges: number of most recent exchanges the model is fitted to
+        delay_quantile: fraction of the exchanges, those with the shortest round trips, used in the fit
+    """
+
+    MAX_EXCHANGES = 32
+    DELAY_QUANTILE = 0.5
+
+    # region Class Initializer
+
+    def __init__(self, max_exchanges: int = MAX_EXCHANGES, delay_quantile: float = DELAY_QUANTILE):
+        self.__exchanges = deque(maxlen=max_exchanges)  # (device time, host midpoint, round-trip delay)
+        self.__delay_quantile = delay_quantile
+        self.__reference_us = 0
+        self.__offset_us = 0.0
+        self.__skew = 0.0
+
+    # endregion
+
+    # region Instance Methods
+
+    def __len__(self) -> int:
+        return len(self.__exchanges)
+
+    def addExchange(self, send_us: int, device_us: int, receive_us: int) -> None:
+        """Adds a time exchange and refits the model."""
+        if receive_us < send_us:
+            return
+        self.__exchanges.append((device_us, (send_us + receive_us) // 2, receive_us - send_us))
+        self.__fit()
+
+    def offset(self) -> float:
+        """Host minus device time in microseconds at the reference device time."""
+        return self.__offset_us
+
+    def skew(self) -> float:
+        """Rate of the host clock relative to the device clock, minus one (e.g. 20E-6 is 20 ppm)."""
+        return self.__skew
+
+    def reset(self) -> None:
+        """Forgets all exchanges, e.g. after the device clock has been set. The model becomes the identity."""
+        self.__exchanges.clear()
+        self.__reference_us = 0
+        self.__offset_us = 0.0
+        self.__skew = 0.0
+
+    def toHost(self, device_us: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        """Converts device timestamps in microseconds to host timestamps, rounded to whole microseconds."""
+        if len(self.__exchanges) == 0:
+            return device_us
+
+        elapsed_us = np.asarray(device_us, dtype=np.int64) - self.__reference_us
+        correction_us = np.round(self.__offset_us + self.__skew * elapsed_us).astype(np.int64)
+        return device_us + correction_us
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __fit(self):
+        exchanges = np.array(self.__exchanges, dtype=np.int64)
+        delays = exchanges[:, 2]
+        best = exchanges[delays <= np.quantile(delays, self.__delay_quantile)]
+
+        # Work relative to the newest exchange so that the fit is well conditioned in float64
+        self.__reference_us = int(best[-1, 0])
+        device = (best[:, 0] - self.__reference_us).astype(np.float64)
+        difference = (best[:, 1] - best[:, 0]).astype(np.float64)
+
+        if len(best) < 2 or np.ptp(device) == 0.0:
+            self.__offset_us, self.__skew = float(difference.mean()), 0.0
+            return
+
+        self.__skew, self.__offset_us = (float(coef) for coef in np.polyfit(device, difference, 1))
+
+    # endregion
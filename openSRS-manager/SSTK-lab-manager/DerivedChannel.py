@@ -0,0 +1,273 @@
+"""Contains the DerivedChannel class definition.
+
+    A DerivedChannel is a virtual SensorChannel whose samples are computed from other SensorChannels with a vectorized
+    arithmetic expression, for example the differential signal "{R_DFX} - {R_PFX}". Input channels are referenced by
+    display name in curly braces, or by "device address/display name" when the name alone is ambiguous. The expression
+    is evaluated incrementally on each batch of samples ingested by the input channels, so derived data can be plotted
+    and exported live like any other channel without recomputing over the recorded history.
+
+    Examples:
+    d_ch = DerivedChannel("DFX - PFX", "{Channel 0} - {Channel 1}", model.sensorChannels(), units_name="pF")
+    virtualDevice.addDerivedChannel(d_ch)
+"""
+
+import ast
+import re
+from typing import Callable, Dict, List, Set
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSlot
+from PyQt5.QtWidgets import QAction
+
+import SensorChannel as sc
+
+# Numpy functions that may be called from an expression
+EXPRESSION_FUNCTIONS: Dict[str, Callable] = {
+    "abs": np.abs, "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "log10": np.log10,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan, "arcsin": np.arcsin, "arccos": np.arccos, "arctan": np.arctan,
+    "arctan2": np.arctan2, "degrees": np.degrees, "radians": np.radians,
+    "minimum": np.minimum, "maximum": np.maximum, "clip": np.clip, "power": np.power,
+}
+
+# Largest absolute constant exponent allowed with **, whose base must reference a channel; other powers must use
+# power(), which works in numpy fixed-size arithmetic, so an expression cannot start an unbounded Python integer
+# computation
+MAX_POWER_EXPONENT = 8
+
+_CHANNEL_REFERENCE_PATTERN = re.compile(r"\{([^{}]+)\}")
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd)
+
+
+def _isSmallExponent(node: ast.AST) -> bool:
+    """Returns whether an exponent node is a numeric constant, optionally signed, of at most MAX_POWER_EXPONENT."""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        node = node.operand
+    return isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and \
+        not isinstance(node.value, bool) and abs(node.value) <= MAX_POWER_EXPONENT
+
+
+def _referencesInput(node: ast.AST, input_names: Set[str]) -> bool:
+    """Returns whether an expression node references an input channel, so that it evaluates to a numpy array."""
+    return any(isinstance(n, ast.Name) and n.id in input_names for n in ast.walk(node))
+
+
+def channelReference(sensor_channel: sc.SensorChannel) -> str:
+    """Returns the fully qualified "device address/display name" reference of a SensorChannel."""
+    return f"{sensor_channel.parent().deviceAddress()}/{sensor_channel.display_name}"
+
+
+def resolveChannel(reference: str, sensor_channels: List[sc.SensorChannel]) -> sc.SensorChannel:
+    """Finds the SensorChannel matching a reference by qualified reference, or by display name if unambiguous.
+
+    Raises:
+        ValueError: no channel, or more than one channel, matches the reference
+    """
+    matches = [s_ch for s_ch in sensor_channels if channelReference(s_ch) == reference]
+    if len(matches) == 0:
+        matches = [s_ch for s_ch in sensor_channels if s_ch.display_name == reference]
+
+    if len(matches) == 0:
+        raise ValueError(f"No channel named '{reference}'.")
+    if len(matches) > 1:
+        raise ValueError(f"Channel name '{reference}' is ambiguous, use one of: "
+                         f"{', '.join(channelReference(s_ch) for s_ch in matches)}.")
+    return matches[0]
+
+
+def compileExpression(expression: str, sensor_channels: List[sc.SensorChannel]):
+    """Validates an expression and resolves its channel references.
+
+    Only arithmetic operators, numeric constants, channel references, and the functions in EXPRESSION_FUNCTIONS are
+    allowed. The exponent of ** must be a numeric constant of at most MAX_POWER_EXPONENT in absolute value, and its
+    base must reference a channel: a power of constants, e.g. (9**8)**8 nested a few times, would be computed as an
+    unbounded Python integer.
+
+    Args:
+        expression: expression text with channel references in curly braces
+        sensor_channels: channels that may be referenced
+
+    Returns:
+        (code, inputs) where code is the compiled expression, evaluated with the input channels' values bound to the
+        names _in0, _in1, ..., and inputs is the list of referenced SensorChannels in order of first appearance.
+
+    Raises:
+        ValueError: the expression is invalid or references an unknown channel
+    """
+    inputs: List[sc.SensorChannel] = []
+
+    def substitute(match: re.Match) -> str:
+        s_ch = resolveChannel(match.group(1).strip(), sensor_channels)
+        if s_ch not in inputs:
+            inputs.append(s_ch)
+        return f"_in{inputs.index(s_ch)}"
+
+    source = _CHANNEL_REFERENCE_PATTERN.sub(substitute, expression)
+    if len(inputs) == 0:
+        raise ValueError("Expression must reference at least one channel.")
+
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}.")
+
+    input_names = {f"_in{i}" for i in range(len(inputs))}
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in an expression.")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Constant {node.value!r} is not a number.")
+        if isinstance(node, ast.Name) and node.id not in input_names and node.id not in EXPRESSION_FUNCTIONS:
+            raise ValueError(f"Unknown name '{node.id}', reference channels in curly braces.")
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or len(node.keywords) > 0 or
+                                           node.func.id not in EXPRESSION_FUNCTIONS):
+            raise ValueError("Only functions listed in EXPRESSION_FUNCTIONS may be called, without keywords.")
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow) and not _isSmallExponent(node.right):
+            raise ValueError(f"The exponent of ** must be a number of at most {MAX_POWER_EXPONENT} in absolute value, "
+                             f"use power() for other exponents.")
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow) and \
+                not _referencesInput(node.left, input_names):
+            raise ValueError("The base of ** must reference a channel, use power() or a number for constant powers.")
+
+    return compile(tree, "<expression>", "eval"), inputs
+
+
+class DerivedChannel(sc.SensorChannel):
+    """SensorChannel computed from other SensorChannels by an expression.
+
+    The first input channel referenced by the expression drives the derived channel: each of its samples produces one
+    derived sample with the same timestamp. The values of the other inputs at that timestamp are linearly interpolated
+    from their own samples, which allows inputs from different devices and sampling rates to be combined. A driving
+    sample is held back until every other input has a sample at or after its timestamp, at most MAX_PENDING_US.
+
+    Args:
+        display_name: initial value for the display_name property
+        expression: expression text, see compileExpression
+        sensor_channels: channels the expression may reference
+
+    Keyword Args:
+        units_name: initial value for the units_name property
+        disp_dec_places: initial value for the display_decimal_places property
+        parent: VirtualDevice holding the channel
+
+    Raises:
+        ValueError: the expression is invalid or references an unknown channel
+    """
+
+    MAX_PENDING_US = 10.0 * 1.E6  # Input history kept while waiting for a lagging input
+
+    # region Class Initializer
+
+    def __init__(self, display_name: str, expression: str, sensor_channels: List[sc.SensorChannel],
+                 units_name: str = "", disp_dec_places: int = 1, parent: QObject = None):
+        super(DerivedChannel, self).__init__(display_name, units_name, disp_dec_places, parent=parent)
+
+        self.__expression = expression
+        self.__code, self.__inputs = compileExpression(expression, sensor_channels)
+
+        # Per-input samples received but not yet consumed
+        empty_ts, empty_v = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        self.__pending_ts: List[np.ndarray] = [empty_ts] * len(self.__inputs)
+        self.__pending_v: List[np.ndarray] = [empty_v] * len(self.__inputs)
+
+        self.__slots = []
+        for i, s_ch in enumerate(self.__inputs):
+            slot = self.__makeInputSlot(i)
+            s_ch.samplesAdded.connect(slot)
+            self.__slots.append(slot)
+
+        context_menu = super(DerivedChannel, self).contextMenu()
+        context_menu.addSeparator()
+        remove_action = QAction("Remove", context_menu)
+        remove_action.setData("remove")
+        context_menu.addAction(remove_action)
+        context_menu.aboutToShow.connect(lambda: remove_action.setEnabled(not self.recording()))
+        remove_action.triggered.connect(self.__removeAction_triggered)
+
+    # endregion
+
+    # region Property Getters
+
+    @property
+    def expression(self) -> str:
+        """Expression text the channel is computed from."""
+
+        return self.__expression
+
+    @property
+    def inputs(self) -> List[sc.SensorChannel]:
+        """SensorChannels referenced by the expression, driving input first."""
+
+        return self.__inputs
+
+    # endregion
+
+    # region Instance Methods
+
+    def detach(self) -> None:
+        """Disconnects the channel from its inputs. The channel stops producing samples."""
+
+        for s_ch, slot in zip(self.__inputs, self.__slots):
+            s_ch.samplesAdded.disconnect(slot)
+        self.__slots = []
+
+    def evaluate(self, values: List[np.ndarray]) -> np.ndarray:
+        """Evaluates the expression on aligned arrays of input values, one array per input."""
+
+        namespace = dict(EXPRESSION_FUNCTIONS)
+        namespace.update({f"_in{i}": v for i, v in enumerate(values)})
+        result = eval(self.__code, {"__builtins__": {}}, namespace)
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), values[0].shape)
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __makeInputSlot(self, index: int):
+        return lambda timestamps_us, values: self.__input_samplesAdded(index, timestamps_us, values)
+
+    def __input_samplesAdded(self, index: int, timestamps_us: np.ndarray, values: np.ndarray):
+        self.__pending_ts[index] = np.concatenate((self.__pending_ts[index], timestamps_us))
+        self.__pending_v[index] = np.concatenate((self.__pending_v[index], values))
+
+        drive_ts = self.__pending_ts[0]
+        if len(drive_ts) == 0:
+            return
+
+        # Driving samples can be computed up to the point every other input has reached
+        other_ts = self.__pending_ts[1:]
+        if any(len(ts) == 0 for ts in other_ts):
+            self.__trimPending(drive_ts[-1] - DerivedChannel.MAX_PENDING_US)
+            return
+
+        horizon_us = min([ts[-1] for ts in other_ts], default=drive_ts[-1])
+        n_ready = int(np.searchsorted(drive_ts, horizon_us, side="right"))
+        if n_ready > 0:
+            ready_ts = drive_ts[:n_ready]
+            aligned = [self.__pending_v[0][:n_ready]]
+            aligned += [np.interp(ready_ts, ts, v) for ts, v in zip(self.__pending_ts[1:], self.__pending_v[1:])]
+            self.add_samples(ready_ts, self.evaluate(aligned))
+
+            self.__pending_ts[0] = drive_ts[n_ready:]
+            self.__pending_v[0] = self.__pending_v[0][n_ready:]
+            self.__trimPending(ready_ts[-1])
+
+        if len(self.__pending_ts[0]) > 0:
+            self.__trimPending(self.__pending_ts[0][-1] - DerivedChannel.MAX_PENDING_US)
+
+    def __trimPending(self, min_timestamp_us: float):
+        # Drop input samples no longer needed, keeping the last sample before min_timestamp_us for interpolation
+        for i in range(len(self.__inputs)):
+            first = max(int(np.searchsorted(self.__pending_ts[i], min_timestamp_us, side="right")) - (i > 0), 0)
+            self.__pending_ts[i] = self.__pending_ts[i][first:]
+            self.__pending_v[i] = self.__pending_v[i][first:]
+
+    # endregion
+
+    # region Slots
+
+    @pyqtSlot(name="__removeAction_triggered")
+    def __removeAction_triggered(self):
+        self.parent().removeDerivedChannel(self)
+
+    # endregion
@@ -0,0 +1,50 @@
+from PyQt5 import uic
+from PyQt5.QtCore import pyqtSlot
+from PyQt5.QtWidgets import QWidget, QListWidgetItem
+
+import DerivedChannel as dc
+import SensorServiceItemModel as ssim
+
+DerivedChannelDialogUI, DerivedChannelDialogBase = uic.loadUiType("DerivedChannelDialog.ui")
+
+
+class DerivedChannelDialog(DerivedChannelDialogBase, DerivedChannelDialogUI):
+    def __init__(self, model: ssim.SensorServiceItemModel, parent: QWidget = None):
+        # uic boilerplate
+        DerivedChannelDialogBase.__init__(self, parent=parent)
+        self.setupUi(self)
+
+        self.__model = model
+
+        # UI items event connection
+        self.buttonBox.accepted.connect(self.__buttonBox_accepted)
+        self.channelListWidget.itemDoubleClicked.connect(self.__channelListWidget_itemDoubleClicked)
+
+    def showEvent(self, event):
+        # Offer the channels available now; devices come and go between uses of the dialog
+        self.channelListWidget.clear()
+        self.channelListWidget.addItems([dc.channelReference(s_ch) for s_ch in self.__model.sensorChannels()])
+        self.errorLabel.clear()
+        super(DerivedChannelDialog, self).showEvent(event)
+
+    @pyqtSlot(name="__buttonBox_accepted")
+    def __buttonBox_accepted(self):
+        name = self.nameLineEdit.text().strip()
+        expression = self.expressionLineEdit.text()
+        if name == "":
+            name = expression
+
+        try:
+            self.__model.addDerivedChannel(name, expression, units_name=self.unitsLineEdit.text().strip())
+        except ValueError as e:
+            self.errorLabel.setText(str(e))
+            return
+
+        self.nameLineEdit.clear()
+        self.expressionLineEdit.clear()
+        self.accept()
+
+    @pyqtSlot(QListWidgetItem, name="__channelListWidget_itemDoubleClicked")
+    def __channelListWidget_itemDoubleClicked(self, item: QListWidgetItem):
+        self.expressionLineEdit.insert(f"{{{item.text()}}}")
+        self.expressionLineEdit.setFocus()
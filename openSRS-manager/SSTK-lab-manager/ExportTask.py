@@ -0,0 +1,124 @@
+"""Contains the ExportTask class definition.
+
+    An ExportTask writes SampleSnapshots of sensor channels to a CSV file on a QThreadPool worker thread, so that data
+    can be exported while the application keeps recording. Gait events detected on the channels are written next to
+    the data, to a CSV file with the suffix "_events". A BulkExportTask writes several such exports, e.g. of several
+    recorded sessions, in one background job.
+
+    Examples:
+    task = ExportTask("trial.csv", [(s_ch.display_name, s_ch.snapshot()) for s_ch in channels])
+    task.signals.finished.connect(on_finished)
+    QThreadPool.globalInstance().start(task)
+"""
+
+import logging
+import os
+from typing import List, Tuple
+
+import pandas as pd
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+import Profiler as prof
+import SampleBuffer as sb
+
+
+class ExportTaskSignals(QObject):
+    """Signals emitted by an ExportTask. Lives in the thread that created the task."""
+
+    finished = pyqtSignal(str, name="finished")
+    error = pyqtSignal(str, name="error")
+
+
+def eventsFilePath(file_path: str) -> str:
+    """Returns the path of the events file written next to the data file file_path."""
+    root, ext = os.path.splitext(file_path)
+    return f"{root}{ExportTask.EVENTS_FILE_SUFFIX}{ext}"
+
+
+@prof.profiled()
+def writeExport(file_path: str, snapshots: List[Tuple[str, sb.SampleSnapshot]],
+                event_snapshots: List[Tuple[str, str, sb.SampleSnapshot]]) -> None:
+    """Writes snapshots to a CSV file, and events to its events file. See ExportTask for the file layouts."""
+    data_series = []
+    for name, snapshot in snapshots:
+        samples = snapshot.to_array()
+        data_series.append(pd.Series(data=samples["value"], index=samples["timestamp_us"], name=name))
+    data_frame = pd.DataFrame(data_series)
+    data_frame.T.to_csv(file_path)
+
+    events = [pd.DataFrame({"event": event_name, "channel": channel_name,
+                            "timestamp_us": snapshot.to_array()["timestamp_us"]})
+              for event_name, channel_name, snapshot in event_snapshots if len(snapshot) > 0]
+    if len(events) > 0:
+        events_frame = pd.concat(events).sort_values("timestamp_us", kind="stable").set_index("timestamp_us")
+        events_frame.to_csv(eventsFilePath(file_path))
+
+
+class ExportTask(QRunnable):
+    """Background export of channel snapshots to CSV.
+
+    The CSV has one row per timestamp (microseconds since epoch) and one column per channel, the same layout the
+    application has always exported.
+
+    Args:
+        file_path: path of the CSV file to write
+        snapshots: (column name, SampleSnapshot) pairs, one per exported channel
+
+    Keyword Args:
+        event_snapshots: (event name, channel name, SampleSnapshot) triples of the events to export. The events file
+                         has one row per event with its timestamp (microseconds since epoch), name, and channel, in
+                         time order, so that the data between events can be sliced from the data file by timestamp.
+    """
+
+    EVENTS_FILE_SUFFIX = "_events"
+
+    def __init__(self, file_path: str, snapshots: List[Tuple[str, sb.SampleSnapshot]],
+                 event_snapshots: List[Tuple[str, str, sb.SampleSnapshot]] = None):
+        super(ExportTask, self).__init__()
+        self.signals = ExportTaskSignals()
+        self.__file_path = file_path
+        self.__snapshots = snapshots
+        self.__event_snapshots = [] if event_snapshots is None else event_snapshots
+
+    def eventsFilePath(self) -> str:
+        return eventsFilePath(self.__file_path)
+
+    def run(self):
+        try:
+            writeExport(self.__file_path, self.__snapshots, self.__event_snapshots)
+        except Exception as e:
+            logging.error(f"Export to {self.__file_path} failed: {e}")
+            self.signals.error.emit(str(e))
+            return
+
+        logging.info(f"Exported {len(self.__snapshots)} channels to {self.__file_path}.")
+        self.signals.finished.emit(self.__file_path)
+
+
+class BulkExportTask(QRunnable):
+    """Background export of several sets of channel snapshots, each to its own CSV file as by an ExportTask.
+
+    The finished signal is emitted once, with the path of the last file written, after all exports succeed. The error
+    signal is emitted at the first export that fails, and the remaining exports are skipped.
+
+    Args:
+        jobs: (file path, snapshots, event snapshots) of each export. See ExportTask
+    """
+
+    def __init__(self, jobs: List[Tuple[str, List[Tuple[str, sb.SampleSnapshot]],
+                                        List[Tuple[str, str, sb.SampleSnapshot]]]]):
+        super(BulkExportTask, self).__init__()
+        self.signals = ExportTaskSignals()
+        self.__jobs = jobs
+
+    def run(self):
+        for file_path, snapshots, event_snapshots in self.__jobs:
+            try:
+                writeExport(file_path, snapshots, event_snapshots)
+            except Exception as e:
+                logging.error(f"Export to {file_path} failed: {e}")
+                self.signals.error.emit(str(e))
+                return
+            logging.info(f"Exported {len(snapshots)} channels to {file_path}.")
+
+        self.signals.finished.emit(self.__jobs[-1][0] if len(self.__jobs) > 0 else "")
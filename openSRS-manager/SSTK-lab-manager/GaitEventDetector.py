@@ -0,0 +1,109 @@
+"""Contains the HeelStrikeDetector class definition.
+
+    A HeelStrikeDetector finds heel strikes in a heel channel (R_HEEL/L_HEEL on the Part IX hardware) one batch at a
+    time, as the samples are ingested. Heel capacitance rises when the heel is loaded, so a heel strike is detected as a
+    rising crossing of an adaptive threshold:
+
+    - the signal's lower and upper envelopes are tracked with peak followers that relax toward the signal with time
+      constant ENVELOPE_TAU_S, so thresholds follow slow drift of the baseline and of the contact amplitude
+    - the detector arms when the signal falls below the low threshold (swing), and fires when it then rises above the
+      high threshold (hysteresis between the two rejects noise around a single threshold)
+    - events closer than REFRACTORY_US to the previous event, or with an envelope range below MIN_RANGE, are ignored
+
+    The detector's state is a handful of scalars, independent of the length of the recording.
+
+    Examples:
+    detector = HeelStrikeDetector()
+    heel_strikes_us = np.concatenate([detector.process(ts, v) for ts, v in batches])
+"""
+
+import numpy as np
+
+
+class HeelStrikeDetector:
+    """Streaming heel-strike detector with hysteresis, adaptive thresholds, and a refractory period.
+
+    Keyword Args:
+        low_fraction: low (arming) threshold as a fraction of the envelope range above the lower envelope
+        high_fraction: high (firing) threshold as a fraction of the envelope range above the lower envelope
+        min_range: smallest envelope range, in channel units, in which events are detected
+        refractory_us: shortest time between two events in microseconds
+        envelope_tau_s: time constant in seconds with which the envelopes relax toward the signal
+    """
+
+    LOW_FRACTION = 0.3
+    HIGH_FRACTION = 0.6
+    MIN_RANGE = 2.0  # pF
+    REFRACTORY_US = 600.E3  # Well below the stride time, the shortest time between heel strikes of one foot
+    ENVELOPE_TAU_S = 3.0
+
+    # region Class Initializer
+
+    def __init__(self, low_fraction: float = LOW_FRACTION, high_fraction: float = HIGH_FRACTION,
+                 min_range: float = MIN_RANGE, refractory_us: float = REFRACTORY_US,
+                 envelope_tau_s: float = ENVELOPE_TAU_S):
+        if not 0.0 <= low_fraction < high_fraction <= 1.0:
+            raise ValueError("Thresholds must satisfy 0 <= low_fraction < high_fraction <= 1.")
+
+        self.__low_fraction = low_fraction
+        self.__high_fraction = high_fraction
+        self.__min_range = min_range
+        self.__refractory_us = refractory_us
+        self.__envelope_tau_us = envelope_tau_s * 1.E6
+
+        self.__lower = None
+        self.__upper = None
+        self.__last_us = None
+        self.__armed = False
+        self.__last_event_us = None
+
+    # endregion
+
+    # region Instance Methods
+
+    def reset(self) -> None:
+        """Forgets the detector state."""
+        self.__lower = None
+        self.__upper = None
+        self.__last_us = None
+        self.__armed = False
+        self.__last_event_us = None
+
+    def process(self, timestamps_us: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Processes the next batch of samples and returns the timestamps of the heel strikes found in it."""
+        if len(values) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        timestamps_us = np.asarray(timestamps_us, dtype=np.int64)
+        if self.__lower is None:
+            self.__lower = self.__upper = float(values[0])
+            self.__last_us = int(timestamps_us[0])
+
+        # Envelope relaxation factor per sample, from the time elapsed since the previous sample
+        dt_us = np.diff(timestamps_us, prepend=self.__last_us)
+        relax = 1.0 - np.exp(-np.maximum(dt_us, 0) / self.__envelope_tau_us)
+
+        lower, upper = self.__lower, self.__upper
+        armed, last_event_us = self.__armed, self.__last_event_us
+        events = []
+        for t_us, x, k in zip(timestamps_us.tolist(), np.asarray(values, dtype=np.float64).tolist(), relax.tolist()):
+            lower = min(x, lower + k * (x - lower))
+            upper = max(x, upper + k * (x - upper))
+            span = upper - lower
+            if span < self.__min_range:
+                continue
+
+            if x < lower + self.__low_fraction * span:
+                armed = True
+            elif armed and x > lower + self.__high_fraction * span:
+                armed = False
+                if last_event_us is None or t_us - last_event_us >= self.__refractory_us:
+                    events.append(t_us)
+                    last_event_us = t_us
+
+        self.__lower, self.__upper = lower, upper
+        self.__armed, self.__last_event_us = armed, last_event_us
+        self.__last_us = int(timestamps_us[-1])
+        return np.array(events, dtype=np.int64)
+
+    # endregion
@@ -0,0 +1,208 @@
+"""Contains the LagEstimator class definition.
+
+    A LagEstimator keeps a running estimate of the time lag between a reference channel (e.g. a MoCap joint angle from
+    a ReferenceStream) and an SRS channel, replacing the offline np.correlate alignment of the analysis scripts. Both
+    channels are resampled onto a common time grid as their samples arrive, and an exponentially weighted
+    cross-covariance over a bounded range of lags is updated with each new batch of grid samples. Each update costs
+    O(batch * lags); the history is never revisited.
+
+    The lag is the delay of the SRS channel relative to the reference: adding it to the reference timestamps aligns the
+    reference with the SRS channel. The sign of the correlation is ignored, so sensors that move opposite to the angle
+    they are paired with (e.g. PF and EVR) are aligned as well. Because gait is periodic, the lag range is kept below
+    half a stride period: the reference is timestamped on the host clock, so only the latency of the bridge remains.
+
+    Examples:
+    estimator = LagEstimator(referenceChannel, srsChannel)
+    ...
+    if estimator.ready():
+        offset_us = estimator.lagUs()
+"""
+
+from typing import Union
+
+import numpy as np
+from PyQt5.QtCore import QObject
+
+import SensorChannel as sc
+
+
+class _GridStream:
+    """Samples of one channel linearly interpolated onto the grid t = n / rate_hz, for integer grid index n."""
+
+    def __init__(self, rate_hz: float):
+        self.period_us = 1.E6 / rate_hz
+        self.values = np.empty(0)
+        self.start = None  # Grid index of values[0]
+        self.last_t = None
+        self.last_v = None
+
+    def end(self) -> int:
+        return self.start + len(self.values)
+
+    def add(self, timestamps_us: np.ndarray, values: np.ndarray) -> None:
+        ts = np.asarray(timestamps_us, dtype=np.float64)
+        vs = np.asarray(values, dtype=np.float64)
+        if self.last_t is not None:
+            ts = np.concatenate(([self.last_t], ts))
+            vs = np.concatenate(([self.last_v], vs))
+        if self.start is None:
+            self.start = int(np.ceil(ts[0] / self.period_us))
+
+        last_index = int(np.floor(ts[-1] / self.period_us))
+        indices = np.arange(self.end(), last_index + 1)
+        if len(indices) > 0:
+            self.values = np.concatenate((self.values, np.interp(indices * self.period_us, ts, vs)))
+        self.last_t, self.last_v = ts[-1], vs[-1]
+
+    def trim(self, first: int) -> None:
+        if first > self.start:
+            self.values = self.values[first - self.start:]
+            self.start = first
+
+
+class LagEstimator(QObject):
+    """Running estimate of the lag between a reference channel and an SRS channel.
+
+    Args:
+        reference_channel: channel whose timestamps are to be corrected
+        srs_channel: channel the reference is aligned to
+
+    Keyword Args:
+        rate_hz: rate of the common time grid
+        max_lag_s: largest lag considered, in either direction
+        tau_s: time constant of the exponential weighting of past samples
+        parent: Qt QObject parent. See PyQt5.QtCore.QObject
+    """
+
+    RATE_HZ = 100.0
+    MAX_LAG_S = 0.3  # Less than half a stride, so that the periodicity of gait cannot alias the peak
+    TAU_S = 20.0
+
+    # region Class Initializer
+
+    def __init__(self, reference_channel: sc.SensorChannel, srs_channel: sc.SensorChannel, rate_hz: float = RATE_HZ,
+                 max_lag_s: float = MAX_LAG_S, tau_s: float = TAU_S, parent: QObject = None):
+        super(LagEstimator, self).__init__(parent=parent)
+
+        self.__reference_channel = reference_channel
+        self.__srs_channel = srs_channel
+        self.__rate_hz = rate_hz
+        self.__max_lag = int(round(max_lag_s * rate_hz))
+        self.__decay = np.exp(-1.0 / (tau_s * rate_hz))  # Weight of the past per grid sample
+
+        self.__x = _GridStream(rate_hz)  # Reference
+        self.__y = _GridStream(rate_hz)  # SRS
+        self.__next = None  # Next grid index to accumulate
+        self.__processed = 0
+
+        # Exponentially weighted means, cross-covariance for lags -max_lag..max_lag, and variances
+        self.__mean_x = None
+        self.__mean_y = None
+        self.__cross = np.zeros(2 * self.__max_lag + 1)
+        self.__var_x = 0.0
+        self.__var_y = 0.0
+
+        reference_channel.samplesAdded.connect(self.__reference_samplesAdded)
+        srs_channel.samplesAdded.connect(self.__srs_samplesAdded)
+
+    # endregion
+
+    # region Instance Methods
+
+    def referenceChannel(self) -> sc.SensorChannel:
+        return self.__reference_channel
+
+    def srsChannel(self) -> sc.SensorChannel:
+        return self.__srs_channel
+
+    def detach(self) -> None:
+        """Disconnects the estimator from its channels. The estimate is frozen."""
+        self.__reference_channel.samplesAdded.disconnect(self.__reference_samplesAdded)
+        self.__srs_channel.samplesAdded.disconnect(self.__srs_samplesAdded)
+
+    def ready(self) -> bool:
+        """Whether enough overlapping data has been seen for the estimate to be meaningful (one time constant)."""
+        return self.__processed * (1.0 - self.__decay) >= 1.0 and self.__var_x > 0.0 and self.__var_y > 0.0
+
+    def correlation(self) -> np.ndarray:
+        """Normalized cross-correlation for lags -max_lag..max_lag grid samples.
+
+        The SRS variance is that of the zero-lag samples, so values at other lags may slightly exceed 1 in magnitude.
+        """
+        if self.__var_x <= 0.0 or self.__var_y <= 0.0:
+            return np.zeros_like(self.__cross)
+        return self.__cross / np.sqrt(self.__var_x * self.__var_y)
+
+    def peakCorrelation(self) -> float:
+        """Absolute correlation at the estimated lag, a measure of confidence in the estimate."""
+        return float(np.max(np.abs(self.correlation())))
+
+    def lagUs(self) -> Union[int, None]:
+        """Delay of the SRS channel relative to the reference channel in microseconds, or None if not ready."""
+        if not self.ready():
+            return None
+
+        corr = np.abs(self.correlation())
+        peak = int(np.argmax(corr))
+        shift = float(peak)
+        if 0 < peak < len(corr) - 1:  # Parabolic interpolation between grid samples
+            denominator = corr[peak - 1] - 2.0 * corr[peak] + corr[peak + 1]
+            if denominator != 0.0:
+                shift += 0.5 * (corr[peak - 1] - corr[peak + 1]) / denominator
+
+        return int(round((shift - self.__max_lag) * 1.E6 / self.__rate_hz))
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __update(self):
+        x, y, max_lag = self.__x, self.__y, self.__max_lag
+        if x.start is None or y.start is None:
+            return
+
+        # Grid samples n with the reference value x[n] and the SRS values y[n - max_lag .. n + max_lag] available
+        first = max(x.start, y.start + max_lag) if self.__next is None else self.__next
+        last = min(x.end(), y.end() - max_lag)
+        if last <= first:
+            return
+
+        xs = x.values[first - x.start:last - x.start]
+        y_windows = np.lib.stride_tricks.sliding_window_view(
+            y.values[first - max_lag - y.start:last + max_lag - y.start], 2 * max_lag + 1)
+
+        n = len(xs)
+        weights = self.__decay ** np.arange(n - 1, -1, -1)
+        decay_n = self.__decay ** n
+
+        # Means follow the signals with the same weighting as the covariances
+        if self.__mean_x is None:
+            self.__mean_x, self.__mean_y = xs[0], y_windows[0, max_lag]
+        normalizer = weights.sum()
+        self.__mean_x = decay_n * self.__mean_x + (1.0 - decay_n) * np.dot(weights, xs) / normalizer
+        self.__mean_y = decay_n * self.__mean_y + (1.0 - decay_n) * np.dot(weights, y_windows[:, max_lag]) / normalizer
+
+        xc = xs - self.__mean_x
+        yc = y_windows - self.__mean_y
+        self.__cross = decay_n * self.__cross + (weights * xc) @ yc
+        self.__var_x = decay_n * self.__var_x + np.dot(weights, xc * xc)
+        self.__var_y = decay_n * self.__var_y + np.dot(weights, yc[:, max_lag] ** 2)
+
+        self.__next = last
+        self.__processed += n
+        x.trim(last)
+        y.trim(last - max_lag)
+
+    # endregion
+
+    # region Slots
+
+    def __reference_samplesAdded(self, timestamps_us: np.ndarray, values: np.ndarray):
+        self.__x.add(timestamps_us, values)
+        self.__update()
+
+    def __srs_samplesAdded(self, timestamps_us: np.ndarray, values: np.ndarray):
+        self.__y.add(timestamps_us, values)
+        self.__update()
+
+    # endregion
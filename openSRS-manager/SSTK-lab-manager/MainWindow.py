@@ -1,23 +1,29 @@
-import csv
-import io
+import datetime as dt
+import logging
+import os
 
-import numpy as np
-import pandas as pd
 import pyqtgraph as pg
-from PyQt5 import uic
-from PyQt5.QtCore import pyqtSlot, QPoint, QTimer, Qt, QByteArray
+from PyQt5 import sip, uic
+from PyQt5.QtCore import pyqtSlot, QPoint, QTimer, QThreadPool
 from PyQt5.QtGui import QCloseEvent, QIcon
-from PyQt5.QtWidgets import QWidget, QFileDialog
+from PyQt5.QtWidgets import QWidget, QFileDialog, QHeaderView, QInputDialog, QLabel, QMenu, QAction
 
+import DerivedChannelDialog as dcd
+import ExportTask as et
 import LoggingDialog as ld
+import Profiler as prof
 import SensorServiceItem as ssi
+import SessionBrowser as sbr
+import SessionFile as sf
 import SensorServiceItemModel as ssim
+import drivers.ReferenceStream as rs
 
 MainWindowUI, MainWindowBase = uic.loadUiType("MainWindow.ui")
 
 
 class MainWindow(MainWindowBase, MainWindowUI):
     __RECORD_BUTTON_FLASH_RATE_HZ = 2.0
+    __MEMORY_LABEL_REFRESH_MS = 1000
 
     def __init__(self, parent: QWidget = None):
         # uic boilerplate
@@ -32,7 +38,33 @@ class MainWindow(MainWindowBase, MainWindowUI):
         self.__sensorServiceItemModel = ssim.SensorServiceItemModel(self)
         self.__sensorServiceItemModel.discoveringChanged.connect(self.__sensorServiceItemModel_discoveringChanged)
         self.__sensorServiceItemModel.recordingChanged.connect(self.__sensorServiceItemModel_recordingChanged)
+        self.__sensorServiceItemModel.sessionsChanged.connect(self.__sensorServiceItemModel_sessionsChanged)
         self.sensorTreeView.setModel(self.__sensorServiceItemModel)
+        self.sensorTreeView.header().setStretchLastSection(False)
+        self.sensorTreeView.header().setSectionResizeMode(0, QHeaderView.Stretch)
+
+        # Initialize derived channel dialog
+        self.__derivedChannelDialog = dcd.DerivedChannelDialog(self.__sensorServiceItemModel, parent=self)
+        self.actionAdd_Derived_Channel.triggered.connect(lambda: self.__derivedChannelDialog.show())
+        self.actionLoad_Calibration.triggered.connect(self.__actionLoad_Calibration_triggered)
+        self.actionAdd_Reference_Stream.triggered.connect(self.__actionAdd_Reference_Stream_triggered)
+        self.actionMemory_Budget.triggered.connect(self.__actionMemory_Budget_triggered)
+
+        # Profiling, possibly already enabled from the environment (see Profiler)
+        self.actionRecord_Profile.setChecked(prof.GLOBAL_PROFILER.enabled)
+        self.actionRecord_Profile.toggled.connect(self.__actionRecord_Profile_toggled)
+
+        # Initialize session browser
+        self.__sessionBrowser = sbr.SessionBrowser(parent=self)
+        self.actionBrowse_Sessions.triggered.connect(lambda: self.__sessionBrowser.show())
+        self.actionSave_Session.triggered.connect(self.__actionSave_Session_triggered)
+
+        # Recorded sessions shown in the plot when not recording, overlaid relative to their start times
+        self.__shownSessions = []
+        self.__showSessionsMenu = QMenu("S&how Sessions", self.menuSession)
+        self.menuSession.insertMenu(self.actionSave_Session, self.__showSessionsMenu)
+        self.__showSessionsMenu.aboutToShow.connect(self.__showSessionsMenu_aboutToShow)
+        self.__showSessionsMenu.triggered.connect(self.__showSessionsMenu_triggered)
 
         # UI items event connection
         self.clearDataButton.clicked.connect(self.__clearDataButton_clicked)
@@ -41,12 +73,24 @@ class MainWindow(MainWindowBase, MainWindowUI):
         self.recordButton.clicked.connect(self.__recordButton_clicked)
         self.exportDataButton.clicked.connect(self.__exportDataButton_clicked)
 
+        # Signal objects of background export tasks still running
+        self.__exportTaskSignals = set()
+
         # Timer for flashing record button
         self.__recordButtonTimer = QTimer(parent=self)
         self.__recordButtonTimer.timeout.connect(self.__recordButtonTimer_timeout)
         self.__recordButtonTimer.setInterval(int(1000.0 / MainWindow.__RECORD_BUTTON_FLASH_RATE_HZ))
         self.__recordButtonTimer.start()
 
+        # Memory used by recorded samples, shown permanently in the status bar
+        self.__memoryLabel = QLabel(parent=self)
+        self.statusbar.addPermanentWidget(self.__memoryLabel)
+        self.__memoryLabelTimer = QTimer(parent=self)
+        self.__memoryLabelTimer.timeout.connect(self.__memoryLabelTimer_timeout)
+        self.__memoryLabelTimer.setInterval(MainWindow.__MEMORY_LABEL_REFRESH_MS)
+        self.__memoryLabelTimer.start()
+        self.__memoryLabelTimer_timeout()
+
         # Setup plotting
         self.sensorPlotWidget.setBackground(background="w")  # White background
         self.sensorPlotWidget.setMenuEnabled(False)
@@ -55,24 +99,113 @@ class MainWindow(MainWindowBase, MainWindowUI):
         self.sensorPlotWidget.showGrid(x=True, y=True)
         self.sensorPlotWidget_legend = self.sensorPlotWidget.addLegend(offset=(-5, 5))
 
+    def sensorServiceItemModel(self) -> ssim.SensorServiceItemModel:
+        return self.__sensorServiceItemModel
+
     def closeEvent(self, event: QCloseEvent):
         # Prevents crashing bluez on Linux
         self.__sensorServiceItemModel.stopDiscovery()
+
+        # A profile still recording is written where SSTK_PROFILE points, or next to the working directory
+        if prof.GLOBAL_PROFILER.enabled:
+            file_path = os.environ.get(prof.PROFILE_ENV_VAR, "")
+            if file_path in ("", "1"):
+                file_path = f"sstk-profile-{dt.datetime.now():%Y%m%d-%H%M%S}.json"
+            self.__dumpProfile(file_path)
         event.accept()
 
+    @pyqtSlot(name="__actionLoad_Calibration_triggered")
+    def __actionLoad_Calibration_triggered(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load Calibration", "", "Calibration Files (*.json)")
+        if file_path == "":
+            return
+
+        try:
+            calibrated_channels = self.__sensorServiceItemModel.addCalibratedChannels(file_path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not load calibration {file_path}: {e}")
+            self.statusbar.showMessage(f"Could not load calibration: {e}", 5000)
+            return
+
+        self.statusbar.showMessage(f"Loaded {len(calibrated_channels)} calibrated channels from {file_path}.", 5000)
+
+    @pyqtSlot(name="__actionAdd_Reference_Stream_triggered")
+    def __actionAdd_Reference_Stream_triggered(self):
+        port, ok = QInputDialog.getInt(self, "Add Reference Stream", "Local UDP port:", rs.ReferenceStream.DEFAULT_PORT,
+                                       1024, 65535)
+        if not ok:
+            return
+
+        try:
+            self.__sensorServiceItemModel.addReferenceStream(port)
+        except OSError as e:
+            logging.error(f"Could not add reference stream: {e}")
+            self.statusbar.showMessage(f"Could not add reference stream: {e}", 5000)
+            return
+
+        self.statusbar.showMessage(f"Listening for a reference stream on UDP port {port}.", 5000)
+
+    @pyqtSlot(name="__actionMemory_Budget_triggered")
+    def __actionMemory_Budget_triggered(self):
+        limit_mib, ok = QInputDialog.getInt(self, "Memory Budget", "Recorded samples kept in memory (MiB):",
+                                            self.__sensorServiceItemModel.memoryBudget().limitBytes() // 2 ** 20, 16,
+                                            1024 * 1024)
+        if ok:
+            self.__sensorServiceItemModel.setMemoryBudget(limit_mib * 2 ** 20)
+            self.__memoryLabelTimer_timeout()
+
+    @pyqtSlot(bool, name="__actionRecord_Profile_toggled")
+    def __actionRecord_Profile_toggled(self, checked: bool):
+        if checked:
+            prof.GLOBAL_PROFILER.setEnabled(True)
+            self.statusbar.showMessage("Recording profile...", 5000)
+            return
+
+        prof.GLOBAL_PROFILER.setEnabled(False)
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Profile", "", "Chrome Trace Files (*.json)")
+        if file_path != "":
+            self.__dumpProfile(file_path)
+
+    @pyqtSlot(name="__memoryLabelTimer_timeout")
+    def __memoryLabelTimer_timeout(self):
+        budget = self.__sensorServiceItemModel.memoryBudget()
+        resident_bytes, spilled_bytes = budget.usage()
+        text = f"Samples: {resident_bytes / 2 ** 20:.0f} / {budget.limitBytes() / 2 ** 20:.0f} MiB"
+        if spilled_bytes > 0:
+            text += f" ({spilled_bytes / 2 ** 20:.0f} MiB on disk)"
+        self.__memoryLabel.setText(text)
+
+    @pyqtSlot(name="__actionSave_Session_triggered")
+    def __actionSave_Session_triggered(self):
+        directory, _ = QFileDialog.getSaveFileName(self, "Save Session", "", "Session Files (*.session)")
+        if directory == "":
+            return
+        if directory.endswith(".session"):
+            directory = directory[:-len(".session")]
+
+        # While recording, the live channels are saved as for an export; otherwise each shown session
+        jobs = [(f"{path}.session", self.__sensorServiceItemModel.epoch() if session is None else session.epoch,
+                 channels) for path, session, channels in self.__exportSources(directory)]
+        for session_directory, epoch, channels in jobs:
+            task = sf.SaveSessionTask(session_directory, epoch, channels)
+            task.signals.finished.connect(self.__exportTask_finished)
+            task.signals.error.connect(self.__exportTask_error)
+            self.__exportTaskSignals.add(task.signals)
+            QThreadPool.globalInstance().start(task)
+        self.statusbar.showMessage(f"Saving {len(jobs)} sessions to {directory}...")
+
     @pyqtSlot(name="__clearDataButton_clicked")
     def __clearDataButton_clicked(self):
         if not self.__sensorServiceItemModel.recording():
             self.__sensorServiceItemModel.clearRecordedData()
-            self.sensorPlotWidget.clear()
-            self.sensorPlotWidget_legend.scene().removeItem(self.sensorPlotWidget_legend)
-            self.sensorPlotWidget_legend = self.sensorPlotWidget.addLegend(offset=(-5, 5))
+            self.__clearPlot()
 
     @pyqtSlot(name="__recordButton_clicked")
     def __recordButton_clicked(self):
         if self.__sensorServiceItemModel.recording():
             self.__sensorServiceItemModel.stopRecordingAllServices()
         else:
+            self.__showSessions([])
             items = self.__sensorServiceItemModel.plotDataItems()
             for i, item in enumerate(items):
                 item.setPen(pg.mkPen(pg.intColor(i, hues=len(items))))
@@ -98,13 +231,37 @@ class MainWindow(MainWindowBase, MainWindowUI):
             self.recordButton.setText("Record Data")
             self.sensorPlotWidget.setLimits(maxXRange=9E99)
             self.sensorPlotWidget.setMouseEnabled(x=True, y=False)
-            self.exportDataButton.setEnabled(True)
+            self.__showSessions(self.__sensorServiceItemModel.sessions()[-1:])
         else:
             self.recordButton.setIcon(QIcon.fromTheme("media-playback-stop"))
             self.recordButton.setText("Stop Recording")
             self.sensorPlotWidget.setLimits(maxXRange=5.E6)
             self.sensorPlotWidget.setMouseEnabled(x=False, y=False)
-            self.exportDataButton.setEnabled(False)
+
+    @pyqtSlot(name="__sensorServiceItemModel_sessionsChanged")
+    def __sensorServiceItemModel_sessionsChanged(self):
+        sessions = self.__sensorServiceItemModel.sessions()
+        if any(session not in sessions for session in self.__shownSessions):
+            self.__showSessions([session for session in self.__shownSessions if session in sessions])
+
+    @pyqtSlot(name="__showSessionsMenu_aboutToShow")
+    def __showSessionsMenu_aboutToShow(self):
+        self.__showSessionsMenu.clear()
+        for session in self.__sensorServiceItemModel.sessions():
+            action = QAction(session.name, self.__showSessionsMenu)
+            action.setCheckable(True)
+            action.setChecked(session in self.__shownSessions)
+            action.setData(session)
+            self.__showSessionsMenu.addAction(action)
+        self.__showSessionsMenu.setEnabled(not self.__sensorServiceItemModel.recording())
+
+    @pyqtSlot(QAction, name="__showSessionsMenu_triggered")
+    def __showSessionsMenu_triggered(self, action: QAction):
+        session = action.data()
+        if action.isChecked():
+            self.__showSessions(self.__shownSessions + [session])
+        else:
+            self.__showSessions([shown for shown in self.__shownSessions if shown is not session])
 
     @pyqtSlot(bool, name="__sensorServiceItemModel_discoveringChanged")
     def __sensorServiceItemModel_discoveringChanged(self, discovering: bool):
@@ -124,28 +281,92 @@ class MainWindow(MainWindowBase, MainWindowUI):
 
     @pyqtSlot(name="__exportDataButton_clicked")
     def __exportDataButton_clicked(self):
-        if self.__sensorServiceItemModel.recording():
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Data", "", "CSV Files (*.csv)")
+        if file_path == "":
             return
 
-        # sensor_channels = self.__sensorServiceItemModel.selectedChannels()
-        # data_array = sensor_channels[0].samples["timestamp_us"]
-        # for s_ch in sensor_channels:
-        #     sensor_data = s_ch.samples["value"]
-        #     data_array = np.vstack((data_array, sensor_data))
-
-        sensor_channels = self.__sensorServiceItemModel.selectedChannels()
-        data_series = []
-        for s_ch in sensor_channels:
-            data_series.append(pd.Series(data=s_ch.samples["value"], index=s_ch.samples["timestamp_us"], name=s_ch.display_name))
-        data_frame = pd.DataFrame(data_series)
-
-        # Generate CSV
-        # with io.StringIO() as csv_file:
-        #     csv_writer = csv.writer(csv_file)
-        #     csv_writer.writerow(["Time"] + [s_ch.display_name for s_ch in sensor_channels])
-        #     for data_row in data_array.T:
-        #         csv_writer.writerow(data_row)
-        #
-        #     QFileDialog.saveFileContent(csv_file.getvalue().encode("utf-8"))
-
-        QFileDialog.saveFileContent(data_frame.T.to_csv().encode("utf-8"))
\ No newline at end of file
+        # While recording, the live channels are exported; otherwise the shown sessions, in one background job
+        root, ext = os.path.splitext(file_path)
+        jobs = [(f"{path}{ext}", [(name, snapshot) for name, _, _, snapshot, _ in channels],
+                 [("heel_strike", name, heel_strikes) for name, _, _, _, heel_strikes in channels
+                  if heel_strikes is not None])
+                for path, _, channels in self.__exportSources(root)]
+
+        task = et.BulkExportTask(jobs)
+        task.signals.finished.connect(self.__exportTask_finished)
+        task.signals.error.connect(self.__exportTask_error)
+        self.__exportTaskSignals.add(task.signals)
+        QThreadPool.globalInstance().start(task)
+        self.statusbar.showMessage(f"Exporting {sum(len(job[1]) for job in jobs)} channels to {file_path}...")
+
+    @pyqtSlot(str, name="__exportTask_finished")
+    def __exportTask_finished(self, file_path: str):
+        self.__exportTaskSignals.discard(self.sender())
+        self.statusbar.showMessage(f"Exported data to {file_path}.", 5000)
+
+    @pyqtSlot(str, name="__exportTask_error")
+    def __exportTask_error(self, error_msg: str):
+        self.__exportTaskSignals.discard(self.sender())
+        self.statusbar.showMessage(f"Export failed: {error_msg}", 5000)
+
+    def __dumpProfile(self, file_path: str):
+        logging.info(f"Profile summary:\n{prof.GLOBAL_PROFILER.summaryText()}")
+        try:
+            prof.GLOBAL_PROFILER.dump(file_path)
+        except OSError as e:
+            logging.error(f"Could not write profile {file_path}: {e}")
+            self.statusbar.showMessage(f"Could not write profile: {e}", 5000)
+            return
+        self.statusbar.showMessage(f"Wrote profile to {file_path}.", 5000)
+
+    def __clearPlot(self):
+        self.sensorPlotWidget.clear()
+        self.sensorPlotWidget_legend.clear()
+
+    def __exportSources(self, root: str):
+        """Returns (path root, session, channels) of what an export or save writes, with path roots derived from root.
+
+        While recording, this is the live checked channels (session None). Otherwise it is the shown sessions, each
+        restricted to the channels that are still checked (or no longer exist), with the session name appended to root
+        when there are several. Channels are (name, device address, units, aligned snapshot, heel strike snapshot or
+        None).
+        """
+        if self.__sensorServiceItemModel.recording() or len(self.__shownSessions) == 0:
+            # Freeze the current extent of each selected channel; recording may continue while the export runs.
+            # Channels of reference streams are shifted by their estimated lag so that the export is aligned.
+            channels = [(s_ch.display_name, s_ch.parent().deviceAddress(), s_ch.units_name,
+                         s_ch.snapshot().shifted(s_ch.parent().alignmentOffsetUs()),
+                         s_ch.heel_strike_snapshot().shifted(s_ch.parent().alignmentOffsetUs())
+                         if s_ch.detect_heel_strikes else None)
+                        for s_ch in self.__sensorServiceItemModel.selectedChannels()]
+            return [(root, None, channels)]
+
+        selected = self.__sensorServiceItemModel.selectedChannels()
+        sources = []
+        for session in self.__shownSessions:
+            channels = [(c.display_name, c.device_address, c.units_name, c.snapshot(),
+                         c.heel_strike_snapshot() if len(c.heel_strikes) > 0 else None)
+                        for c in session.channels
+                        if c.source is None or sip.isdeleted(c.source) or c.source in selected]
+            path = root if len(self.__shownSessions) == 1 else f"{root}_{session.name.split(' (')[0].replace(' ', '')}"
+            sources.append((path, session, channels))
+        return sources
+
+    def __showSessions(self, sessions):
+        """Plots the channels of sessions, overlaid with times relative to the start of each session."""
+        for session in self.__shownSessions:
+            if session not in sessions:
+                for channel in session.channels:
+                    channel.releasePlotDataItem()
+        self.__shownSessions = list(sessions)
+        self.__clearPlot()
+
+        items = [(session, channel) for session in sessions for channel in session.channels]
+        for i, (session, channel) in enumerate(items):
+            item = channel.plotDataItem(session.timeRange()[0])
+            item.setPen(pg.mkPen(pg.intColor(i, hues=len(items))))
+            self.sensorPlotWidget.addItem(item)
+            label = f"{channel.display_name} ({channel.units_name})"
+            self.sensorPlotWidget_legend.addItem(item, label if len(sessions) == 1 else f"{session.name}: {label}")
+        if len(items) > 0:
+            self.sensorPlotWidget.autoRange()
@@ -0,0 +1,97 @@
+"""Contains the MemoryBudget class definition.
+
+    A MemoryBudget limits the memory held by the sealed chunks of all SampleBuffers. Every SampleBuffer reports its
+    chunks to a budget as it seals them (by default to GLOBAL_BUDGET, configured by the SensorServiceItemModel). When
+    the sealed chunks in memory exceed the budget's limit, the oldest chunks are spilled: written to a temporary file
+    and replaced by a read-only np.memmap of that file. A memmap is an ndarray, so spilled chunks remain readable by
+    plots, snapshots, and exports without any change on their side, and the operating system pages them in on demand.
+
+    Spill files are unlinked as soon as they are mapped where the platform allows it, so their disk space is returned
+    when the last snapshot referring to them is released. Otherwise they are removed with the spill directory at exit.
+
+    Examples:
+    GLOBAL_BUDGET.setLimitBytes(512 * 2 ** 20)
+    resident_bytes, spilled_bytes = GLOBAL_BUDGET.usage()
+"""
+
+import os
+import tempfile
+import weakref
+from collections import deque
+from typing import Tuple
+
+import numpy as np
+
+
+class MemoryBudget:
+    """Limit on the memory used by the sealed chunks of a set of SampleBuffers.
+
+    Keyword Args:
+        limit_bytes: bytes of sealed chunks to keep in memory before spilling the oldest to disk
+    """
+
+    LIMIT_BYTES = 1024 * 2 ** 20
+
+    # region Class Initializer
+
+    def __init__(self, limit_bytes: int = LIMIT_BYTES):
+        self.__limit_bytes = limit_bytes
+        self.__buffers = weakref.WeakSet()
+        self.__sealed = deque()  # (weak reference to buffer, buffer generation, chunk index), oldest first
+        self.__spill_dir = None
+        self.__spill_count = 0
+
+    # endregion
+
+    # region Instance Methods
+
+    def limitBytes(self) -> int:
+        return self.__limit_bytes
+
+    def setLimitBytes(self, limit_bytes: int) -> None:
+        """Sets the limit and spills chunks at once if the sealed chunks in memory exceed it."""
+        self.__limit_bytes = limit_bytes
+        self.__enforce()
+
+    def usage(self) -> Tuple[int, int]:
+        """Returns the bytes of sealed chunks held in memory and spilled to disk."""
+        buffers = list(self.__buffers)
+        return sum(b.residentBytes() for b in buffers), sum(b.spilledBytes() for b in buffers)
+
+    def sealed(self, buffer, generation: int, index: int) -> None:
+        """Called by a SampleBuffer when it seals a chunk. Spills the oldest chunks if the budget is exceeded."""
+        self.__buffers.add(buffer)
+        self.__sealed.append((weakref.ref(buffer), generation, index))
+        self.__enforce()
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __enforce(self):
+        resident_bytes, _ = self.usage()
+        while resident_bytes > self.__limit_bytes and len(self.__sealed) > 0:
+            buffer_ref, generation, index = self.__sealed.popleft()
+            buffer = buffer_ref()
+            if buffer is not None:  # Chunks of buffers that were cleared or deleted are skipped
+                resident_bytes -= buffer._spillChunk(generation, index, self.__spill)
+
+    def __spill(self, chunk: np.ndarray) -> np.memmap:
+        if self.__spill_dir is None:
+            self.__spill_dir = tempfile.TemporaryDirectory(prefix="sstk-spill-")
+
+        path = os.path.join(self.__spill_dir.name, f"{self.__spill_count}.bin")
+        self.__spill_count += 1
+        chunk.tofile(path)
+        mapped = np.memmap(path, dtype=chunk.dtype, mode="r", shape=chunk.shape)
+        try:
+            os.remove(path)  # The mapping keeps the data; not possible on Windows
+        except OSError:
+            pass
+        return mapped
+
+    # endregion
+
+
+# Budget shared by all SampleBuffers that are not given their own
+GLOBAL_BUDGET = MemoryBudget()
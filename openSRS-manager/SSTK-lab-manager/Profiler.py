@@ -0,0 +1,189 @@
+"""Contains the Profiler class definition and the profiled decorator.
+
+    The profiler is an opt-in instrumentation layer for finding where the application spends its time. Functions
+    decorated with @profiled (driver slots, model handlers, plot updates, exports) record a timing span per call while
+    GLOBAL_PROFILER is enabled; while it is disabled a call costs one attribute check. Spans are kept as a Chrome trace
+    (also read by speedscope and Perfetto) and summarized per function as call counts and latency histograms.
+
+    Profiling is enabled at startup by setting the environment variable SSTK_PROFILE to the path of the trace file to
+    write when the application exits (or to 1 for a timestamped file in the working directory), or from the Configure
+    menu.
+
+    Examples:
+    @pyqtSlot(name="__timer_timeout")
+    @profiled()
+    def __timer_timeout(self):
+        ...
+
+    with GLOBAL_PROFILER.span("load calibration"):
+        ...
+    GLOBAL_PROFILER.dump("profile.json")
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+PROFILE_ENV_VAR = "SSTK_PROFILE"
+
+
+class Profiler:
+    """Collector of timing spans.
+
+    Keyword Args:
+        max_events: number of spans kept for the trace; later spans are still counted in the statistics
+    """
+
+    MAX_EVENTS = 2000000
+    HISTOGRAM_BUCKETS = 32  # Bucket k counts durations of 2 ** (k - 1) to 2 ** k microseconds (k = 0: below 1 us)
+
+    # region Class Initializer
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled = False
+        self.__max_events = max_events
+        self.__lock = threading.Lock()
+        self.__origin_ns = time.perf_counter_ns()
+        self.__events: List[Tuple[str, int, int, int]] = []  # (name, start, duration in ns, thread id)
+        self.__dropped = 0
+        self.__stats: Dict[str, list] = {}  # name: [count, total duration in ns, histogram]
+        self.__thread_names: Dict[int, str] = {}
+
+    # endregion
+
+    # region Instance Methods
+
+    def setEnabled(self, enabled: bool) -> None:
+        """Starts or stops recording. Starting clears the spans of any previous recording."""
+        if enabled and not self.enabled:
+            self.clear()
+        self.enabled = enabled
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__origin_ns = time.perf_counter_ns()
+            self.__events = []
+            self.__dropped = 0
+            self.__stats = {}
+            self.__thread_names = {}
+
+    def record(self, name: str, start_ns: int, end_ns: int) -> None:
+        """Records a span of perf_counter_ns() times on the calling thread."""
+        duration_ns = end_ns - start_ns
+        bucket = min((duration_ns // 1000).bit_length(), Profiler.HISTOGRAM_BUCKETS - 1)
+        thread_id = threading.get_ident()
+        with self.__lock:
+            stats = self.__stats.get(name)
+            if stats is None:
+                stats = self.__stats[name] = [0, 0, [0] * Profiler.HISTOGRAM_BUCKETS]
+            stats[0] += 1
+            stats[1] += duration_ns
+            stats[2][bucket] += 1
+
+            if len(self.__events) < self.__max_events:
+                self.__events.append((name, start_ns, duration_ns, thread_id))
+            else:
+                self.__dropped += 1
+            if thread_id not in self.__thread_names:
+                self.__thread_names[thread_id] = threading.current_thread().name
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Context manager recording its body as a span, if the profiler is enabled."""
+        if not self.enabled:
+            yield
+            return
+
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start_ns, time.perf_counter_ns())
+
+    def statistics(self) -> Dict[str, dict]:
+        """Returns per span name the call count, total and mean duration, latency histogram, and percentiles.
+
+        Percentiles are the upper edges of the histogram buckets they fall in, so they are accurate to a factor of 2.
+        """
+        with self.__lock:
+            stats = {name: (count, total_ns, list(histogram)) for name, (count, total_ns, histogram)
+                     in self.__stats.items()}
+
+        summary = {}
+        for name, (count, total_ns, histogram) in stats.items():
+            def percentile_us(q: float) -> int:
+                cumulative = 0
+                for k, n in enumerate(histogram):
+                    cumulative += n
+                    if cumulative >= q * count:
+                        return 2 ** k
+                return 2 ** (len(histogram) - 1)
+
+            summary[name] = {"count": count, "total_ms": total_ns / 1.E6, "mean_us": total_ns / count / 1000.,
+                             "p50_us": percentile_us(0.5), "p95_us": percentile_us(0.95),
+                             "p99_us": percentile_us(0.99), "histogram_us": histogram}
+        return summary
+
+    def summaryText(self) -> str:
+        """Returns the statistics as a table, slowest total first."""
+        lines = [f"{'span':<56} {'count':>9} {'total ms':>10} {'mean us':>9} {'p95 us':>8} {'p99 us':>8}"]
+        for name, s in sorted(self.statistics().items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"{name[-56:]:<56} {s['count']:>9} {s['total_ms']:>10.1f} {s['mean_us']:>9.1f} "
+                         f"{s['p95_us']:>8} {s['p99_us']:>8}")
+        return "\n".join(lines)
+
+    def dump(self, file_path: str) -> None:
+        """Writes the recorded spans as a Chrome trace (JSON object format), with the statistics in otherData."""
+        with self.__lock:
+            events, origin_ns, dropped = list(self.__events), self.__origin_ns, self.__dropped
+            thread_names = dict(self.__thread_names)
+
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+                        for tid, thread_name in thread_names.items()]
+        trace_events.extend({"name": name, "cat": "sstk", "ph": "X", "pid": pid, "tid": tid,
+                             "ts": (start_ns - origin_ns) / 1000., "dur": duration_ns / 1000.}
+                            for name, start_ns, duration_ns, tid in events)
+
+        with open(file_path, "w") as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": dropped, "statistics": self.statistics()}}, trace_file)
+
+    # endregion
+
+
+# Profiler used by @profiled; enabled at startup if SSTK_PROFILE is set
+GLOBAL_PROFILER = Profiler()
+GLOBAL_PROFILER.setEnabled(os.environ.get(PROFILE_ENV_VAR, "") != "")
+
+
+def profiled(name: str = None) -> Callable:
+    """Decorator recording each call of a function as a span of GLOBAL_PROFILER.
+
+    Apply it below @pyqtSlot so that the slot signature is declared on the wrapper.
+
+    Args:
+        name: span name, the function's qualified name by default
+    """
+
+    def decorator(function: Callable) -> Callable:
+        span_name = function.__qualname__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not GLOBAL_PROFILER.enabled:
+                return function(*args, **kwargs)
+
+            start_ns = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                GLOBAL_PROFILER.record(span_name, start_ns, time.perf_counter_ns())
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,100 @@
+"""Contains the ChannelRecording and RecordingSession class definitions.
+
+    When a recording stops, the SensorServiceItemModel moves the SampleBuffers of every channel that recorded samples
+    into a RecordingSession and gives the channels new, empty buffers for the next recording. Sessions therefore keep
+    the sealed chunks they were recorded into (still subject to the MemoryBudget), and no samples are copied. Sessions
+    are shown, overlaid, and exported from the buffers directly.
+
+    Examples:
+    session = mySensorServiceItemModel.sessions()[-1]
+    snapshots = [(c.display_name, c.snapshot()) for c in session.channels]
+"""
+
+import datetime as dt
+from typing import List, Tuple, Union
+
+import pyqtgraph as pg
+
+import SampleBuffer as sb
+
+
+class ChannelRecording:
+    """Samples of one channel during one recording.
+
+    Args:
+        display_name: the channel's display name when it was recorded
+        device_address: address of the channel's device
+        units_name: the channel's units
+        samples: raw samples
+        filtered: filtered samples, or None if no filter was set
+        heel_strikes: heel strikes detected during the recording
+        show_filtered: whether the filtered samples are displayed and exported
+        alignment_offset_us: offset added to the timestamps on display and export. See
+                             SensorServiceDriver.alignmentOffsetUs
+        source: the SensorChannel that recorded the samples
+    """
+
+    def __init__(self, display_name: str, device_address: str, units_name: str, samples: sb.SampleBuffer,
+                 filtered: Union[sb.SampleBuffer, None], heel_strikes: sb.SampleBuffer, show_filtered: bool,
+                 alignment_offset_us: int, source=None):
+        self.display_name = display_name
+        self.device_address = device_address
+        self.units_name = units_name
+        self.samples = samples
+        self.filtered = filtered
+        self.heel_strikes = heel_strikes
+        self.show_filtered = show_filtered and filtered is not None and len(filtered) > 0
+        self.alignment_offset_us = alignment_offset_us
+        self.source = source
+        self.__plot_data_item = None
+
+    def displayedBuffer(self) -> sb.SampleBuffer:
+        return self.filtered if self.show_filtered else self.samples
+
+    def snapshot(self) -> sb.SampleSnapshot:
+        """Returns the displayed (raw or filtered) samples, aligned."""
+        return self.displayedBuffer().snapshot().shifted(self.alignment_offset_us)
+
+    def heel_strike_snapshot(self) -> sb.SampleSnapshot:
+        return self.heel_strikes.snapshot().shifted(self.alignment_offset_us)
+
+    def plotDataItem(self, origin_us: int) -> pg.PlotDataItem:
+        """Returns a PlotDataItem of the displayed samples with times relative to origin_us.
+
+        The item is created on first use and moved into place with setPos, so showing the session again, or relative
+        to another origin, does not copy its samples again. The contiguous copy of the samples is freed by
+        releasePlotDataItem().
+        """
+        if self.__plot_data_item is None:
+            data = self.displayedBuffer().snapshot().to_array()
+            self.__plot_data_item = pg.PlotDataItem(x=data["timestamp_us"], y=data["value"])
+        self.__plot_data_item.setPos(self.alignment_offset_us - origin_us, 0)
+        return self.__plot_data_item
+
+    def releasePlotDataItem(self) -> None:
+        """Drops the plot data, e.g. when the session is no longer shown."""
+        self.__plot_data_item = None
+
+
+class RecordingSession:
+    """Channels recorded together between one start and stop of recording.
+
+    Args:
+        name: name shown to the user
+        epoch: time the recording started
+        channels: recordings of the channels that recorded samples
+    """
+
+    def __init__(self, name: str, epoch: dt.datetime, channels: List[ChannelRecording]):
+        self.name = name
+        self.epoch = epoch
+        self.channels = channels
+
+    def timeRange(self) -> Tuple[int, int]:
+        """Returns the earliest and latest timestamps of the session's samples in microseconds since epoch."""
+        ranges = [(c.samples.first()["timestamp_us"] + c.alignment_offset_us,
+                   c.samples.last()["timestamp_us"] + c.alignment_offset_us)
+                  for c in self.channels if len(c.samples) > 0]
+        if len(ranges) == 0:
+            return 0, 0
+        return int(min(r[0] for r in ranges)), int(max(r[1] for r in ranges))
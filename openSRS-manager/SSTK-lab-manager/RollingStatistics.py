@@ -0,0 +1,126 @@
+"""Contains the RollingStatistics class definition.
+
+    RollingStatistics maintains the mean, RMS, variance, minimum, and maximum of the most recent samples of a signal
+    with O(1) amortized work per sample: running sums over a ring buffer for the moments, and monotonic deques of
+    candidate extremes for the minimum and maximum.
+
+    Examples:
+    stats = RollingStatistics(250)
+    stats.update(np.array([512.3, 512.4, 511.9]))
+    stats.mean(), stats.minimum(), stats.maximum()
+"""
+
+from collections import deque
+from typing import Union
+
+import numpy as np
+
+
+class RollingStatistics:
+    """Statistics over a sliding window of the last window_length samples.
+
+    Args:
+        window_length: number of samples in the window
+    """
+
+    WINDOW_LENGTH = 250  # 1 s of data at 250 Hz
+
+    # region Class Initializer
+
+    def __init__(self, window_length: int = WINDOW_LENGTH):
+        if window_length < 1:
+            raise ValueError("window_length must be at least 1.")
+
+        self.__window_length = window_length
+        self.__ring = np.zeros(window_length)
+        self.__count = 0  # Total number of samples seen
+        self.__shift = 0.0  # Sums are of (value - shift), with shift = first sample, to keep the variance accurate
+        self.__sum = 0.0
+        self.__sum_sq = 0.0
+
+        # Monotonic deques of (sample number, value): increasing values for the minimum, decreasing for the maximum
+        self.__min_deque = deque()
+        self.__max_deque = deque()
+
+    # endregion
+
+    # region Instance Methods
+
+    def __len__(self) -> int:
+        return min(self.__count, self.__window_length)
+
+    def window_length(self) -> int:
+        return self.__window_length
+
+    def reset(self) -> None:
+        """Forgets all samples."""
+        self.__count = 0
+        self.__sum = 0.0
+        self.__sum_sq = 0.0
+        self.__min_deque.clear()
+        self.__max_deque.clear()
+
+    def update(self, values: np.ndarray) -> None:
+        """Adds a batch of samples to the window, evicting the oldest samples beyond window_length."""
+        values = np.asarray(values, dtype=np.float64)[-self.__window_length:]
+        n = len(values)
+        if n == 0:
+            return
+        if self.__count == 0:
+            self.__shift = values[0]
+
+        # Moments: add the batch and subtract the samples it overwrites in the ring
+        positions = (self.__count + np.arange(n)) % self.__window_length
+        evicted = self.__ring[positions] if self.__count >= self.__window_length else \
+            self.__ring[positions][np.arange(self.__count, self.__count + n) >= self.__window_length]
+        shifted = values - self.__shift
+        self.__sum += shifted.sum() - evicted.sum()
+        self.__sum_sq += np.dot(shifted, shifted) - np.dot(evicted, evicted)
+        self.__ring[positions] = values - self.__shift
+
+        # Extremes
+        for i, value in enumerate(values.tolist(), start=self.__count):
+            while self.__min_deque and self.__min_deque[-1][1] >= value:
+                self.__min_deque.pop()
+            self.__min_deque.append((i, value))
+            while self.__max_deque and self.__max_deque[-1][1] <= value:
+                self.__max_deque.pop()
+            self.__max_deque.append((i, value))
+
+        # Window wrapped around: recompute the sums exactly to stop rounding errors from accumulating
+        previous_count, self.__count = self.__count, self.__count + n
+        if previous_count // self.__window_length != self.__count // self.__window_length:
+            window = self.__ring[:len(self)]
+            self.__sum = window.sum()
+            self.__sum_sq = np.dot(window, window)
+
+        oldest = self.__count - self.__window_length
+        while self.__min_deque[0][0] < oldest:
+            self.__min_deque.popleft()
+        while self.__max_deque[0][0] < oldest:
+            self.__max_deque.popleft()
+
+    def mean(self) -> Union[float, None]:
+        return None if self.__count == 0 else self.__shift + self.__sum / len(self)
+
+    def rms(self) -> Union[float, None]:
+        if self.__count == 0:
+            return None
+        mean_shifted = self.__sum / len(self)
+        mean_sq = self.__sum_sq / len(self) + self.__shift * (2.0 * mean_shifted + self.__shift)
+        return float(np.sqrt(max(mean_sq, 0.0)))
+
+    def variance(self) -> Union[float, None]:
+        """Population variance of the samples in the window."""
+        if self.__count == 0:
+            return None
+        mean = self.__sum / len(self)
+        return max(self.__sum_sq / len(self) - mean * mean, 0.0)
+
+    def minimum(self) -> Union[float, None]:
+        return None if self.__count == 0 else self.__min_deque[0][1]
+
+    def maximum(self) -> Union[float, None]:
+        return None if self.__count == 0 else self.__max_deque[0][1]
+
+    # endregion
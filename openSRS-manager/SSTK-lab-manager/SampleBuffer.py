@@ -0,0 +1,270 @@
+"""Contains the SampleBuffer and SampleSnapshot class definitions.
+
+    A SampleBuffer stores a SensorChannel's recorded samples as a list of fixed-size chunks. Samples are appended to an
+    active chunk; once it is full the chunk is sealed (made read-only) and a new active chunk is started. Because
+    sealed chunks never change and the filled part of the active chunk is never rewritten, a SampleSnapshot of the
+    buffer's current extent can be taken in O(1) and read from another thread while recording continues.
+
+    Sealed chunks count against a MemoryBudget, which may replace the oldest of them with read-only memory-mapped
+    copies on disk. Snapshots and reads see the same samples either way. Every SPILL_MERGE_CHUNKS consecutive spilled
+    chunks are merged into one, so that a long recording does not hold one memory map per chunk.
+
+    Examples:
+    buf = SampleBuffer()
+    buf.append(np.array([0, 4000]), np.array([512.3, 512.4]))
+    snap = buf.snapshot()
+    data = snap.to_array()
+    plotted = snap.decimated(max_points=20000)
+"""
+
+from typing import Callable, List
+
+import numpy as np
+
+import MemoryBudget as mb
+
+SAMPLE_DTYPE = np.dtype([("timestamp_us", np.int64), ("value", np.float64)])
+
+
+def _bucketExtremes(samples: np.ndarray, factor: int) -> np.ndarray:
+    # Lowest and highest sample of each bucket of factor consecutive samples, in time order
+    values = samples["value"].reshape(-1, factor)
+    starts = np.arange(0, len(samples), factor)
+    picks = np.stack((starts + np.argmin(values, axis=1), starts + np.argmax(values, axis=1)), axis=1)
+    return samples[np.sort(picks, axis=1).ravel()]
+
+
+class SampleSnapshot:
+    """Immutable view of the samples held by a SampleBuffer at the time the snapshot was taken.
+
+    Args:
+        sealed: the buffer's list of sealed chunks (only the first num_sealed entries belong to the snapshot)
+        num_sealed: number of sealed chunks in the snapshot
+        active: the buffer's active chunk
+        active_len: number of filled samples in the active chunk
+
+    Keyword Args:
+        offset_us: offset added to the timestamps of the samples read from the snapshot
+    """
+
+    def __init__(self, sealed: List[np.ndarray], num_sealed: int, active: np.ndarray, active_len: int,
+                 offset_us: int = 0):
+        self.__sealed = sealed
+        self.__num_sealed = num_sealed
+        self.__active = active
+        self.__active_len = active_len
+        self.__offset_us = int(offset_us)
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.__sealed[:self.__num_sealed]) + self.__active_len
+
+    def chunks(self) -> List[np.ndarray]:
+        """Returns the snapshot's samples as a list of structured arrays, oldest first."""
+        chunks = self.__sealed[:self.__num_sealed]
+        if self.__active_len > 0:
+            chunks.append(self.__active[:self.__active_len])
+        if self.__offset_us != 0:
+            chunks = [chunk.copy() for chunk in chunks]
+            for chunk in chunks:
+                chunk["timestamp_us"] += self.__offset_us
+        return chunks
+
+    def shifted(self, offset_us: int) -> "SampleSnapshot":
+        """Returns a snapshot of the same samples with offset_us added to their timestamps, e.g. to align a channel."""
+        return SampleSnapshot(self.__sealed, self.__num_sealed, self.__active, self.__active_len,
+                              offset_us=self.__offset_us + offset_us)
+
+    def to_array(self) -> np.ndarray:
+        """Returns the snapshot's samples as one contiguous structured array (copied)."""
+        chunks = self.chunks()
+        if len(chunks) == 0:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        return np.concatenate(chunks)
+
+    def decimated(self, max_points: int) -> np.ndarray:
+        """Returns at most max_points (at least 2) of the snapshot's samples to plot, read chunk by chunk.
+
+        A snapshot of up to max_points samples is returned whole. A longer one is split into buckets of consecutive
+        samples and the lowest and highest sample of each bucket are returned, in time order, so that peaks are drawn
+        without copying the whole snapshot into one array.
+        """
+        count = len(self)
+        if count <= max_points:
+            return self.to_array()
+
+        factor = -(-count // max(max_points // 2, 1))
+        parts = []
+        carry = np.empty(0, dtype=SAMPLE_DTYPE)
+        for chunk in self.chunks():
+            samples = np.concatenate((carry, chunk)) if len(carry) > 0 else chunk
+            num_whole = len(samples) // factor * factor
+            parts.append(_bucketExtremes(samples[:num_whole], factor))
+            carry = samples[num_whole:]
+        if len(carry) > 0:
+            parts.append(_bucketExtremes(carry, len(carry)))
+        return np.concatenate(parts)
+
+
+class SampleBuffer:
+    """Append-only, chunked store of timestamp-value samples.
+
+    Samples are stored in Numpy structured arrays with fields 'timestamp_us' (int64) and 'value' (float64).
+
+    Keyword Args:
+        chunk_size: number of samples per chunk
+        budget: MemoryBudget the sealed chunks count against (default: MemoryBudget.GLOBAL_BUDGET)
+    """
+
+    CHUNK_SIZE = 8192  # Samples per chunk (about 33 s of data at 250 Hz)
+    SPILL_MERGE_CHUNKS = 64  # Consecutive spilled chunks merged into one memory map
+
+    # region Class Initializer
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, budget: mb.MemoryBudget = None):
+        self.__chunk_size = chunk_size
+        self.__sealed: List[np.ndarray] = []
+        self.__sealed_len = 0
+        self.__active = np.empty(chunk_size, dtype=SAMPLE_DTYPE)
+        self.__active_len = 0
+        self.__merged_chunks = 0  # Chunks removed from __sealed by merging spilled chunks
+
+        self.__budget = mb.GLOBAL_BUDGET if budget is None else budget
+        self.__generation = 0  # Incremented by clear(), so that the budget does not spill chunks of a past generation
+        self.__resident_bytes = 0
+        self.__spilled_bytes = 0
+
+    # endregion
+
+    # region Instance Methods
+
+    def __len__(self) -> int:
+        return self.__sealed_len + self.__active_len
+
+    def append(self, timestamps_us: np.ndarray, values: np.ndarray) -> None:
+        """Appends a batch of samples to the buffer, sealing chunks as they fill."""
+        timestamps_us = np.asarray(timestamps_us)
+        values = np.asarray(values)
+        offset = 0
+        while offset < len(values):
+            take = min(self.__chunk_size - self.__active_len, len(values) - offset)
+            dest = self.__active[self.__active_len:self.__active_len + take]
+            dest["timestamp_us"] = timestamps_us[offset:offset + take]
+            dest["value"] = values[offset:offset + take]
+            self.__active_len += take
+            offset += take
+
+            if self.__active_len == self.__chunk_size:
+                self.__seal()
+
+    def clear(self) -> None:
+        """Removes all samples. Existing snapshots are unaffected."""
+        self.__sealed = []
+        self.__sealed_len = 0
+        self.__active = np.empty(self.__chunk_size, dtype=SAMPLE_DTYPE)
+        self.__active_len = 0
+        self.__merged_chunks = 0
+        self.__generation += 1
+        self.__resident_bytes = 0
+        self.__spilled_bytes = 0
+
+    def residentBytes(self) -> int:
+        """Returns the bytes of sealed chunks held in memory."""
+        return self.__resident_bytes
+
+    def spilledBytes(self) -> int:
+        """Returns the bytes of sealed chunks spilled to disk."""
+        return self.__spilled_bytes
+
+    def snapshot(self) -> SampleSnapshot:
+        """Freezes the current extent of the buffer in O(1)."""
+        return SampleSnapshot(self.__sealed, len(self.__sealed), self.__active, self.__active_len)
+
+    def chunks(self) -> List[np.ndarray]:
+        """Returns the buffer's samples as a list of structured arrays, oldest first."""
+        return self.snapshot().chunks()
+
+    def first(self) -> np.void:
+        """Returns the oldest sample. The buffer must not be empty."""
+        if len(self.__sealed) > 0:
+            return self.__sealed[0][0]
+        return self.__active[0]
+
+    def last(self) -> np.void:
+        """Returns the most recently appended sample. The buffer must not be empty."""
+        if self.__active_len > 0:
+            return self.__active[self.__active_len - 1]
+        return self.__sealed[-1][-1]
+
+    def since(self, min_timestamp_us: float) -> np.ndarray:
+        """Returns the samples with timestamps at or after min_timestamp_us, reading only the chunks that hold them."""
+        chunks = self.chunks()
+        if len(chunks) == 0:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+
+        first = len(chunks) - 1
+        while first > 0 and chunks[first]["timestamp_us"][0] > min_timestamp_us:
+            first -= 1
+
+        tail = np.concatenate(chunks[first:])
+        return tail[tail["timestamp_us"] >= min_timestamp_us]
+
+    def to_array(self) -> np.ndarray:
+        """Returns all samples as one contiguous structured array (copied, including spilled chunks).
+
+        The copy is not kept by the buffer or counted by the MemoryBudget; use snapshot().decimated() to plot.
+        """
+        return self.snapshot().to_array()
+
+    # endregion
+
+    # region Protected Instance Methods
+
+    def _spillChunk(self, generation: int, index: int, spill: Callable[[np.ndarray], np.ndarray]) -> int:
+        """Replaces a sealed chunk with spill(chunk), called by the MemoryBudget. Returns the bytes freed.
+
+        index counts the chunks sealed since the buffer was created or cleared, merged or not.
+        """
+        index -= self.__merged_chunks
+        if generation != self.__generation or not 0 <= index < len(self.__sealed):
+            return 0
+
+        chunk = self.__sealed[index]
+        if isinstance(chunk, np.memmap):
+            return 0
+        self.__sealed[index] = spill(chunk)
+        self.__resident_bytes -= chunk.nbytes
+        self.__spilled_bytes += chunk.nbytes
+        self.__mergeSpilled(index, spill)
+        return chunk.nbytes
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __seal(self) -> None:
+        self.__active.flags.writeable = False
+        self.__sealed.append(self.__active)
+        self.__sealed_len += self.__active_len
+        self.__resident_bytes += self.__active.nbytes
+        self.__active = np.empty(self.__chunk_size, dtype=SAMPLE_DTYPE)
+        self.__active_len = 0
+        self.__budget.sealed(self, self.__generation, self.__merged_chunks + len(self.__sealed) - 1)
+
+    def __mergeSpilled(self, last: int, spill: Callable[[np.ndarray], np.ndarray]) -> None:
+        # Merge the SPILL_MERGE_CHUNKS spilled, unmerged chunks ending at last, if there are as many
+        def unmergedSpill(chunk: np.ndarray) -> bool:
+            return isinstance(chunk, np.memmap) and len(chunk) == self.__chunk_size
+
+        num_merge = SampleBuffer.SPILL_MERGE_CHUNKS
+        first = last
+        while last - first + 1 < num_merge and first > 0 and unmergedSpill(self.__sealed[first - 1]):
+            first -= 1
+        if last - first + 1 < num_merge:
+            return
+
+        # A new list, so that snapshots sharing the old one keep their chunk indices
+        merged = spill(np.concatenate(self.__sealed[first:last + 1]))
+        self.__sealed = self.__sealed[:first] + [merged] + self.__sealed[last + 1:]
+        self.__merged_chunks += last - first
+
+    # endregion
@@ -8,13 +8,22 @@
     sc.add_sample(483943, 0.48502)
 """
 
+import logging
 from typing import Any, Union
 
 import numpy as np
 import pyqtgraph as pg
-from PyQt5.QtCore import Qt, QObject
-
+from PyQt5.QtCore import Qt, QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QAction, QMenu
+
+import GaitEventDetector as ged
+import Profiler as prof
+import RecordingSession as rec
+import RollingStatistics as rs
+import SampleBuffer as sb
 import SensorServiceItem as ssi
+import StreamingFilter as sf
 
 
 class SensorChannel(ssi.SensorServiceItem):
@@ -36,10 +45,24 @@ class SensorChannel(ssi.SensorServiceItem):
         units_name: Text abbreviation indicating the unit of measurement for data captured on the SensorChannel.
         display_decimal_places: Number of decimal places to be displayed in the user interface.
         samples: Array of timestamp-value pairs containing data captured by the sensor channel.
+        sample_buffer: SampleBuffer holding the samples captured by the sensor channel.
         latest_sample: Most recent sample received on the SensorChannel.
+        filter_name: Name of the StreamingFilter applied to the channel's samples, or None.
+        filtered_samples: Array of timestamp-value pairs containing the filtered samples.
+        show_filtered: Whether the filtered samples are displayed and exported instead of the raw samples.
+        statistics_window: Number of recent samples the rolling statistics are computed over.
+        detect_heel_strikes: Whether heel strikes are detected in the channel's samples.
+        heel_strikes: Array of timestamp-value pairs marking the heel strikes detected while recording.
         plot_data_item: pyqtgraph.PlotDataItem used to interface SensorChannel data into PyQtGraph.
     """
 
+    # Item data roles of the rolling statistics, refreshed by refreshStatistics()
+    MeanRole = Qt.UserRole + 1
+    RmsRole = Qt.UserRole + 2
+    VarianceRole = Qt.UserRole + 3
+    MinimumRole = Qt.UserRole + 4
+    MaximumRole = Qt.UserRole + 5
+
     # region Class Initializer
 
     def __init__(self, display_name: str, units_name: str = "", disp_dec_places: int = 1, parent: QObject = None):
@@ -55,10 +78,31 @@ class SensorChannel(ssi.SensorServiceItem):
         self.__display_dec_places: int = disp_dec_places
         self.__display_name: str = display_name
         self.__latest_sample: Union[float, None] = None
+        self.__display_text: Union[str, None] = None  # Cached DisplayRole text, None when it must be rebuilt
         self.__plot_data_item: pg.PlotDataItem = pg.PlotDataItem(name=f"{display_name} ({units_name})")
-        self.__samples: Union[np.ndarray, None] = None
+        self.__sample_buffer: sb.SampleBuffer = sb.SampleBuffer()
         self.__units_name: str = units_name
 
+        # Streaming filter state
+        self.__filter: Union[sf.StreamingFilter, None] = None
+        self.__filter_name: Union[str, None] = None
+        self.__filter_rate_hz: float = 0.0
+        self.__filter_last_us: Union[int, None] = None
+        self.__filtered_buffer: sb.SampleBuffer = sb.SampleBuffer()
+        self.__latest_filtered_sample: Union[float, None] = None
+        self.__show_filtered: bool = False
+
+        # Rolling statistics of the raw samples, and their values as of the last refreshStatistics()
+        self.__statistics: rs.RollingStatistics = rs.RollingStatistics()
+        self.__statistics_data = {}
+        self.__statistics_text = {}
+
+        # Gait event detection, with the events detected while recording
+        self.__heel_strike_detector: Union[ged.HeelStrikeDetector, None] = None
+        self.__heel_strike_buffer: sb.SampleBuffer = sb.SampleBuffer()
+
+        self.__contextMenu = self.__initContextMenu()
+
     # endregion
 
     # region Property Getters
@@ -86,10 +130,20 @@ class SensorChannel(ssi.SensorServiceItem):
         """Array of timestamp-value pairs containing data captured by the sensor channel.
 
         This value is a Numpy structured ndarray with fields 'timestamp_us' (int64) and 'value' (float) containing each
-        sample's collection time in microseconds since epoch and sensor value in native units, respectively.
+        sample's collection time in microseconds since epoch and sensor value in native units, respectively. It is a
+        new copy of the whole recording on every access; use snapshot() to read the samples chunk by chunk. A value of
+        None indicates that no samples have been recorded.
         """
 
-        return self.__samples
+        if len(self.__sample_buffer) == 0:
+            return None
+        return self.__sample_buffer.to_array()
+
+    @property
+    def sample_buffer(self) -> sb.SampleBuffer:
+        """SampleBuffer holding the samples captured by the sensor channel."""
+
+        return self.__sample_buffer
 
     @property
     def latest_sample(self) -> Union[float, None]:
@@ -100,6 +154,54 @@ class SensorChannel(ssi.SensorServiceItem):
 
         return self.__latest_sample
 
+    @property
+    def filter_name(self) -> Union[str, None]:
+        """Name of the StreamingFilter applied to the channel's samples, or None. See StreamingFilter.FILTER_PRESETS."""
+
+        return self.__filter_name
+
+    @property
+    def filtered_samples(self) -> Union[np.ndarray, None]:
+        """Array of timestamp-value pairs containing the filtered samples, in the same format as samples.
+
+        Filtered samples are recorded from the time filter_name was last set. A value of None indicates that no filtered
+        samples have been recorded.
+        """
+
+        if len(self.__filtered_buffer) == 0:
+            return None
+        return self.__filtered_buffer.to_array()
+
+    @property
+    def show_filtered(self) -> bool:
+        """Whether the filtered samples are displayed and exported instead of the raw samples."""
+
+        return self.__show_filtered
+
+    @property
+    def statistics_window(self) -> int:
+        """Number of recent samples the rolling statistics are computed over."""
+
+        return self.__statistics.window_length()
+
+    @property
+    def detect_heel_strikes(self) -> bool:
+        """Whether heel strikes are detected in the channel's samples. See GaitEventDetector.HeelStrikeDetector."""
+
+        return self.__heel_strike_detector is not None
+
+    @property
+    def heel_strikes(self) -> Union[np.ndarray, None]:
+        """Array of timestamp-value pairs marking the heel strikes detected while recording.
+
+        The format is the same as samples, with the channel value at each heel strike. A value of None indicates that
+        no heel strikes have been recorded.
+        """
+
+        if len(self.__heel_strike_buffer) == 0:
+            return None
+        return self.__heel_strike_buffer.to_array()
+
     @property
     def plot_data_item(self) -> pg.PlotDataItem:
         """pyqtgraph.PlotDataItem used to interface SensorChannel data into PyQtGraph."""
@@ -120,6 +222,7 @@ class SensorChannel(ssi.SensorServiceItem):
         """
 
         self.__display_name = display_name
+        self.__display_text = None
 
     @units_name.setter
     def units_name(self, units_name: str):
@@ -130,6 +233,7 @@ class SensorChannel(ssi.SensorServiceItem):
         """
 
         self.__units_name = units_name
+        self.__display_text = None
 
     @display_decimal_places.setter
     def display_decimal_places(self, display_decimal_places: int):
@@ -140,6 +244,57 @@ class SensorChannel(ssi.SensorServiceItem):
         """
 
         self.__display_dec_places = display_decimal_places
+        self.__display_text = None
+
+    @filter_name.setter
+    def filter_name(self, filter_name: Union[str, None]):
+        """Setter for property filter_name. Changing the filter restarts the filtered samples.
+
+        See Also:
+            help(filter_name)
+        """
+
+        if filter_name is not None and filter_name not in sf.FILTER_PRESETS:
+            raise ValueError(f"Unknown filter {filter_name}.")
+
+        self.__filter_name = filter_name
+        self.__filter = None
+        self.__filter_last_us = None
+        self.__filtered_buffer.clear()
+        self.__latest_filtered_sample = None
+        self.__display_text = None
+
+    @show_filtered.setter
+    def show_filtered(self, show_filtered: bool):
+        """Setter for property show_filtered.
+
+        See Also:
+            help(show_filtered)
+        """
+
+        self.__show_filtered = show_filtered
+        self.__display_text = None
+        self.updatePlotDataItem()
+
+    @statistics_window.setter
+    def statistics_window(self, statistics_window: int):
+        """Setter for property statistics_window. Restarts the rolling statistics.
+
+        See Also:
+            help(statistics_window)
+        """
+
+        self.__statistics = rs.RollingStatistics(statistics_window)
+
+    @detect_heel_strikes.setter
+    def detect_heel_strikes(self, detect_heel_strikes: bool):
+        """Setter for property detect_heel_strikes.
+
+        See Also:
+            help(detect_heel_strikes)
+        """
+
+        self.__heel_strike_detector = ged.HeelStrikeDetector() if detect_heel_strikes else None
 
     # endregion
 
@@ -156,36 +311,133 @@ class SensorChannel(ssi.SensorServiceItem):
             value: the sample's numeric value
         """
 
-        self.__latest_sample = value
-        if self.recording() and timestamp_us is not None:
-            new_sample = np.array([(timestamp_us, value)], dtype=[("timestamp_us", np.int64), ("value", np.float)])
-            self.__samples = new_sample if self.__samples is None else np.append(self.__samples, new_sample)
+        if timestamp_us is None:
+            self.__latest_sample = value
+            self.__display_text = None
+            return
+
+        self.add_samples(np.array([timestamp_us], dtype=np.int64), np.array([value], dtype=np.float64))
+
+    def add_samples(self, timestamps_us: np.ndarray, values: np.ndarray) -> None:
+        """Processes a batch of samples into the SensorChannel.
+
+        The latest_sample property is updated to the last value of the batch, and if currently recording, the batch is
+        added to the sample array. If a filter is set, the batch is filtered and the filtered samples are handled in the
+        same way. The samplesAdded signal is emitted with the raw samples whether or not the channel is recording.
+
+        Args:
+            timestamps_us: the samples' collection times in microseconds since some prior epoch
+            values: the samples' numeric values
+        """
+
+        if len(values) == 0:
+            return
+
+        self.__latest_sample = float(values[-1])
+        self.__statistics.update(values)
+        filtered = self.__filterBatch(timestamps_us, values)
+        if filtered is not None:
+            self.__latest_filtered_sample = float(filtered[-1])
+        self.__display_text = None
+
+        heel_strikes_us = None
+        if self.__heel_strike_detector is not None:
+            heel_strikes_us = self.__heel_strike_detector.process(timestamps_us, values)
+
+        if self.recording():
+            self.__sample_buffer.append(timestamps_us, values)
+            if filtered is not None:
+                self.__filtered_buffer.append(timestamps_us, filtered)
+            if heel_strikes_us is not None and len(heel_strikes_us) > 0:
+                self.__heel_strike_buffer.append(
+                    heel_strikes_us, values[np.searchsorted(timestamps_us, heel_strikes_us)])
+        self.samplesAdded.emit(timestamps_us, values)
+
+    def snapshot(self) -> sb.SampleSnapshot:
+        """Freezes the displayed (raw or filtered) samples recorded so far in O(1). See SampleBuffer.snapshot."""
+
+        return self.__displayedBuffer().snapshot()
+
+    def heel_strike_snapshot(self) -> sb.SampleSnapshot:
+        """Freezes the heel strikes recorded so far in O(1). See SampleBuffer.snapshot."""
+
+        return self.__heel_strike_buffer.snapshot()
+
+    def takeRecording(self) -> rec.ChannelRecording:
+        """Moves the samples and heel strikes recorded so far into a ChannelRecording and starts new, empty buffers.
 
-    def add_samples(self):
-        """todo: raises NotImplementedError"""
-        raise NotImplementedError
+        The channel's filter, detector, and statistics state carry on, so a new recording continues seamlessly.
+        """
+
+        recording = rec.ChannelRecording(self.__display_name, self.parent().deviceAddress(), self.__units_name,
+                                         self.__sample_buffer,
+                                         self.__filtered_buffer if self.__filter_name is not None else None,
+                                         self.__heel_strike_buffer, self.__showingFiltered(),
+                                         self.parent().alignmentOffsetUs(), source=self)
+        self.__sample_buffer = sb.SampleBuffer()
+        self.__filtered_buffer = sb.SampleBuffer()
+        self.__heel_strike_buffer = sb.SampleBuffer()
+        self.updatePlotDataItem()
+        return recording
 
     def clear_samples(self):
-        """Removes all samples from the sample array and sets the latest_sample value to None."""
+        """Removes all samples and heel strikes from the sample arrays and sets the latest_sample value to None."""
 
-        self.__samples = None
+        self.__sample_buffer.clear()
+        self.__filtered_buffer.clear()
+        self.__heel_strike_buffer.clear()
+        if self.__heel_strike_detector is not None:
+            self.__heel_strike_detector.reset()
         self.__latest_sample = None
+        self.__latest_filtered_sample = None
+        if self.__filter is not None:
+            self.__filter.reset()
+        self.__statistics.reset()
+        self.__statistics_data = {}
+        self.__statistics_text = {}
+        self.__display_text = None
         self.updatePlotDataItem()  # todo: remove this when plot data item stuff is figured out
 
+    @prof.profiled()
+    def refreshStatistics(self) -> None:
+        """Copies the current rolling statistics to the values returned by data() for the statistics roles.
+
+        The statistics are also formatted once here for statisticsText(), instead of each time a view asks for them.
+        """
+
+        stats = self.__statistics
+        self.__statistics_data = {
+            SensorChannel.MeanRole: stats.mean(),
+            SensorChannel.RmsRole: stats.rms(),
+            SensorChannel.VarianceRole: stats.variance(),
+            SensorChannel.MinimumRole: stats.minimum(),
+            SensorChannel.MaximumRole: stats.maximum(),
+        }
+        self.__statistics_text = {role: "" if value is None else f"{value:.{self.__display_dec_places}f}"
+                                  for role, value in self.__statistics_data.items()}
+
+    def statisticsText(self, role: int) -> str:
+        """Returns the statistic for a statistics role (MeanRole...MaximumRole) formatted for display."""
+
+        return self.__statistics_text.get(role, "")
+
     PLOT_MOVING_HIST_US = 5.0 * 1.E6  # Amount of plot history to show while recording
+    PLOT_MAX_POINTS = 100000  # Points to plot of a stopped recording, as the min/max of each bucket of samples
 
+    @prof.profiled()
     def updatePlotDataItem(self):
         # todo: move this to SensorServiceItemModel on UI refresh rate
 
-        if self.__samples is None:
+        sample_buffer = self.__displayedBuffer()
+        if len(sample_buffer) == 0:
             self.__plot_data_item.clear()
             return
 
         if self.recording():
-            timestamps_us = self.__samples["timestamp_us"]
-            trimmed_data = self.__samples[timestamps_us >= (timestamps_us[-1] - SensorChannel.PLOT_MOVING_HIST_US)]
+            last_timestamp_us = sample_buffer.last()["timestamp_us"]
+            trimmed_data = sample_buffer.since(last_timestamp_us - SensorChannel.PLOT_MOVING_HIST_US)
         else:
-            trimmed_data = self.__samples
+            trimmed_data = sample_buffer.snapshot().decimated(SensorChannel.PLOT_MAX_POINTS)
 
         self.__plot_data_item.setData(x=trimmed_data["timestamp_us"], y=trimmed_data["value"])
 
@@ -193,20 +445,22 @@ class SensorChannel(ssi.SensorServiceItem):
 
     # region SensorServiceItem Implementation
 
-    def contextMenu(self) -> None:
+    def contextMenu(self) -> QMenu:
         __doc__ = ssi.SensorServiceItem.contextMenu.__doc__  # Inherit docstring
-        return None
+        return self.__contextMenu
 
     def data(self, role: Qt.ItemDataRole = None) -> Any:
         __doc__ = ssi.SensorServiceItem.data.__doc__  # Inherit docstring
         if role == Qt.DisplayRole:
-            if self.__latest_sample is None:
-                return f"{self.__display_name}"
-            return f"{self.__display_name} - {self.__latest_sample:.{self.__display_dec_places}f} {self.__units_name}"
+            if self.__display_text is None:
+                self.__display_text = self.__displayText()
+            return self.__display_text
         elif role == Qt.EditRole:
             return self.__display_name
         elif role == Qt.CheckStateRole:
             return self.__checked_state
+        elif SensorChannel.MeanRole <= role <= SensorChannel.MaximumRole:
+            return self.__statistics_data.get(role)
 
         return None
 
@@ -218,12 +472,115 @@ class SensorChannel(ssi.SensorServiceItem):
         __doc__ = ssi.SensorServiceItem.setData.__doc__  # Inherit docstring
         if role == Qt.DisplayRole or role == Qt.EditRole:
             self.__display_name = value
+            self.__display_text = None
             self.__plot_data_item.setData(name=f"{self.__display_name} ({self.__units_name})")
         elif role == Qt.CheckStateRole:
-            self.__checked_state = value
+            if value != self.__checked_state:
+                self.__checked_state = value
+                self.checkStateChanged.emit()
         else:
             return False
 
         return True
 
     # endregion
+
+    # region Private Instance Methods
+
+    def __displayText(self) -> str:
+        latest_sample = self.__latest_filtered_sample if self.__showingFiltered() else self.__latest_sample
+        if latest_sample is None:
+            return f"{self.__display_name}"
+        return f"{self.__display_name} - {latest_sample:.{self.__display_dec_places}f} {self.__units_name}"
+
+    def __showingFiltered(self) -> bool:
+        return self.__show_filtered and self.__filter_name is not None
+
+    def __displayedBuffer(self) -> sb.SampleBuffer:
+        return self.__filtered_buffer if self.__showingFiltered() else self.__sample_buffer
+
+    def __filterBatch(self, timestamps_us: np.ndarray, values: np.ndarray) -> Union[np.ndarray, None]:
+        if self.__filter_name is None:
+            return None
+
+        # (Re)design the filter for the current sampling rate, estimated from the timestamps since the previous batch
+        previous_us, self.__filter_last_us = self.__filter_last_us, timestamps_us[-1]
+        first_us, intervals = (timestamps_us[0], len(timestamps_us) - 1) if previous_us is None else \
+            (previous_us, len(timestamps_us))
+        if intervals > 0 and timestamps_us[-1] > first_us:
+            rate_hz = 1.E6 * intervals / (timestamps_us[-1] - first_us)
+            if self.__filter is None or abs(rate_hz - self.__filter_rate_hz) > 0.01 * self.__filter_rate_hz:
+                try:
+                    self.__filter = sf.FILTER_PRESETS[self.__filter_name](rate_hz)
+                except ValueError as e:
+                    logging.error(f"Cannot apply filter {self.__filter_name} to {self.__display_name}: {e}")
+                    self.filter_name = None
+                    return None
+                self.__filter_rate_hz = rate_hz
+
+        if self.__filter is None:
+            return None
+        return self.__filter.process(values)
+
+    def __initContextMenu(self) -> QMenu:
+        context_menu = QMenu("Sensor Channel")
+        check_icon = QIcon("icons/check.svg")
+
+        # Filter menu
+        filter_menu = QMenu("Filter", context_menu)
+        context_menu.addMenu(filter_menu)
+        for filter_name in [None] + list(sf.FILTER_PRESETS):
+            action = QAction(check_icon, "None" if filter_name is None else filter_name, filter_menu)
+            action.setData(filter_name)
+            filter_menu.addAction(action)
+
+        show_filtered_action = QAction("Display and Export Filtered", context_menu)
+        show_filtered_action.setCheckable(True)
+        context_menu.addAction(show_filtered_action)
+
+        context_menu.addSeparator()
+        heel_strike_action = QAction("Detect Heel Strikes", context_menu)
+        heel_strike_action.setCheckable(True)
+        context_menu.addAction(heel_strike_action)
+
+        # Put a check by the current filter
+        context_menu.aboutToShow.connect(
+            lambda: [action.setIconVisibleInMenu(action.data() == self.__filter_name) for action in
+                     filter_menu.actions()])
+        context_menu.aboutToShow.connect(lambda: show_filtered_action.setChecked(self.__show_filtered))
+        context_menu.aboutToShow.connect(lambda: heel_strike_action.setChecked(self.detect_heel_strikes))
+
+        filter_menu.triggered.connect(self.__filterMenu_triggered)
+        show_filtered_action.triggered.connect(self.__showFilteredAction_triggered)
+        heel_strike_action.triggered.connect(self.__heelStrikeAction_triggered)
+
+        return context_menu
+
+    # endregion
+
+    # region Signals
+
+    # Emitted with (timestamps_us, values) arrays for every sample or batch of samples added to the channel
+    samplesAdded = pyqtSignal(object, object, name="samplesAdded")
+
+    # Emitted when the channel is checked or unchecked
+    checkStateChanged = pyqtSignal(name="checkStateChanged")
+
+    # endregion
+
+    # region Slots
+
+    @pyqtSlot(QAction, name="__filterMenu_triggered")
+    def __filterMenu_triggered(self, action: QAction):
+        self.filter_name = action.data()
+        self.updatePlotDataItem()
+
+    @pyqtSlot(bool, name="__showFilteredAction_triggered")
+    def __showFilteredAction_triggered(self, checked: bool):
+        self.show_filtered = checked
+
+    @pyqtSlot(bool, name="__heelStrikeAction_triggered")
+    def __heelStrikeAction_triggered(self, checked: bool):
+        self.detect_heel_strikes = checked
+
+    # endregion
@@ -9,13 +9,15 @@
 """
 
 import enum
-from typing import Any, List
+from typing import Any, List, Union
 
+import numpy as np
 from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QBluetoothUuid
-from PyQt5.QtCore import QObject, Qt, pyqtSlot, pyqtSignal, QTimer
+from PyQt5.QtCore import QObject, Qt, pyqtSlot, pyqtSignal
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QAction, QMenu
 
+import ClockSync as cs
 import SensorChannel as sc
 import SensorServiceItem as ssi
 
@@ -34,8 +36,17 @@ class SensorServiceDriver(ssi.SensorServiceItem):
     the SensorServiceItemModel is able to map devices' service UUIDs to specific drivers. At minimum, the instance
     methods samplingRate() and setSamplingRate(rate_hz: float) must be implemented. However, any other instance methods
     may be overridden to extend functionality.
+
+    Drivers whose devices timestamp samples with their own clock should feed time exchanges with the device to
+    _clockModel; _ingestFrame converts device timestamps to the host clock with it.
     """
 
+    # Icon files for each driver state, loaded once into __stateIcons on first use
+    __STATE_ICON_FILES = {DriverState.UnconnectedState: "icons/unconnected.png",
+                          DriverState.PreparingState: "icons/preparing.png",
+                          DriverState.ReadyState: "icons/prepared.png"}
+    __stateIcons = {}
+
     # region Abstract Static Methods
 
     @staticmethod
@@ -107,10 +118,13 @@ class SensorServiceDriver(ssi.SensorServiceItem):
         self._contextMenu = self._initContextMenu()
         self._driverState: DriverState = DriverState.UnconnectedState
         self._sensorChannels: List[sc.SensorChannel] = []
+        self._clockModel: cs.ClockModel = cs.ClockModel()
 
-        # UI Autorefresh Items
-        self._uiRefreshTimer: QTimer = QTimer(parent=self)
-        self._uiRefreshTimer.timeout.connect(self.__uiRefreshTimer_timeout)
+        # Cached data(): display text with the (driver state, sampling rate) it was built for, and the tri-state check
+        # state of the channels, None when it must be recomputed
+        self.__display_text_key = None
+        self.__display_text: str = ""
+        self.__check_state: Union[Qt.CheckState, None] = None
 
     # endregion
 
@@ -123,27 +137,28 @@ class SensorServiceDriver(ssi.SensorServiceItem):
     def data(self, role: Qt.ItemDataRole = None) -> Any:
         __doc__ = ssi.SensorServiceItem.data.__doc__  # Inherit docstring
         if role == Qt.DisplayRole or role == Qt.EditRole:
-            if self._driverState == DriverState.ReadyState:
-                return f"{type(self).deviceClass()} [{self.samplingRate()} Hz]"
-            return f"{type(self).deviceClass()} [{self.deviceAddress()}]"
+            key = (self._driverState, self.samplingRate() if self._driverState == DriverState.ReadyState else None)
+            if key != self.__display_text_key:
+                self.__display_text_key = key
+                if self._driverState == DriverState.ReadyState:
+                    self.__display_text = f"{type(self).deviceClass()} [{self.samplingRate()} Hz]"
+                else:
+                    self.__display_text = f"{type(self).deviceClass()} [{self.deviceAddress()}]"
+            return self.__display_text
         elif role == Qt.DecorationRole:
-            if self._driverState == DriverState.PreparingState:
-                return QIcon("icons/preparing.png")
-            if self._driverState == DriverState.ReadyState:
-                return QIcon("icons/prepared.png")
-            else:
-                return QIcon("icons/unconnected.png")
+            return SensorServiceDriver.__stateIcon(self._driverState)
         elif role == Qt.EditRole:
             return self.data(role=Qt.DisplayRole)
+        elif role == Qt.ToolTipRole:
+            if len(self._clockModel) == 0:
+                return f"{self.deviceName()} ({self.deviceAddress()})"
+            return (f"{self.deviceName()} ({self.deviceAddress()})\n"
+                    f"Clock offset {self._clockModel.offset() / 1000.:.2f} ms, "
+                    f"skew {self._clockModel.skew() * 1.E6:.1f} ppm ({len(self._clockModel)} exchanges)")
         elif role == Qt.CheckStateRole:
-            if len(self._sensorChannels) == 0:
-                return Qt.Unchecked
-            elif all([s_ch.data(Qt.CheckStateRole) == Qt.Checked for s_ch in self._sensorChannels]):
-                return Qt.Checked
-            elif all([s_ch.data(Qt.CheckStateRole) == Qt.Unchecked for s_ch in self._sensorChannels]):
-                return Qt.Unchecked
-            else:
-                return Qt.PartiallyChecked
+            if self.__check_state is None:
+                self.__check_state = self.__channelsCheckState()
+            return self.__check_state
 
         return None
 
@@ -154,7 +169,10 @@ class SensorServiceDriver(ssi.SensorServiceItem):
     def setData(self, value: Any, role: Qt.ItemDataRole = None):
         __doc__ = ssi.SensorServiceItem.setData.__doc__  # Inherit docstring
         if role == Qt.CheckStateRole:
-            return all([s_ch.setData(value, role) for s_ch in self._sensorChannels])
+            result = all([s_ch.setData(value, role) for s_ch in self._sensorChannels])
+            self.__check_state = None
+            self.dataChanged.emit(True, [Qt.CheckStateRole])
+            return result
         return False
 
     # endregion
@@ -184,21 +202,36 @@ class SensorServiceDriver(ssi.SensorServiceItem):
         for s_ch in self._sensorChannels:
             s_ch.clear_samples()
 
+    def alignmentOffsetUs(self) -> int:
+        """Returns the offset in microseconds added to the timestamps of the driver's channels when they are exported.
+
+        Drivers whose timestamps are on the host clock need no alignment. Drivers of external reference streams (see
+        drivers.ReferenceStream) return their estimated lag relative to the SRS channels.
+        """
+        return 0
+
     def epoch(self):
         return self.parent().epoch()
 
+    def updateUi(self) -> None:
+        """Refreshes the plot data and rolling statistics of the driver's sensor channels.
+
+        Called by the SensorServiceItemModel on its UI refresh tick, after which the model notifies views of the change.
+        """
+        for s_ch in self._sensorChannels:
+            s_ch.updatePlotDataItem()
+            s_ch.refreshStatistics()
+
     # Getters
 
-    def sensorChannels(self) -> List[sc.SensorChannel]:
-        return self._sensorChannels
+    def clockModel(self) -> cs.ClockModel:
+        return self._clockModel
 
-    def uiRefreshRate(self) -> float:
-        return 1000 // self._uiRefreshTimer.interval()
+    def driverState(self) -> DriverState:
+        return self._driverState
 
-    # Setters
-    def setUiRefreshRate(self, rate_hz) -> None:
-        self._uiRefreshTimer.setInterval(1000 // rate_hz)
-        self._uiRefreshTimer.stop() if rate_hz == 0.0 else self._uiRefreshTimer.start()
+    def sensorChannels(self) -> List[sc.SensorChannel]:
+        return self._sensorChannels
 
     # endregion
 
@@ -207,18 +240,39 @@ class SensorServiceDriver(ssi.SensorServiceItem):
     def _addSensorChannel(self, sensor_channel: sc.SensorChannel) -> None:
         self.rowsAboutToBeInserted.emit(len(self._sensorChannels), len(self._sensorChannels))
         self._sensorChannels.append(sensor_channel)
+        sensor_channel.checkStateChanged.connect(self.__sensorChannel_checkStateChanged)
+        self.__check_state = None
         self.rowsInserted.emit(len(self._sensorChannels), len(self._sensorChannels))
 
+    def _ingestFrame(self, epoch_us: int, samples: np.ndarray) -> None:
+        """Pushes a frame of uniformly sampled values into the driver's sensor channels.
+
+        Timestamps are converted from the device clock to the host clock with the driver's clock model.
+
+        Args:
+            epoch_us: collection time of the first sample in the frame in microseconds since epoch (device clock)
+            samples: 2D array with one row per sample and one column per channel, ordered the same as sensorChannels()
+        """
+        timestamps_us = epoch_us + np.round((1.E6 / self.samplingRate()) * np.arange(len(samples))).astype(np.int64)
+        timestamps_us = self._clockModel.toHost(timestamps_us)
+        for i_c, s_ch in enumerate(self.sensorChannels()):
+            s_ch.add_samples(timestamps_us, samples[:, i_c])
+
     def _clearSensorChannels(self) -> None:
         last_idx = len(self._sensorChannels) - 1
         self.rowsAboutToBeRemoved.emit(0, last_idx)
+        for s_ch in self._sensorChannels:
+            s_ch.checkStateChanged.disconnect(self.__sensorChannel_checkStateChanged)
         self._sensorChannels = []
+        self.__check_state = None
         self.rowsRemoved.emit(0, last_idx)
 
     def _removeSensorChannel(self, sensor_channel: sc.SensorChannel) -> None:
         idx = self._sensorChannels.index(sensor_channel)
         self.rowsAboutToBeRemoved.emit(idx, idx)
         self._sensorChannels.remove(sensor_channel)
+        sensor_channel.checkStateChanged.disconnect(self.__sensorChannel_checkStateChanged)
+        self.__check_state = None
         self.rowsRemoved.emit(idx, idx)
 
     def _setDriverState(self, state: DriverState):
@@ -270,6 +324,27 @@ class SensorServiceDriver(ssi.SensorServiceItem):
 
     # endregion
 
+    # region Private Instance Methods
+
+    def __channelsCheckState(self) -> Qt.CheckState:
+        if len(self._sensorChannels) == 0:
+            return Qt.Unchecked
+        elif all([s_ch.data(Qt.CheckStateRole) == Qt.Checked for s_ch in self._sensorChannels]):
+            return Qt.Checked
+        elif all([s_ch.data(Qt.CheckStateRole) == Qt.Unchecked for s_ch in self._sensorChannels]):
+            return Qt.Unchecked
+        else:
+            return Qt.PartiallyChecked
+
+    @staticmethod
+    def __stateIcon(state: DriverState) -> QIcon:
+        icon = SensorServiceDriver.__stateIcons.get(state)
+        if icon is None:
+            icon = SensorServiceDriver.__stateIcons[state] = QIcon(SensorServiceDriver.__STATE_ICON_FILES[state])
+        return icon
+
+    # endregion
+
     # region Signals
 
     dataChanged = pyqtSignal(bool, list, name="dataChanged")
@@ -283,6 +358,12 @@ class SensorServiceDriver(ssi.SensorServiceItem):
 
     # region Slots
 
+    @pyqtSlot(name="__sensorChannel_checkStateChanged")
+    def __sensorChannel_checkStateChanged(self):
+        # Repaint the driver's tri-state check box
+        self.__check_state = None
+        self.dataChanged.emit(False, [Qt.CheckStateRole])
+
     @pyqtSlot(name="__context_menu_aboutToShow")
     def __context_menu_aboutToShow(self):
         sampling_menu: QMenu = self._contextMenu.findChild(QMenu, "sampling_menu")
@@ -290,12 +371,4 @@ class SensorServiceDriver(ssi.SensorServiceItem):
         for action in sampling_menu.actions():
             action.setIconVisibleInMenu(action.data() == current_sampling_rate)
 
-    # UI Timer
-    @pyqtSlot(name="__uiRefreshTimer_timeout")
-    def __uiRefreshTimer_timeout(self):
-        if len(self._sensorChannels) > 0:
-            for s_ch in self.sensorChannels():
-                s_ch.updatePlotDataItem()
-            self.dataChanged.emit(True, [Qt.DisplayRole])
-
     # endregion
@@ -1,14 +1,21 @@
 import datetime as dt
 import logging
-from typing import Any
+from typing import Any, List
 
 from PyQt5.QtBluetooth import QBluetoothDeviceDiscoveryAgent, QBluetoothDeviceInfo
-from PyQt5.QtCore import QObject, QUuid, pyqtSlot, QAbstractItemModel, QModelIndex, pyqtSignal, Qt
+from PyQt5.QtCore import QObject, QUuid, pyqtSlot, QAbstractItemModel, QModelIndex, pyqtSignal, Qt, QTimer
 
+import CalibratedChannel as cc
+import DerivedChannel as dc
+import MemoryBudget as mb
+import Profiler as prof
+import RecordingSession as rec
 import SensorChannel as sc
 import SensorServiceDriver as ssd
 import drivers.SS16G3V197 as SS16G3V197
 import drivers.AthEngDCMk1 as AthEngDCMk1
+import drivers.ReferenceStream as ReferenceStream
+import drivers.VirtualDevice as VirtualDevice
 
 
 class SensorServiceItemModel(QAbstractItemModel):
@@ -16,6 +23,12 @@ class SensorServiceItemModel(QAbstractItemModel):
 
     UI_SENSOR_REFRESH_RATE_HZ = 5.0  # Rate in Hz to refresh the UI sensor values and plot
 
+    # Columns after the channel name: header text and the SensorChannel role providing the column's value
+    STATISTICS_COLUMNS = [("Mean", sc.SensorChannel.MeanRole), ("RMS", sc.SensorChannel.RmsRole),
+                          ("Variance", sc.SensorChannel.VarianceRole), ("Min", sc.SensorChannel.MinimumRole),
+                          ("Max", sc.SensorChannel.MaximumRole)]
+    __STATISTICS_ALIGNMENT = int(Qt.AlignRight | Qt.AlignVCenter)
+
     # region Class Initializer
 
     def __init__(self, parent: QObject = None):
@@ -28,6 +41,7 @@ class SensorServiceItemModel(QAbstractItemModel):
 
         # List for storing active service drivers
         self.__activeServiceDrivers = []
+        self.__virtualDevice = None  # Created with the first derived channel
 
         # Initialize Bluetooth discovery
         self.__deviceDiscoveryAgent = None
@@ -36,6 +50,13 @@ class SensorServiceItemModel(QAbstractItemModel):
         # Store recording and timing state
         self.__epoch = dt.datetime.now()
         self.__recording = False
+        self.__sessions: List[rec.RecordingSession] = []  # Completed recordings, oldest first
+        self.__session_count = 0
+
+        # Single UI refresh tick for all drivers, coalescing their updates into one view refresh
+        self.__uiRefreshTimer = QTimer(parent=self)
+        self.__uiRefreshTimer.timeout.connect(self.__uiRefreshTimer_timeout)
+        self.setUiRefreshRate(SensorServiceItemModel.UI_SENSOR_REFRESH_RATE_HZ)
 
     # endregion
 
@@ -53,10 +74,13 @@ class SensorServiceItemModel(QAbstractItemModel):
         return QModelIndex()
 
     def hasIndex(self, row: int, column: int, parent: QModelIndex = None, *args, **kwargs):
+        if column < 0 or column >= self.columnCount():
+            return False
+
         if parent is None or not parent.isValid():
-            return row < len(self.__activeServiceDrivers) and column == 0
-        elif isinstance(parent.internalPointer(), ssd.SensorServiceDriver):
-            return row < len(parent.internalPointer().sensorChannels()) and column == 0
+            return 0 <= row < len(self.__activeServiceDrivers)
+        elif isinstance(parent.internalPointer(), ssd.SensorServiceDriver) and parent.column() == 0:
+            return 0 <= row < len(parent.internalPointer().sensorChannels())
 
         return False
 
@@ -73,15 +97,25 @@ class SensorServiceItemModel(QAbstractItemModel):
     def rowCount(self, parent: QModelIndex = None, *args, **kwargs):
         if parent is None or not parent.isValid():
             return len(self.__activeServiceDrivers)
-        elif isinstance(parent.internalPointer(), ssd.SensorServiceDriver):
+        elif isinstance(parent.internalPointer(), ssd.SensorServiceDriver) and parent.column() == 0:
             return len(parent.internalPointer().sensorChannels())
 
         return 0
 
     def columnCount(self, parent: QModelIndex = None, *args, **kwargs):
-        return 1
+        return 1 + len(SensorServiceItemModel.STATISTICS_COLUMNS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = None):
+        if orientation != Qt.Horizontal or role != Qt.DisplayRole:
+            return None
+        if section == 0:
+            return "Sensor"
+        return SensorServiceItemModel.STATISTICS_COLUMNS[section - 1][0]
 
     def data(self, index: QModelIndex, role: int = None):
+        if index.column() > 0:
+            return self.__statisticsData(index, role)
+
         if isinstance(index.internalPointer(), ssd.SensorServiceDriver):
             return index.internalPointer().data(role)
         elif isinstance(index.internalPointer(), sc.SensorChannel):
@@ -90,26 +124,101 @@ class SensorServiceItemModel(QAbstractItemModel):
         return None
 
     def setData(self, index: QModelIndex, value: Any, role: int = None):
-        if not index.isValid():
+        if not index.isValid() or index.column() > 0:
             return False
 
         return index.internalPointer().setData(value, role)
 
     def flags(self, index: QModelIndex):
         if index.isValid():
+            if index.column() > 0:
+                return Qt.ItemIsEnabled
             return index.internalPointer().flags()
 
     # endregion
 
     # region Instance Methods
 
+    def addServiceDriver(self, driver: ssd.SensorServiceDriver) -> None:
+        """Connects a service driver to the model and appends it as a new top-level row.
+
+        Drivers are normally created by Bluetooth discovery, but drivers that do not depend on a discovered device (for
+        example drivers.SimulatedDevice) may be added directly.
+        """
+        driver.setParent(self)
+        driver.dataChanged.connect(self.__activeServiceDriver_dataChanged)
+        driver.error.connect(self.__activeServiceDriver_error)
+        driver.rowsAboutToBeInserted.connect(self.__activeServiceDriver_rowsAboutToBeInserted)
+        driver.rowsAboutToBeRemoved.connect(self.__activeServiceDriver_rowsAboutToBeRemoved)
+        driver.rowsInserted.connect(self.__activeServiceDriver_rowsInserted)
+        driver.rowsRemoved.connect(self.__activeServiceDriver_rowsRemoved)
+        new_idx = len(self.__activeServiceDrivers)
+
+        # Notify model of new row
+        self.beginInsertRows(QModelIndex(), new_idx, new_idx)
+        self.__activeServiceDrivers.append(driver)
+        self.endInsertRows()
+
+    def addDerivedChannel(self, display_name: str, expression: str, units_name: str = "") -> dc.DerivedChannel:
+        """Creates a DerivedChannel over the model's sensor channels and adds it to the model's VirtualDevice.
+
+        Raises:
+            ValueError: the expression is invalid or references an unknown channel
+        """
+        derived_channel = dc.DerivedChannel(display_name, expression, self.sensorChannels(), units_name=units_name)
+        self.__addVirtualChannel(derived_channel)
+        logging.info(f"Added derived channel {display_name} = {expression}.")
+        return derived_channel
+
+    def addCalibratedChannels(self, file_path: str) -> List[cc.CalibratedChannel]:
+        """Creates a CalibratedChannel for each linear model in a calibration file.
+
+        All models are validated and resolved against the model's sensor channels before any channel is added.
+
+        Raises:
+            OSError: the file cannot be read
+            ValueError: the file is invalid or a model input does not resolve to exactly one channel
+        """
+        calibrated_channels = [cc.CalibratedChannel(model, self.sensorChannels())
+                               for model in cc.loadCalibration(file_path)]
+        for calibrated_channel in calibrated_channels:
+            self.__addVirtualChannel(calibrated_channel)
+            logging.info(f"Added calibrated channel {calibrated_channel.display_name} = "
+                         f"{calibrated_channel.expression}.")
+        return calibrated_channels
+
+    def addReferenceStream(self, port: int) -> ReferenceStream.ReferenceStream:
+        """Starts listening for a reference stream on a local UDP port and adds it to the model.
+
+        Raises:
+            OSError: the port cannot be bound
+        """
+        reference_stream = ReferenceStream.ReferenceStream(port)
+        self.addServiceDriver(reference_stream)
+        logging.info(f"Listening for a reference stream on UDP port {port}.")
+        return reference_stream
+
     def clearRecordedData(self):
+        """Removes the samples of all channels and all recorded sessions."""
         for driver in self.__activeServiceDrivers:
             driver.clearRecordedData()
+        self.__sessions = []
+        self.sessionsChanged.emit()
+
+    def removeSession(self, session: rec.RecordingSession) -> None:
+        self.__sessions.remove(session)
+        self.sessionsChanged.emit()
+
+    def sessions(self) -> List[rec.RecordingSession]:
+        """Returns the recorded sessions, oldest first. See RecordingSession."""
+        return self.__sessions
 
     def epoch(self) -> dt.datetime:
         return self.__epoch
 
+    def sensorChannels(self):
+        return [s_ch for driver in self.__activeServiceDrivers for s_ch in driver.sensorChannels()]
+
     def selectedChannels(self):
         checked = [s_ch.internalPointer() for s_ch in
                    self.match(self.index(0, 0), Qt.CheckStateRole, Qt.Checked, hits=-1,
@@ -117,6 +226,15 @@ class SensorServiceItemModel(QAbstractItemModel):
                    if isinstance(s_ch.internalPointer(), sc.SensorChannel)]
         return checked
 
+    def memoryBudget(self) -> mb.MemoryBudget:
+        """Returns the budget shared by the recorded samples of all sensor channels."""
+        return mb.GLOBAL_BUDGET
+
+    def setMemoryBudget(self, limit_bytes: int) -> None:
+        """Sets the bytes of recorded samples kept in memory; older samples beyond it are spilled to disk."""
+        mb.GLOBAL_BUDGET.setLimitBytes(limit_bytes)
+        logging.info(f"Memory budget for recorded samples set to {limit_bytes / 2 ** 20:.0f} MiB.")
+
     def plotDataItems(self):
         checked = self.selectedChannels()
         return [s_ch.plot_data_item for s_ch in checked]
@@ -129,6 +247,23 @@ class SensorServiceItemModel(QAbstractItemModel):
     def setEpoch(self, epoch: dt.datetime) -> None:
         self.__epoch = epoch
 
+    def setStatisticsWindow(self, window_length: int) -> None:
+        """Sets the number of samples the rolling statistics of every sensor channel are computed over."""
+        for s_ch in self.sensorChannels():
+            s_ch.statistics_window = window_length
+
+    def setUiRefreshRate(self, rate_hz: float) -> None:
+        if rate_hz == 0.0:
+            self.__uiRefreshTimer.stop()
+            return
+        self.__uiRefreshTimer.setInterval(int(1000 // rate_hz))
+        self.__uiRefreshTimer.start()
+
+    def uiRefreshRate(self) -> float:
+        if not self.__uiRefreshTimer.isActive():
+            return 0.0
+        return 1000 / self.__uiRefreshTimer.interval()
+
     def startDiscovery(self, timeout: int = 3000):  # default timeout = 3 seconds
         if not self.__deviceDiscoveryAgent.isActive():
             logging.info(f"Starting Bluetooth Low Energy device discovery ({timeout / 1000}s).")
@@ -152,42 +287,90 @@ class SensorServiceItemModel(QAbstractItemModel):
             self.discoveringChanged.emit(False)
 
     def stopRecordingAllServices(self):
+        """Stops recording and stores the recorded samples as a new session. See sessions()."""
         self.__recording = False
+        self.__archiveRecording()
         self.recordingChanged.emit(self.recording())
-        for s_ch in self.selectedChannels():
-            s_ch.updatePlotDataItem()
 
     # endregion
 
     # region Private Instance Methods
 
+    def __archiveRecording(self):
+        # Move the channels' buffers into a session; no samples are copied
+        channels = [s_ch.takeRecording() for s_ch in self.sensorChannels() if len(s_ch.sample_buffer) > 0]
+        if len(channels) == 0:
+            return
+
+        self.__session_count += 1
+        name = f"Session {self.__session_count} ({self.__epoch:%H:%M:%S})"
+        self.__sessions.append(rec.RecordingSession(name, self.__epoch, channels))
+        logging.info(f"Recorded {name} with {len(channels)} channels.")
+        self.sessionsChanged.emit()
+
+    def __addVirtualChannel(self, derived_channel: dc.DerivedChannel):
+        if self.__virtualDevice is None:
+            self.__virtualDevice = VirtualDevice.VirtualDevice(parent=self)
+            self.addServiceDriver(self.__virtualDevice)
+        self.__virtualDevice.addDerivedChannel(derived_channel)
+
+    def __statisticsData(self, index: QModelIndex, role: int):
+        s_ch = index.internalPointer()
+        if not isinstance(s_ch, sc.SensorChannel):
+            return None
+
+        if role == Qt.DisplayRole:
+            return s_ch.statisticsText(SensorServiceItemModel.STATISTICS_COLUMNS[index.column() - 1][1])
+        elif role == Qt.TextAlignmentRole:
+            return SensorServiceItemModel.__STATISTICS_ALIGNMENT
+
+        return None
+
     def __initBluetoothDiscovery(self):
         self.__deviceDiscoveryAgent = QBluetoothDeviceDiscoveryAgent(self)
         self.__deviceDiscoveryAgent.deviceDiscovered.connect(self.__deviceDiscoveryAgent_deviceDiscovered)
         self.__deviceDiscoveryAgent.finished.connect(lambda: self.discoveringChanged.emit(False))
         self.__deviceDiscoveryAgent.setLowEnergyDiscoveryTimeout(3000)  # 3 seconds
 
+    def __emitChildrenDataChanged(self, parent: QModelIndex, roles: list):
+        num_channels = len(parent.internalPointer().sensorChannels())
+        if num_channels > 0:
+            top_left = self.index(0, 0, parent)
+            bottom_right = self.index(num_channels - 1, self.columnCount() - 1, parent)
+            self.dataChanged.emit(top_left, bottom_right, roles)
+
     # endregion
 
     # region Signals
 
     discoveringChanged = pyqtSignal(bool, name="discoveringChanged")
     recordingChanged = pyqtSignal(bool, name="recordingChanged")
+    sessionsChanged = pyqtSignal(name="sessionsChanged")
 
     # endregion
 
     # region Slots
 
     @pyqtSlot(bool, list, name="__activeServiceDriver_dataChanged")
+    @prof.profiled()
     def __activeServiceDriver_dataChanged(self, children: bool, roles: list):
         row = self.__activeServiceDrivers.index(self.sender())
         idx = self.index(row, 0, None)
         self.dataChanged.emit(idx, idx, roles)
 
         if children:
-            top_left = self.index(0, 0, idx)
-            bottom_right = self.index(len(idx.internalPointer().sensorChannels()) - 1, 0, idx)
-            self.dataChanged.emit(top_left, bottom_right, roles)
+            self.__emitChildrenDataChanged(idx, roles)
+
+    @pyqtSlot(name="__uiRefreshTimer_timeout")
+    @prof.profiled()
+    def __uiRefreshTimer_timeout(self):
+        for row, driver in enumerate(self.__activeServiceDrivers):
+            if len(driver.sensorChannels()) == 0:
+                continue
+            driver.updateUi()
+            idx = self.index(row, 0, None)
+            self.dataChanged.emit(idx, idx, [Qt.DisplayRole])
+            self.__emitChildrenDataChanged(idx, [Qt.DisplayRole])
 
     @pyqtSlot(str, name="__activeServiceDriver_error")
     def __activeServiceDriver_error(self, error_msg: str):
@@ -232,20 +415,7 @@ class SensorServiceItemModel(QAbstractItemModel):
             logging.info(f"Recognized service {uuid.toString()} on device {device_info.address().toString()}"
                          f" ({device_info.name()}).")
 
-            # Create driver and calculate its new index in __activeServiceDrivers
-            driver = self.__serviceDriverMap[uuid](device_info, parent=self)
-            driver.setUiRefreshRate(SensorServiceItemModel.UI_SENSOR_REFRESH_RATE_HZ)
-            driver.dataChanged.connect(self.__activeServiceDriver_dataChanged)
-            driver.error.connect(self.__activeServiceDriver_error)
-            driver.rowsAboutToBeInserted.connect(self.__activeServiceDriver_rowsAboutToBeInserted)
-            driver.rowsAboutToBeRemoved.connect(self.__activeServiceDriver_rowsAboutToBeRemoved)
-            driver.rowsInserted.connect(self.__activeServiceDriver_rowsInserted)
-            driver.rowsRemoved.connect(self.__activeServiceDriver_rowsRemoved)
-            new_idx = len(self.__activeServiceDrivers)
-
-            # Notify model of new row
-            self.beginInsertRows(QModelIndex(), new_idx, new_idx)
-            self.__activeServiceDrivers.append(driver)
-            self.endInsertRows()
+            # Create driver and add it to the model
+            self.addServiceDriver(self.__serviceDriverMap[uuid](device_info, parent=self))
 
     # endregion
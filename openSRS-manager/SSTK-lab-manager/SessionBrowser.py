@@ -0,0 +1,133 @@
+"""Contains the SessionBrowser class definition.
+
+    The SessionBrowser opens a session file saved by the lab manager (see SessionFile) and plots the channels checked
+    in its channel list, with the heel strikes detected while recording marked on them.
+
+    Examples:
+    browser = SessionBrowser(parent=self)
+    browser.openSession("trial.session")
+    browser.show()
+"""
+
+from typing import Dict, List
+
+import pyqtgraph as pg
+from PyQt5 import uic
+from PyQt5.QtCore import pyqtSlot, Qt, QTimer
+from PyQt5.QtWidgets import QWidget, QFileDialog, QListWidgetItem
+
+import SessionFile as sf
+
+SessionBrowserUI, SessionBrowserBase = uic.loadUiType("SessionBrowser.ui")
+
+
+class SessionBrowser(SessionBrowserBase, SessionBrowserUI):
+    """Dialog plotting the channels of a saved session file.
+
+    Only the range being viewed is read, at the resolution the plot can show (see SessionFile.SessionChannel.view), so
+    recordings of any length open and pan instantly.
+    """
+
+    __REFRESH_DELAY_MS = 30  # Coalesces the range changes of a pan or zoom into one reload
+
+    def __init__(self, parent: QWidget = None):
+        # uic boilerplate
+        SessionBrowserBase.__init__(self, parent=parent)
+        self.setupUi(self)
+
+        self.__session = None
+        self.__curves: Dict[int, List[pg.PlotDataItem]] = {}  # Samples curve and heel strike markers, if any
+
+        # Setup plotting
+        self.sessionPlotWidget.setBackground(background="w")  # White background
+        self.sessionPlotWidget.setMenuEnabled(False)
+        self.sessionPlotWidget.setMouseEnabled(x=True, y=False)
+        self.sessionPlotWidget.showGrid(x=True, y=True)
+        self.sessionPlotWidget.setLabel("bottom", "Time", units="s")
+        self.sessionPlotWidget_legend = self.sessionPlotWidget.addLegend(offset=(-5, 5))
+
+        self.__refreshTimer = QTimer(parent=self)
+        self.__refreshTimer.setSingleShot(True)
+        self.__refreshTimer.setInterval(SessionBrowser.__REFRESH_DELAY_MS)
+        self.__refreshTimer.timeout.connect(self.__refresh)
+
+        # UI items event connection
+        self.openButton.clicked.connect(self.__openButton_clicked)
+        self.channelListWidget.itemChanged.connect(self.__channelListWidget_itemChanged)
+        self.sessionPlotWidget.getViewBox().sigXRangeChanged.connect(lambda: self.__refreshTimer.start())
+
+    def openSession(self, directory: str) -> None:
+        """Opens a session file and lists its channels.
+
+        Raises:
+            OSError: the session cannot be read
+            ValueError: the session metadata is invalid or of an unsupported version
+        """
+        session = sf.SessionFile(directory)
+
+        for items in self.__curves.values():
+            for item in items:
+                self.sessionPlotWidget.removeItem(item)
+        self.__curves = {}
+        self.__session = session
+
+        self.channelListWidget.blockSignals(True)
+        self.channelListWidget.clear()
+        for s_ch in session.channels():
+            item = QListWidgetItem(f"{s_ch.name} ({s_ch.device})")
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            self.channelListWidget.addItem(item)
+        self.channelListWidget.blockSignals(False)
+
+        t0_us, t1_us = session.timeRange()
+        self.sessionLabel.setText(f"{directory}: {len(session.channels())} channels, {(t1_us - t0_us) / 1.E6:.1f} s "
+                                  f"recorded {session.epoch:%Y-%m-%d %H:%M:%S}")
+        self.sessionPlotWidget.setXRange(0.0, (t1_us - t0_us) / 1.E6, padding=0.0)
+
+    @pyqtSlot(name="__refresh")
+    def __refresh(self):
+        if self.__session is None or len(self.__curves) == 0:
+            return
+
+        origin_us = self.__session.timeRange()[0]
+        x_min_s, x_max_s = self.sessionPlotWidget.getViewBox().viewRange()[0]
+        t0_us, t1_us = origin_us + int(x_min_s * 1.E6), origin_us + int(x_max_s * 1.E6)
+        max_points = 2 * max(int(self.sessionPlotWidget.width()), 100)
+
+        channels = self.__session.channels()
+        for i_c, items in self.__curves.items():
+            timestamps_us, values = channels[i_c].view(t0_us, t1_us, max_points)
+            items[0].setData((timestamps_us - origin_us) / 1.E6, values)
+
+    @pyqtSlot(name="__openButton_clicked")
+    def __openButton_clicked(self):
+        directory = QFileDialog.getExistingDirectory(self, "Open Session")
+        if directory == "":
+            return
+
+        try:
+            self.openSession(directory)
+        except (OSError, ValueError, KeyError) as e:
+            self.sessionLabel.setText(f"Could not open session {directory}: {e}")
+
+    @pyqtSlot(QListWidgetItem, name="__channelListWidget_itemChanged")
+    def __channelListWidget_itemChanged(self, item: QListWidgetItem):
+        i_c = self.channelListWidget.row(item)
+        if item.checkState() == Qt.Checked and i_c not in self.__curves:
+            color = pg.intColor(i_c, hues=max(self.channelListWidget.count(), 1))
+            self.__curves[i_c] = [self.sessionPlotWidget.plot(pen=pg.mkPen(color), name=item.text())]
+
+            # Heel strikes are few enough to plot whole, once
+            heel_strikes = self.__session.channels()[i_c].heelStrikes()
+            if heel_strikes is not None:
+                origin_us = self.__session.timeRange()[0]
+                self.__curves[i_c].append(self.sessionPlotWidget.plot(
+                    (heel_strikes["timestamp_us"] - origin_us) / 1.E6, heel_strikes["value"], pen=None, symbol="t",
+                    symbolBrush=color, symbolPen=None, symbolSize=8))
+        elif item.checkState() == Qt.Unchecked and i_c in self.__curves:
+            items = self.__curves.pop(i_c)
+            for curve in items:
+                self.sessionPlotWidget.removeItem(curve)
+            self.sessionPlotWidget_legend.removeItem(items[0])
+        self.__refresh()
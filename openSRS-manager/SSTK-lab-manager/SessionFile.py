@@ -0,0 +1,264 @@
+"""Contains the session file writer and the SessionFile and SessionChannel class definitions.
+
+    A session file is a directory (named "<name>.session" by convention) holding the recorded samples of a set of
+    channels in a form that can be browsed without reading it into memory:
+
+    - session.json: format version, recording epoch, and per channel its name, device, units, sample count, and heel
+      strike count (null if heel strikes were not detected)
+    - <i>.raw.npy: the channel's samples, a structured array with fields 'timestamp_us' and 'value' (SAMPLE_DTYPE)
+    - <i>.index.npy: every INDEX_STRIDE-th timestamp of the raw samples, a time index that locates any time in the raw
+      samples by reading one small array and then a single stride of the raw file
+    - <i>.L<k>.npy: level k of a min/max pyramid, a structured array with fields 'timestamp_us' (first sample of the
+      bucket), 'min', and 'max', where each bucket summarizes PYRAMID_FACTOR ** k raw samples. Levels are added until
+      a level has at most PYRAMID_MIN_BUCKETS buckets.
+    - <i>.heel_strikes.npy: the heel strikes detected in the channel while recording, in the format of the raw samples,
+      if heel strikes were detected
+
+    All arrays are standard .npy files and are opened memory mapped, so opening a session costs the same for a minute
+    as for an hour of data, and reading a view costs the number of points displayed rather than the number recorded.
+
+    Examples:
+    writeSession("trial.session", epoch, [("R_PFX", "AA:BB:CC:DD:EE:FF", "pF", s_ch.snapshot(), None)])
+    session = SessionFile("trial.session")
+    timestamps_us, values = session.channels()[0].view(t0_us, t1_us, max_points=2000)
+"""
+
+import datetime as dt
+import json
+import logging
+import os
+from typing import List, Tuple, Union
+
+import numpy as np
+from PyQt5.QtCore import QRunnable
+
+import ExportTask as et
+import Profiler as prof
+import SampleBuffer as sb
+
+SESSION_FORMAT_VERSION = 1
+SESSION_METADATA_FILE = "session.json"
+
+INDEX_STRIDE = 4096
+PYRAMID_FACTOR = 16
+PYRAMID_MIN_BUCKETS = 1024
+
+PYRAMID_DTYPE = np.dtype([("timestamp_us", np.int64), ("min", np.float64), ("max", np.float64)])
+
+# (name, device address, units, samples, heel strikes or None) of a channel to write
+SessionChannelSource = Tuple[str, str, str, sb.SampleSnapshot, Union[sb.SampleSnapshot, None]]
+
+
+def _reduceMinMax(timestamps_us: np.ndarray, mins: np.ndarray, maxs: np.ndarray, factor: int) -> np.ndarray:
+    # Buckets of factor consecutive entries; the last bucket may be partial
+    starts = np.arange(0, len(timestamps_us), factor)
+    level = np.empty(len(starts), dtype=PYRAMID_DTYPE)
+    level["timestamp_us"] = timestamps_us[starts]
+    level["min"] = np.minimum.reduceat(mins, starts)
+    level["max"] = np.maximum.reduceat(maxs, starts)
+    return level
+
+
+def _writeChannel(directory: str, i_c: int, snapshot: sb.SampleSnapshot) -> Tuple[int, int]:
+    # Raw samples, written chunk by chunk so that the channel is never copied into one array
+    chunks = snapshot.chunks()
+    count = sum(len(chunk) for chunk in chunks)
+    raw = np.lib.format.open_memmap(os.path.join(directory, f"{i_c}.raw.npy"), mode="w+", dtype=sb.SAMPLE_DTYPE,
+                                    shape=(count,))
+    position = 0
+    for chunk in chunks:
+        raw[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    raw.flush()
+
+    np.save(os.path.join(directory, f"{i_c}.index.npy"), np.array(raw["timestamp_us"][::INDEX_STRIDE]))
+
+    # Pyramid levels until a level is small enough to draw whole; short channels need no pyramid
+    num_levels = 0
+    if count > PYRAMID_MIN_BUCKETS:
+        # First level from the raw samples, in blocks of whole buckets
+        block = PYRAMID_FACTOR * INDEX_STRIDE
+        level = np.concatenate([_reduceMinMax(raw["timestamp_us"][first:first + block],
+                                              raw["value"][first:first + block], raw["value"][first:first + block],
+                                              PYRAMID_FACTOR) for first in range(0, count, block)])
+        num_levels = 1
+        np.save(os.path.join(directory, f"{i_c}.L{num_levels}.npy"), level)
+
+        while len(level) > PYRAMID_MIN_BUCKETS:
+            level = _reduceMinMax(level["timestamp_us"], level["min"], level["max"], PYRAMID_FACTOR)
+            num_levels += 1
+            np.save(os.path.join(directory, f"{i_c}.L{num_levels}.npy"), level)
+    del raw
+
+    return count, num_levels
+
+
+@prof.profiled()
+def writeSession(directory: str, epoch: dt.datetime, channels: List[SessionChannelSource]) -> None:
+    """Writes channel snapshots to a session file.
+
+    Args:
+        directory: path of the session directory, created if it does not exist
+        epoch: start time of the recording
+        channels: (name, device address, units, SampleSnapshot, heel strike SampleSnapshot or None) of each channel
+    """
+    os.makedirs(directory, exist_ok=True)
+    metadata = {"version": SESSION_FORMAT_VERSION, "epoch": epoch.isoformat(), "channels": []}
+    for i_c, (name, device, units, snapshot, heel_strikes) in enumerate(channels):
+        count, num_levels = _writeChannel(directory, i_c, snapshot)
+        num_heel_strikes = None
+        if heel_strikes is not None:
+            # Heel strikes are about one per second, so they are written in one piece
+            heel_strike_data = heel_strikes.to_array()
+            np.save(os.path.join(directory, f"{i_c}.heel_strikes.npy"), heel_strike_data)
+            num_heel_strikes = len(heel_strike_data)
+        metadata["channels"].append({"name": name, "device": device, "units": units, "count": count,
+                                     "levels": num_levels, "heel_strikes": num_heel_strikes})
+
+    # Metadata last, so that an interrupted save does not leave a session that looks complete
+    with open(os.path.join(directory, SESSION_METADATA_FILE), "w") as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+
+
+class SessionChannel:
+    """Memory-mapped samples and min/max pyramid of one channel of a SessionFile.
+
+    Args:
+        directory: path of the session directory
+        i_c: index of the channel in the session
+        metadata: the channel's entry in the session metadata
+    """
+
+    def __init__(self, directory: str, i_c: int, metadata: dict):
+        self.name: str = metadata["name"]
+        self.device: str = metadata["device"]
+        self.units: str = metadata["units"]
+
+        self.__raw = np.load(os.path.join(directory, f"{i_c}.raw.npy"), mmap_mode="r")
+        self.__index = np.load(os.path.join(directory, f"{i_c}.index.npy"))
+        self.__levels = [np.load(os.path.join(directory, f"{i_c}.L{k}.npy"), mmap_mode="r")
+                         for k in range(1, metadata["levels"] + 1)]
+        # Sessions saved before heel strikes were saved have no heel_strikes entry
+        self.__heel_strikes = None
+        if metadata.get("heel_strikes") is not None:
+            self.__heel_strikes = np.load(os.path.join(directory, f"{i_c}.heel_strikes.npy"))
+
+    def __len__(self) -> int:
+        return len(self.__raw)
+
+    def timeRange(self) -> Tuple[int, int]:
+        """Returns the timestamps of the first and last samples in microseconds since epoch."""
+        if len(self.__raw) == 0:
+            return 0, 0
+        return int(self.__raw[0]["timestamp_us"]), int(self.__raw[-1]["timestamp_us"])
+
+    def locate(self, timestamp_us: int) -> int:
+        """Returns the index of the first raw sample at or after timestamp_us, like np.searchsorted."""
+        stride = max(int(np.searchsorted(self.__index, timestamp_us, side="right")) - 1, 0)
+        first = stride * INDEX_STRIDE
+        window = self.__raw["timestamp_us"][first:first + INDEX_STRIDE]
+        return first + int(np.searchsorted(window, timestamp_us))
+
+    def heelStrikes(self) -> Union[np.ndarray, None]:
+        """Returns the heel strikes detected in the channel while recording, or None if they were not detected."""
+        return self.__heel_strikes
+
+    def samples(self, t0_us: int, t1_us: int) -> np.ndarray:
+        """Returns the raw samples with t0_us <= timestamp < t1_us (a view of the memory-mapped file)."""
+        return self.__raw[self.locate(t0_us):self.locate(t1_us)]
+
+    def view(self, t0_us: int, t1_us: int, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns at most max_points points (at least 2) to display the channel between t0_us and t1_us.
+
+        The raw samples are returned if there are few enough of them. Otherwise the finest pyramid level with few
+        enough buckets is returned as a min/max envelope: each bucket becomes two points at its first timestamp, its
+        minimum and its maximum, so that peaks are drawn even when many samples share a pixel. If even the coarsest
+        level (or, for a channel without a pyramid, the raw samples) has too many buckets, adjacent buckets are merged
+        into as few buckets as needed, keeping the minimum and maximum of each.
+
+        Returns:
+            (timestamps_us, values) arrays
+        """
+        first, last = self.locate(t0_us), self.locate(t1_us)
+        # Include the samples just outside the range so that lines run to the edges of the view
+        first, last = max(first - 1, 0), min(last + 1, len(self.__raw))
+        if last - first <= max_points:
+            samples = self.__raw[first:last]
+            return np.array(samples["timestamp_us"]), np.array(samples["value"])
+
+        max_buckets = max(max_points // 2, 1)
+        for k, level in enumerate(self.__levels, start=1):
+            bucket = PYRAMID_FACTOR ** k
+            b_first, b_last = first // bucket, -(-last // bucket)
+            if b_last - b_first <= max_buckets or k == len(self.__levels):
+                buckets = level[b_first:b_last]
+                break
+        else:
+            # No pyramid (fewer than PYRAMID_MIN_BUCKETS samples in the session): each sample is a bucket
+            samples = self.__raw[first:last]
+            buckets = _reduceMinMax(samples["timestamp_us"], samples["value"], samples["value"], 1)
+
+        if len(buckets) > max_buckets:
+            buckets = _reduceMinMax(buckets["timestamp_us"], buckets["min"], buckets["max"],
+                                    -(-len(buckets) // max_buckets))
+        return np.repeat(buckets["timestamp_us"], 2), np.column_stack((buckets["min"], buckets["max"])).ravel()
+
+
+class SessionFile:
+    """Read-only, memory-mapped session file.
+
+    Args:
+        directory: path of the session directory
+
+    Raises:
+        OSError: the session cannot be read
+        ValueError: the session metadata is invalid or of an unsupported version
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, SESSION_METADATA_FILE)) as metadata_file:
+            metadata = json.load(metadata_file)
+        if metadata.get("version") != SESSION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported session format version {metadata.get('version')}.")
+
+        self.directory = directory
+        self.epoch = dt.datetime.fromisoformat(metadata["epoch"])
+        self.__channels = [SessionChannel(directory, i_c, channel) for i_c, channel in enumerate(metadata["channels"])]
+
+    def channels(self) -> List[SessionChannel]:
+        return self.__channels
+
+    def timeRange(self) -> Tuple[int, int]:
+        """Returns the earliest and latest timestamps of the session's channels in microseconds since epoch."""
+        ranges = [s_ch.timeRange() for s_ch in self.__channels if len(s_ch) > 0]
+        if len(ranges) == 0:
+            return 0, 0
+        return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+
+class SaveSessionTask(QRunnable):
+    """Background write of channel snapshots to a session file. Emits the same signals as an ExportTask.
+
+    Args:
+        directory: path of the session directory
+        epoch: start time of the recording
+        channels: (name, device address, units, SampleSnapshot, heel strike SampleSnapshot or None) of each channel
+    """
+
+    def __init__(self, directory: str, epoch: dt.datetime, channels: List[SessionChannelSource]):
+        super(SaveSessionTask, self).__init__()
+        self.signals = et.ExportTaskSignals()
+        self.__directory = directory
+        self.__epoch = epoch
+        self.__channels = channels
+
+    def run(self):
+        try:
+            writeSession(self.__directory, self.__epoch, self.__channels)
+        except Exception as e:
+            logging.error(f"Saving session {self.__directory} failed: {e}")
+            self.signals.error.emit(str(e))
+            return
+
+        logging.info(f"Saved {len(self.__channels)} channels to session {self.__directory}.")
+        self.signals.finished.emit(self.__directory)
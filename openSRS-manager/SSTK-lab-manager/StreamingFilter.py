@@ -0,0 +1,138 @@
+"""Contains the StreamingFilter class definitions.
+
+    StreamingFilters are causal digital filters that process a channel's samples one batch at a time. Each filter
+    carries its state (past inputs or delay line) from one batch to the next, so filtering a new frame costs O(batch)
+    and never reprocesses the recorded history. Filter coefficients are computed once when the filter is created.
+
+    FILTER_PRESETS maps the filter names offered in the user interface to factories taking the channel's sampling rate.
+    The Savitzky-Golay presets use the window lengths of the offline analysis scripts (scipy.signal.savgol_filter),
+    evaluated causally at the newest sample of the window instead of at its center.
+
+    Examples:
+    lp = FILTER_PRESETS["Low-pass 6.9 Hz"](250.0)
+    filtered = np.concatenate([lp.process(frame) for frame in frames])
+"""
+
+from typing import Callable, Dict
+
+import numpy as np
+
+
+def savitzkyGolayCoefficients(window_length: int, polyorder: int) -> np.ndarray:
+    """Returns the FIR coefficients of a causal Savitzky-Golay smoother.
+
+    The filter fits a polynomial of order polyorder to the last window_length samples by least squares and returns its
+    value at the newest sample. Coefficients are ordered oldest sample first.
+    """
+    if polyorder >= window_length:
+        raise ValueError("polyorder must be less than window_length.")
+
+    t = np.arange(-(window_length - 1), 1, dtype=np.float64)
+    vandermonde = t[:, np.newaxis] ** np.arange(polyorder + 1)
+    return np.linalg.pinv(vandermonde)[0]  # Constant term of the fit = value at t = 0
+
+
+class StreamingFilter:
+    """Base class of filters processing samples in consecutive batches."""
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        """Filters the next batch of samples, continuing from the state left by the previous batch."""
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forgets the filter state. The next batch is filtered as if it were the first."""
+        raise NotImplementedError
+
+
+class FirFilter(StreamingFilter):
+    """Finite impulse response filter.
+
+    The history is initialized with the first sample, so the output starts at the signal level instead of ramping up
+    from zero.
+
+    Args:
+        coefficients: filter taps, oldest sample first
+    """
+
+    def __init__(self, coefficients: np.ndarray):
+        self.__taps = np.asarray(coefficients, dtype=np.float64)[::-1].copy()  # Reversed for np.convolve
+        self.__history = None
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        if self.__history is None:
+            self.__history = np.full(len(self.__taps) - 1, values[0])
+
+        extended = np.concatenate((self.__history, values))
+        self.__history = extended[len(extended) - (len(self.__taps) - 1):]
+        return np.convolve(extended, self.__taps, mode="valid")
+
+    def reset(self) -> None:
+        self.__history = None
+
+
+class BiquadFilter(StreamingFilter):
+    """Second-order IIR filter in transposed direct form II.
+
+    The delay line is initialized to the steady state of the first sample, so the output starts at the signal level.
+
+    Args:
+        b: numerator coefficients (b0, b1, b2)
+        a: denominator coefficients (a0, a1, a2), normalized by a0
+    """
+
+    def __init__(self, b, a):
+        a0 = float(a[0])
+        self.__b = [float(coef) / a0 for coef in b]
+        self.__a = [float(coef) / a0 for coef in a]
+        self.__z = None
+
+    @staticmethod
+    def lowpass(cutoff_hz: float, rate_hz: float, q: float = 1.0 / np.sqrt(2.0)) -> "BiquadFilter":
+        """Designs a low-pass biquad (Butterworth response for the default Q) with the bilinear transform."""
+        if not 0.0 < cutoff_hz < rate_hz / 2.0:
+            raise ValueError(f"Cutoff {cutoff_hz} Hz must be between 0 and the Nyquist frequency {rate_hz / 2.0} Hz.")
+
+        w0 = 2.0 * np.pi * cutoff_hz / rate_hz
+        alpha = np.sin(w0) / (2.0 * q)
+        cos_w0 = np.cos(w0)
+        b = [(1.0 - cos_w0) / 2.0, 1.0 - cos_w0, (1.0 - cos_w0) / 2.0]
+        a = [1.0 + alpha, -2.0 * cos_w0, 1.0 - alpha]
+        return BiquadFilter(b, a)
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+
+        b0, b1, b2 = self.__b
+        _, a1, a2 = self.__a
+        if self.__z is None:
+            y0 = values[0] * (b0 + b1 + b2) / (1.0 + a1 + a2)
+            z2 = b2 * values[0] - a2 * y0
+            self.__z = [b1 * values[0] - a1 * y0 + z2, z2]
+
+        z1, z2 = self.__z
+        out = np.empty(len(values))
+        for i, x in enumerate(values.tolist()):
+            y = b0 * x + z1
+            z1 = b1 * x - a1 * y + z2
+            z2 = b2 * x - a2 * y
+            out[i] = y
+        self.__z = [z1, z2]
+        return out
+
+    def reset(self) -> None:
+        self.__z = None
+
+
+# Filters offered in the user interface, by name. Each factory takes the sampling rate in Hz.
+FILTER_PRESETS: Dict[str, Callable[[float], StreamingFilter]] = {
+    "Savitzky-Golay 15/3": lambda rate_hz: FirFilter(savitzkyGolayCoefficients(15, 3)),
+    "Savitzky-Golay 27/3": lambda rate_hz: FirFilter(savitzkyGolayCoefficients(27, 3)),
+    "Savitzky-Golay 51/3": lambda rate_hz: FirFilter(savitzkyGolayCoefficients(51, 3)),
+    "Low-pass 6.9 Hz": lambda rate_hz: BiquadFilter.lowpass(6.9, rate_hz),
+    "Low-pass 15 Hz": lambda rate_hz: BiquadFilter.lowpass(15.0, rate_hz),
+}
@@ -0,0 +1,207 @@
+"""End-to-end GUI latency benchmark for the lab manager.
+
+    Runs MainWindow under Qt's offscreen platform while a number of simulated devices (drivers.SimulatedDevice) stream
+    AthEngDCMk1-formatted frames into it and the window records. Over the simulated session the benchmark measures:
+
+    - event-loop latency: how late a short periodic QTimer fires compared to its interval
+    - frame time: time to synchronously repaint sensorPlotWidget and sensorTreeView at the UI refresh rate
+    - memory: resident set size of the process
+
+    Results are printed as a summary and optionally written to a JSON file so before/after numbers for a change can be
+    compared. Runs are reproducible for a given set of arguments (the simulated signals are seeded).
+
+    Typical usage example (run from the SSTK-lab-manager directory, like run.py):
+    python benchmark.py --devices 2 --rate 250 --duration 1800 --speedup 10 --output before.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+
+import MainWindow as mw
+import SensorServiceItemModel as ssim
+from drivers.SimulatedDevice import SimulatedDevice
+
+
+def residentMemoryMb() -> float:
+    """Returns the current resident set size of this process in MiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Returns count, mean, percentiles and maximum of a list of measurements."""
+    if len(values) == 0:
+        return {"count": 0}
+
+    arr = np.asarray(values)
+    return {"count": int(arr.size), "mean": float(arr.mean()), "p50": float(np.percentile(arr, 50)),
+            "p95": float(np.percentile(arr, 95)), "p99": float(np.percentile(arr, 99)), "max": float(arr.max())}
+
+
+class GuiLatencyBenchmark:
+    """Drives one benchmark session and collects its measurements.
+
+    Args:
+        window: MainWindow under test
+        devices: number of simulated devices to attach
+        rate_hz: sampling rate of each simulated device
+        duration_s: length of the simulated session in seconds
+        speedup: ratio of simulated time to wall clock time
+        seed: base seed of the simulated devices' signal generators
+        probe_interval_ms: interval of the event-loop latency probe timer
+    """
+
+    def __init__(self, window: mw.MainWindow, devices: int, rate_hz: float, duration_s: float, speedup: float,
+                 seed: int, probe_interval_ms: int):
+        self.__window = window
+        self.__duration_us = duration_s * 1.E6
+        self.__probe_interval_ms = probe_interval_ms
+
+        model = window.sensorServiceItemModel()
+        self.__drivers = []
+        for i in range(devices):
+            driver = SimulatedDevice(SimulatedDevice.deviceInfo(i), speedup=speedup, seed=seed + i, parent=model)
+            model.addServiceDriver(driver)
+            driver.setSamplingRate(rate_hz)
+            self.__drivers.append(driver)
+        self.__start_us = self.__drivers[0].simulatedTimeUs()
+
+        # Measurements, tagged with the simulated minute they were taken in
+        self.__latency_ms: List[tuple] = []
+        self.__plot_frame_ms: List[tuple] = []
+        self.__tree_frame_ms: List[tuple] = []
+        self.__memory_mb: List[tuple] = []
+
+        self.__last_probe_s = None
+        self.__latencyTimer = QTimer()
+        self.__latencyTimer.setInterval(probe_interval_ms)
+        self.__latencyTimer.timeout.connect(self.__latencyTimer_timeout)
+
+        self.__frameTimer = QTimer()
+        self.__frameTimer.setInterval(int(1000 / ssim.SensorServiceItemModel.UI_SENSOR_REFRESH_RATE_HZ))
+        self.__frameTimer.timeout.connect(self.__frameTimer_timeout)
+
+        self.__memoryTimer = QTimer()
+        self.__memoryTimer.setInterval(1000)
+        self.__memoryTimer.timeout.connect(self.__memoryTimer_timeout)
+
+    def start(self) -> None:
+        self.__window.recordButton.click()
+        self.__memoryTimer_timeout()
+        self.__latencyTimer.start()
+        self.__frameTimer.start()
+        self.__memoryTimer.start()
+
+    def results(self) -> dict:
+        def by_minute(samples: List[tuple]) -> Dict[int, dict]:
+            minutes = sorted({minute for minute, _ in samples})
+            return {minute: summarize([v for m, v in samples if m == minute]) for minute in minutes}
+
+        return {
+            "event_loop_latency_ms": summarize([v for _, v in self.__latency_ms]),
+            "plot_frame_ms": summarize([v for _, v in self.__plot_frame_ms]),
+            "tree_frame_ms": summarize([v for _, v in self.__tree_frame_ms]),
+            "rss_mb": {"start": self.__memory_mb[0][1], "end": self.__memory_mb[-1][1],
+                       "max": max(v for _, v in self.__memory_mb)},
+            "per_minute": {
+                "event_loop_latency_ms": by_minute(self.__latency_ms),
+                "plot_frame_ms": by_minute(self.__plot_frame_ms),
+                "rss_mb": {m: v for m, v in self.__memory_mb},
+            },
+        }
+
+    def __simulatedMinute(self) -> int:
+        return int((self.__drivers[0].simulatedTimeUs() - self.__start_us) // 60.E6)
+
+    def __latencyTimer_timeout(self):
+        now_s = time.perf_counter()
+        if self.__last_probe_s is not None:
+            late_ms = (now_s - self.__last_probe_s) * 1000. - self.__probe_interval_ms
+            self.__latency_ms.append((self.__simulatedMinute(), max(late_ms, 0.0)))
+        self.__last_probe_s = now_s
+
+        if self.__drivers[0].simulatedTimeUs() - self.__start_us >= self.__duration_us:
+            self.__finish()
+
+    def __frameTimer_timeout(self):
+        minute = self.__simulatedMinute()
+
+        start_s = time.perf_counter()
+        self.__window.sensorPlotWidget.viewport().repaint()
+        self.__plot_frame_ms.append((minute, (time.perf_counter() - start_s) * 1000.))
+
+        start_s = time.perf_counter()
+        self.__window.sensorTreeView.viewport().repaint()
+        self.__tree_frame_ms.append((minute, (time.perf_counter() - start_s) * 1000.))
+
+    def __memoryTimer_timeout(self):
+        self.__memory_mb.append((self.__simulatedMinute(), residentMemoryMb()))
+
+    def __finish(self):
+        self.__latencyTimer.stop()
+        self.__frameTimer.stop()
+        self.__memoryTimer.stop()
+        self.__memoryTimer_timeout()
+        self.__window.recordButton.click()
+        for driver in self.__drivers:
+            driver.setSamplingRate(0.0)
+        QApplication.instance().quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offscreen end-to-end GUI latency benchmark for the lab manager.")
+    parser.add_argument("--devices", type=int, default=2, help="number of simulated devices (default: 2)")
+    parser.add_argument("--rate", type=float, default=250.0, help="sampling rate per device in Hz (default: 250)")
+    parser.add_argument("--duration", type=float, default=1800.0,
+                        help="simulated session length in seconds (default: 1800)")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="simulated seconds per wall clock second (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="base seed for the simulated signals (default: 0)")
+    parser.add_argument("--probe-interval", type=int, default=10,
+                        help="event-loop latency probe interval in ms (default: 10)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    window = mw.MainWindow()
+    window.show()
+
+    benchmark = GuiLatencyBenchmark(window, args.devices, args.rate, args.duration, args.speedup, args.seed,
+                                    args.probe_interval)
+    wall_start_s = time.perf_counter()
+    QTimer.singleShot(0, benchmark.start)
+    app.exec_()
+
+    results = {"parameters": vars(args), "wall_time_s": time.perf_counter() - wall_start_s}
+    results.update(benchmark.results())
+
+    for metric in ["event_loop_latency_ms", "plot_frame_ms", "tree_frame_ms"]:
+        stats = results[metric]
+        print(f"{metric:>22}: mean {stats['mean']:8.2f}  p50 {stats['p50']:8.2f}  p95 {stats['p95']:8.2f}  "
+              f"p99 {stats['p99']:8.2f}  max {stats['max']:8.2f}  (n={stats['count']})")
+    print(f"{'rss_mb':>22}: start {results['rss_mb']['start']:8.1f}  end {results['rss_mb']['end']:8.1f}  "
+          f"max {results['rss_mb']['max']:8.1f}")
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,36 @@
+import logging
 import struct
 import time
-from typing import List
+from typing import Any, List, Tuple, Union
 
-from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QLowEnergyService, QBluetoothUuid, QLowEnergyCharacteristic, \
-    QLowEnergyController
-from PyQt5.QtCore import QObject, pyqtSlot, QByteArray
+import numpy as np
+from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QBluetoothUuid
+from PyQt5.QtCore import QObject, Qt, pyqtSlot, QTimer
 from PyQt5.QtWidgets import QAction, QMenu
 
+import Profiler as prof
 import SensorChannel as sc
 import SensorServiceDriver as ssd
+from drivers import GattLink as gl
 
 
 class AthEngDCMk1(ssd.SensorServiceDriver):
+    """Driver of the AthEngDCMk1 capacitance module.
+
+    The device is reached through a GattLink, a drivers.GattLink.BluetoothGattLink unless another link (for example a
+    drivers.LoopbackGattLink.LoopbackGattLink) is given. If the link drops while the driver is connected, the driver
+    keeps its channels and recorded samples, reconnects with an increasing delay, and restores the sampling rate,
+    notifications, and time sync on the device. The times of the reconnects and the gaps they left in the data are kept
+    (see reconnectGaps()) and shown in the driver's tooltip.
+
+    Args:
+        device_info: QBluetoothDeviceInfo of the device
+
+    Keyword Args:
+        link: GattLink to the device's service, created from device_info if None
+        parent: SensorServiceItemModel managing and monitoring the driver
+    """
+
     __SS10SPI_BASE_UUID = QBluetoothUuid("90effff0-ea02-11e9-81b4-2a2ae2dbcce4")
     __SENSOR_DATA_CHAR_UUID = QBluetoothUuid("90effff1-ea02-11e9-81b4-2a2ae2dbcce4")
     __BUFF_SIZE_CHAR_UUID = QBluetoothUuid("90effff2-ea02-11e9-81b4-2a2ae2dbcce4")
@@ -19,6 +38,15 @@ class AthEngDCMk1(ssd.SensorServiceDriver):
     __SYS_FAULT_CHAR_UUID = QBluetoothUuid("90effff4-ea02-11e9-81b4-2a2ae2dbcce4")
     __SYS_TIME_CHAR_UUID = QBluetoothUuid("90effff5-ea02-11e9-81b4-2a2ae2dbcce4")
 
+    # Characteristics used, in the order of the indices they are addressed by on the GattLink
+    CHARACTERISTIC_UUIDS = [__SENSOR_DATA_CHAR_UUID, __BUFF_SIZE_CHAR_UUID, __SAMP_RATE_CHAR_UUID,
+                            __SYS_FAULT_CHAR_UUID, __SYS_TIME_CHAR_UUID]
+    SENSOR_DATA, BUFF_SIZE, SAMP_RATE, SYS_FAULT, SYS_TIME = range(len(CHARACTERISTIC_UUIDS))
+
+    NUM_CHANNELS = 5
+    __CLOCK_SYNC_INTERVAL_MS = 5000  # Interval of the time exchanges fitting the clock model
+    __RECONNECT_DELAYS_MS = [100, 250, 500, 1000, 2000, 5000]  # Delays of successive reconnect attempts
+
     __SAMP_RATE_CODES = [(0.0, b'\x00'), (25.0, b'\x01'), (50.0, b'\x02'), (100.0, b'\x03'), (125.0, b'\x05'),
                          (250.0, b'\x06')]
 
@@ -28,7 +56,7 @@ class AthEngDCMk1(ssd.SensorServiceDriver):
 
     @staticmethod
     def driverName() -> str:
-        return "AthEngDCMk1 Driver Version 0.1"
+        return "AthEngDCMk1 Driver Version 0.2"
 
     @staticmethod
     def matchUuid() -> QBluetoothUuid:
@@ -38,25 +66,73 @@ class AthEngDCMk1(ssd.SensorServiceDriver):
     def supportedSamplingRates() -> List[float]:
         return [item[0] for item in AthEngDCMk1.__SAMP_RATE_CODES]
 
-    def __init__(self, device_info: QBluetoothDeviceInfo, parent: QObject = None):
+    @staticmethod
+    def samplingRateCode(rate_hz: float) -> bytes:
+        """Returns the value of the sampling rate characteristic for a supported sampling rate."""
+        return [item for item in AthEngDCMk1.__SAMP_RATE_CODES if item[0] == rate_hz][0][1]
+
+    @staticmethod
+    def samplingRateFromCode(code: bytes) -> float:
+        """Returns the sampling rate of a value of the sampling rate characteristic, or 0.0 if it is unknown."""
+        rates = [item[0] for item in AthEngDCMk1.__SAMP_RATE_CODES if item[1] == bytes(code)]
+        return rates[0] if len(rates) > 0 else 0.0
+
+    @staticmethod
+    def decodeFrame(value: bytes) -> Tuple[int, np.ndarray]:
+        """Splits a sensor data frame into its timestamp and a (samples x channels) array of values in pF."""
+        value = bytes(value)
+        epoch_us = struct.unpack("<q", value[:8])[0]
+        samples = np.frombuffer(value, dtype="<u2", offset=8).reshape(-1, AthEngDCMk1.NUM_CHANNELS) / 10.0
+        return epoch_us, samples
+
+    def __init__(self, device_info: QBluetoothDeviceInfo, link: gl.GattLink = None, parent: QObject = None):
         super().__init__(device_info, parent)
 
         self.__sampling = False
+        self.__sampling_rate_hz = 0.0
         # Save Bluetooth device info
         self.__device_address = device_info.address()
         self.__device_name = device_info.name()
         self.__device_services = device_info.serviceUuids()
 
-        # Create LowEnergyController
-        self.__low_energy_controller = QLowEnergyController(device_info, self)
-        self.__low_energy_controller.stateChanged.connect(self.__low_energy_controller_stateChanged)
-
-        # LowEnergyService placeholder
-        self.__low_energy_service = None
+        # Link to the device's service
+        if link is None:
+            link = gl.BluetoothGattLink(device_info, type(self).matchUuid(), type(self).CHARACTERISTIC_UUIDS)
+        self.__link = link
+        self.__link.setParent(self)
+        self.__link.stateChanged.connect(self.__link_stateChanged)
+        self.__link.notified.connect(self.__link_notified)
+        self.__link.readCompleted.connect(self.__link_readCompleted)
+        self.__link.error.connect(self.__link_error)
+
+        # Automatic reconnect after a dropped link; host time the link was lost, None while connected as intended
+        self.__user_disconnected = True
+        self.__link_lost_us = None
+        self.__last_sample_us = None
+        self.__reconnect_attempt = 0
+        self.__reconnect_gaps: List[Tuple[int, int, Union[int, None]]] = []
+        self.__reconnectTimer = QTimer(parent=self)
+        self.__reconnectTimer.setSingleShot(True)
+        self.__reconnectTimer.timeout.connect(self.__reconnectTimer_timeout)
+
+        # Periodic time exchanges with the device; host time the outstanding SYS_TIME read was sent, if any
+        self.__clock_sync_send_us = None
+        self.__clockSyncTimer = QTimer(parent=self)
+        self.__clockSyncTimer.setInterval(type(self).__CLOCK_SYNC_INTERVAL_MS)
+        self.__clockSyncTimer.timeout.connect(self.__clockSyncTimer_timeout)
 
         # Connect Menu Signals
         self._contextMenu.triggered.connect(self._contextMenu_triggered)
 
+    def data(self, role: Qt.ItemDataRole = None) -> Any:
+        if role == Qt.ToolTipRole and len(self.__reconnect_gaps) > 0:
+            lost_us, restored_us, data_gap_us = self.__reconnect_gaps[-1]
+            data_gap = "pending" if data_gap_us is None else f"{data_gap_us / 1000.:.0f} ms"
+            return (f"{super(AthEngDCMk1, self).data(role)}\n"
+                    f"Reconnects {len(self.__reconnect_gaps)}, last link gap {(restored_us - lost_us) / 1000.:.0f} ms, "
+                    f"data gap {data_gap}")
+        return super(AthEngDCMk1, self).data(role)
+
     def deviceAddress(self):
         return self.__device_address.toString()
 
@@ -67,18 +143,10 @@ class AthEngDCMk1(ssd.SensorServiceDriver):
         return self.__device_services
 
     def samplingRate(self) -> float:
-        # Don't query the device if driver isn't ready
+        # Don't report a rate if driver isn't ready
         if self._driverState != ssd.DriverState.ReadyState:
             return 0.0
-
-        # Read current sampling rate from device
-        samp_rate_char = self.__low_energy_service.characteristic(type(self).__SAMP_RATE_CHAR_UUID)
-        if samp_rate_char.isValid():
-            samp_rate_code = samp_rate_char.value()
-            samp_rate_pair = [item for item in type(self).__SAMP_RATE_CODES if item[1] == samp_rate_code][0]
-            return samp_rate_pair[0]
-        else:
-            raise RuntimeError("Sampling rate characteristic not found.")
+        return self.__sampling_rate_hz
 
     def setSamplingRate(self, rate_hz: float) -> None:
         self.__sampling = rate_hz != 0.0
@@ -90,124 +158,166 @@ class AthEngDCMk1(ssd.SensorServiceDriver):
         if rate_hz not in type(self).supportedSamplingRates():
             raise ValueError(f"Sampling rate {rate_hz} not supported by {type(self).driverName()}.")
 
-        # Set sampling rate on device
-        samp_rate_pair = [item for item in type(self).__SAMP_RATE_CODES if item[0] == rate_hz][0]
-        samp_rate_char = self.__low_energy_service.characteristic(type(self).__SAMP_RATE_CHAR_UUID)
-        if samp_rate_char.isValid():
-            print(f"Writing {samp_rate_pair} to samp rate char.")
-            self.__low_energy_service.writeCharacteristic(samp_rate_char, samp_rate_pair[1])
+        # Set sampling rate on device; it is restored from here after a reconnect
+        code = type(self).samplingRateCode(rate_hz)
+        print(f"Writing {(rate_hz, code)} to samp rate char.")
+        self.__link.write(type(self).SAMP_RATE, code)
+        self.__sampling_rate_hz = rate_hz
+
+    def connectToDevice(self) -> None:
+        self.__user_disconnected = False
+        self.__reconnectTimer.stop()
+        self.__link.connectToDevice()
+
+    def disconnectFromDevice(self) -> None:
+        self.__user_disconnected = True
+        self.__reconnectTimer.stop()
+        if self.__link.state() == gl.LinkState.UnconnectedState:
+            self.__link_stateChanged(gl.LinkState.UnconnectedState)  # Waiting to reconnect; give up instead
         else:
-            raise RuntimeError("Sampling rate characteristic not found.")
+            self.__link.disconnectFromDevice()
+
+    def link(self) -> gl.GattLink:
+        return self.__link
+
+    def reconnectGaps(self) -> List[Tuple[int, int, Union[int, None]]]:
+        """Returns (link lost, link restored, data gap) of each automatic reconnect, oldest first.
+
+        Link times are host times in microseconds since epoch. The data gap is the time in microseconds between the
+        last sample before the link was lost and the first sample after it was restored, None until that sample
+        arrives (or if there was no sample before).
+        """
+        return self.__reconnect_gaps
 
     def _setSystemTime(self, sys_time: int):
         sys_time_bytes = struct.pack("<q", int(round(time.time() * 1.E6)))
-        sys_time_char = self.__low_energy_service.characteristic(type(self).__SYS_TIME_CHAR_UUID)
-        if sys_time_char.isValid():
-            print(f"Writing {sys_time} to sys time char.")
-            self.__low_energy_service.writeCharacteristic(sys_time_char, sys_time_bytes)
-        else:
-            raise RuntimeError("System time characteristic not found.")
+        print(f"Writing {sys_time} to sys time char.")
+        self.__link.write(type(self).SYS_TIME, sys_time_bytes)
+
+        # The device clock jumped; fit a new clock model starting with an immediate exchange
+        self._clockModel.reset()
+        self.__clock_sync_send_us = None
+        self.__clockSyncTimer_timeout()
+        self.__clockSyncTimer.start()
+
+    def __restoreDevice(self):
+        # Notifications, sampling rate, and time sync are per connection; (re)apply them to the device
+        self.__link.subscribe(type(self).BUFF_SIZE)
+        restoring = len(self._sensorChannels) > 0
+        if not restoring:
+            for i in range(type(self).NUM_CHANNELS):
+                self._addSensorChannel(sc.SensorChannel(f"Channel {i}", "pF", parent=self))
+            self.__sampling_rate_hz = type(self).samplingRateFromCode(self.__link.value(type(self).SAMP_RATE))
+        elif self.__sampling_rate_hz != 0.0:
+            self.__link.write(type(self).SAMP_RATE, type(self).samplingRateCode(self.__sampling_rate_hz))
+
+        # Set the driver as ready and sync device time
+        self._setDriverState(ssd.DriverState.ReadyState)
+        self._setSystemTime(int(round(time.time() * 1E6)))
 
     @pyqtSlot(QAction, name="_contextMenu_triggered")
     def _contextMenu_triggered(self, action: QAction):
         # Connect Action
         if action.data() == "connect":
-            self.__low_energy_controller.connectToDevice()
+            self.connectToDevice()
 
         # Disconnect Action
         elif action.data() == "disconnect":
-            self.__low_energy_controller.disconnectFromDevice()
+            self.disconnectFromDevice()
 
         # Set Sampling Rate Action
         elif type(action.parent()) is QMenu and action.parent().objectName() == "sampling_menu":
             self.setSamplingRate(action.data())
 
-    @pyqtSlot(QLowEnergyController.ControllerState, name="__low_energy_controller_stateChanged")
-    def __low_energy_controller_stateChanged(self, state: QLowEnergyController.ControllerState):
-        if state == QLowEnergyController.UnconnectedState:
-            self._clearSensorChannels()
-            self._setDriverState(ssd.DriverState.UnconnectedState)
-
-        elif state == QLowEnergyController.ConnectingState:
-            self._setDriverState(ssd.DriverState.PreparingState)
-
-        elif state == QLowEnergyController.ConnectedState:
-            self.__low_energy_controller.discoverServices()
-            self._setDriverState(ssd.DriverState.PreparingState)
-
-        elif state == QLowEnergyController.DiscoveringState:
-            self._setDriverState(ssd.DriverState.PreparingState)
-
-        elif state == QLowEnergyController.ClosingState:
-            self._clearSensorChannels()
-            self._setDriverState(ssd.DriverState.PreparingState)
+    @pyqtSlot(object, name="__link_stateChanged")
+    def __link_stateChanged(self, state: gl.LinkState):
+        if state == gl.LinkState.UnconnectedState:
+            self.__clockSyncTimer.stop()
+            if self.__user_disconnected or len(self._sensorChannels) == 0:
+                self.__link_lost_us = None
+                self._clearSensorChannels()
+                self._setDriverState(ssd.DriverState.UnconnectedState)
+                return
 
-        elif state == QLowEnergyController.DiscoveredState:
-            self.__low_energy_service = \
-                self.__low_energy_controller.createServiceObject(type(self).__SS10SPI_BASE_UUID, self)
-            self.__low_energy_service.characteristicChanged.connect(self.__low_energy_service_characteristicChanged)
-            self.__low_energy_service.characteristicRead.connect(self.__low_energy_service_characteristicRead)
-            self.__low_energy_service.stateChanged.connect(self.__low_energy_service_stateChanged)
-            self.__low_energy_service.discoverDetails()
+            # Dropped link (or failed reconnect attempt): keep the channels and try again after a delay
+            if self.__link_lost_us is None:
+                self.__link_lost_us = int(round(time.time() * 1.E6))
+                self.__last_sample_us = int(self._sensorChannels[0].sample_buffer.last()["timestamp_us"]) \
+                    if len(self._sensorChannels[0].sample_buffer) > 0 else None
+                self.__reconnect_attempt = 0
+                logging.warning(f"Lost link to {self.deviceName()} ({self.deviceAddress()}); reconnecting.")
+            delays_ms = type(self).__RECONNECT_DELAYS_MS
+            self.__reconnectTimer.start(delays_ms[min(self.__reconnect_attempt, len(delays_ms) - 1)])
+            self.__reconnect_attempt += 1
             self._setDriverState(ssd.DriverState.PreparingState)
 
-    @pyqtSlot(QLowEnergyService.ServiceState, name="__low_energy_service_stateChanged")
-    def __low_energy_service_stateChanged(self, state: QLowEnergyService.ServiceState):
-        if state == QLowEnergyService.InvalidService:
-            self._setDriverState(ssd.DriverState.PreparingState)
+        elif state == gl.LinkState.ReadyState:
+            self.__restoreDevice()
+            if self.__link_lost_us is not None:
+                restored_us = int(round(time.time() * 1.E6))
+                self.__reconnect_gaps.append((self.__link_lost_us, restored_us, None))
+                logging.info(f"Reconnected to {self.deviceName()} ({self.deviceAddress()}) after "
+                             f"{(restored_us - self.__link_lost_us) / 1000.:.0f} ms and {self.__reconnect_attempt} "
+                             f"attempts.")
+                self.__link_lost_us = None
 
-        elif state == QLowEnergyService.DiscoveryRequired:
-            self.__low_energy_service.discoverDetails()
-            self._setDriverState(ssd.DriverState.PreparingState)
-
-        elif state == QLowEnergyService.DiscoveringServices:
+        else:
             self._setDriverState(ssd.DriverState.PreparingState)
 
-        elif state == QLowEnergyService.ServiceDiscovered:
-            # Create sensor channels
-            for i in range(5):
-                self._addSensorChannel(sc.SensorChannel(f"Channel {i}", "pF", parent=self))
-
-            # Enable notifications on buffer size characteristic
-            buff_size_char = self.__low_energy_service.characteristic(type(self).__BUFF_SIZE_CHAR_UUID)
-            if not buff_size_char.isValid():
-                raise RuntimeError("Buffer size characteristic not found.")
-
-            buff_size_desc = buff_size_char.descriptor(QBluetoothUuid(QBluetoothUuid.ClientCharacteristicConfiguration))
-            if not buff_size_desc.isValid():
-                raise RuntimeError("Buffer size client configuration characteristic descriptor not found.")
-
-            self.__low_energy_service.writeDescriptor(buff_size_desc, b'\x01\x00')
-
-            # Set the driver as ready and sync device time
-            self._setDriverState(ssd.DriverState.ReadyState)
-            self._setSystemTime(int(round(time.time() * 1E6)))
-
-    @pyqtSlot(QLowEnergyCharacteristic, QByteArray, name="__low_energy_service_characteristicChanged")
-    def __low_energy_service_characteristicChanged(self, char: QLowEnergyCharacteristic, data: QByteArray):
-        if char.uuid() == type(self).__BUFF_SIZE_CHAR_UUID and self.__sampling:
-            buffer_size = struct.unpack("<H", data)[0]
-            print(f"Buffer Size: {buffer_size}")
-            sensor_data_char = self.__low_energy_service.characteristic(type(self).__SENSOR_DATA_CHAR_UUID)
-            if not sensor_data_char.isValid():
-                raise RuntimeError("Sensor data characteristic not found.")
+    @pyqtSlot(int, bytes, name="__link_notified")
+    @prof.profiled()
+    def __link_notified(self, index: int, value: bytes):
+        if index == type(self).BUFF_SIZE and self.__sampling:
+            buffer_size = struct.unpack("<H", value)[0]
             for _ in range(buffer_size):  # This may be the problem?
-                self.__low_energy_service.readCharacteristic(sensor_data_char)
+                self.__link.read(type(self).SENSOR_DATA)
 
-    @pyqtSlot(QLowEnergyCharacteristic, QByteArray, name="__low_energy_service_characteristicRead")
-    def __low_energy_service_characteristicRead(self, char: QLowEnergyCharacteristic, value: QByteArray):
-        if char.uuid() == type(self).__SENSOR_DATA_CHAR_UUID and self.__sampling:
-            epoch_us = struct.unpack("<q", value[:8])[0]
+    @pyqtSlot(int, bytes, name="__link_readCompleted")
+    @prof.profiled()
+    def __link_readCompleted(self, index: int, value: bytes):
+        if index == type(self).SENSOR_DATA and self.__sampling:
+            epoch_us, samples = type(self).decodeFrame(value)
             if epoch_us == 0:  # throw out zero-timestamped frames
                 return
 
-            samples = list(struct.iter_unpack("<HHHHH", value[8:]))
-            channels = self.sensorChannels()
-            for i_s in range(len(samples)):
-                timestamp_us = epoch_us + (1.E6 / self.samplingRate()) * i_s
-                for i_c in range(len(channels)):
-                    samp_value = samples[i_s][i_c] / 10.0
-                    channels[i_c].add_sample(timestamp_us, samp_value)
+            self._ingestFrame(epoch_us, samples)
+
+            # First frame after a reconnect completes the reconnect's data gap
+            if len(self.__reconnect_gaps) > 0 and self.__reconnect_gaps[-1][2] is None and \
+                    self.__last_sample_us is not None:
+                first_us = int(self._sensorChannels[0].sample_buffer.last()["timestamp_us"]) - \
+                    int(round(1.E6 / self.__sampling_rate_hz * (len(samples) - 1)))
+                lost_us, restored_us, _ = self.__reconnect_gaps[-1]
+                self.__reconnect_gaps[-1] = (lost_us, restored_us, first_us - self.__last_sample_us)
+                self.__last_sample_us = None
+
+        elif index == type(self).SYS_TIME and self.__clock_sync_send_us is not None:
+            receive_us = int(round(time.time() * 1.E6))
+            device_us = struct.unpack("<q", value[:8])[0]
+            self._clockModel.addExchange(self.__clock_sync_send_us, device_us, receive_us)
+            self.__clock_sync_send_us = None
+
+    @pyqtSlot(str, name="__link_error")
+    def __link_error(self, error_msg: str):
+        logging.error(f"{self.deviceName()} ({self.deviceAddress()}): {error_msg}")
+        self.error.emit(error_msg)
+
+    @pyqtSlot(name="__reconnectTimer_timeout")
+    def __reconnectTimer_timeout(self):
+        if not self.__user_disconnected:
+            self.__link.connectToDevice()
+
+    @pyqtSlot(name="__clockSyncTimer_timeout")
+    @prof.profiled()
+    def __clockSyncTimer_timeout(self):
+        if self._driverState != ssd.DriverState.ReadyState:
+            return
+
+        # Wait for the outstanding exchange, unless its reply is overdue and presumed lost
+        now_us = int(round(time.time() * 1.E6))
+        if self.__clock_sync_send_us is not None and \
+                now_us - self.__clock_sync_send_us < type(self).__CLOCK_SYNC_INTERVAL_MS * 1000:
+            return
 
-            for s_ch in channels:
-                s_ch.updatePlotDataItem()
+        self.__clock_sync_send_us = now_us
+        self.__link.read(type(self).SYS_TIME)
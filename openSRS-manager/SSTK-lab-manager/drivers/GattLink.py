@@ -0,0 +1,253 @@
+"""Contains the LinkState, GattLink, and BluetoothGattLink class definitions.
+
+    A GattLink is the connection of a driver to one GATT service of a device. The driver names the characteristics it
+    uses once, as a list of UUIDs, and from then on reads, writes, subscribes, and receives values by index into that
+    list. The link resolves the characteristics when the service is discovered and keeps the characteristic handles per
+    device, so incoming values are dispatched with a dictionary lookup instead of UUID comparisons and characteristic
+    searches on every frame.
+
+    BluetoothGattLink is the QtBluetooth implementation. drivers.LoopbackGattLink implements the same interface without
+    Bluetooth hardware.
+
+    Typical usage example:
+    link = BluetoothGattLink(device_info, SERVICE_UUID, [DATA_CHAR_UUID, RATE_CHAR_UUID], parent=driver)
+    link.notified.connect(driver.onNotified)
+    link.connectToDevice()
+"""
+
+import enum
+import logging
+from typing import Dict, List, Union
+
+from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QBluetoothUuid, QLowEnergyCharacteristic, QLowEnergyController, \
+    QLowEnergyService
+from PyQt5.QtCore import QObject, QByteArray, pyqtSignal, pyqtSlot
+
+
+class LinkState(enum.Enum):
+    UnconnectedState = 0
+    ConnectingState = 1
+    DiscoveringState = 2
+    ReadyState = 3
+
+
+class GattLink(QObject):
+    """Base class of the connection to one GATT service, addressing characteristics by index.
+
+    Implementations emit stateChanged on every state change, and may only be read, written, or subscribed to in
+    ReadyState. A link that loses its connection goes to UnconnectedState and stays there until connectToDevice() is
+    called again; reconnecting is up to the driver.
+
+    Args:
+        service_uuid: UUID of the GATT service
+        characteristic_uuids: UUIDs of the characteristics used, in the order of their indices
+        parent: the driver owning the link
+    """
+
+    # region Class Initializer
+
+    def __init__(self, service_uuid: QBluetoothUuid, characteristic_uuids: List[QBluetoothUuid],
+                 parent: QObject = None):
+        super(GattLink, self).__init__(parent=parent)
+        self._serviceUuid = service_uuid
+        self._characteristicUuids = list(characteristic_uuids)
+        self._state = LinkState.UnconnectedState
+
+    # endregion
+
+    # region Abstract Instance Methods
+
+    def connectToDevice(self) -> None:
+        raise NotImplementedError
+
+    def disconnectFromDevice(self) -> None:
+        raise NotImplementedError
+
+    def read(self, index: int) -> None:
+        """Requests the value of a characteristic. The value is delivered by readCompleted."""
+        raise NotImplementedError
+
+    def write(self, index: int, value: bytes) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, index: int, enable: bool = True) -> None:
+        """Enables or disables notifications of a characteristic. Values are delivered by notified."""
+        raise NotImplementedError
+
+    def value(self, index: int) -> bytes:
+        """Returns the last value of a characteristic known to the link, without a request to the device."""
+        raise NotImplementedError
+
+    # endregion
+
+    # region Instance Methods
+
+    def state(self) -> LinkState:
+        return self._state
+
+    # endregion
+
+    # region Protected Instance Methods
+
+    def _setState(self, state: LinkState) -> None:
+        if state != self._state:
+            self._state = state
+            self.stateChanged.emit(state)
+
+    # endregion
+
+    # region Signals
+
+    stateChanged = pyqtSignal(object, name="stateChanged")
+    notified = pyqtSignal(int, bytes, name="notified")
+    readCompleted = pyqtSignal(int, bytes, name="readCompleted")
+    error = pyqtSignal(str, name="error")
+
+    # endregion
+
+
+class BluetoothGattLink(GattLink):
+    """GattLink to a Bluetooth low energy device through a QLowEnergyController.
+
+    The characteristic handles found at the first discovery are kept for the device. A reconnect skips service
+    discovery when the controller still knows the service (BlueZ keeps the attribute table of known devices) and
+    reuses the cached handles when the service reports the same layout, rebuilding them only if the layout changed.
+
+    Args:
+        device_info: QBluetoothDeviceInfo of the device
+        service_uuid: UUID of the GATT service
+        characteristic_uuids: UUIDs of the characteristics used, in the order of their indices
+        parent: the driver owning the link
+    """
+
+    # region Class Initializer
+
+    def __init__(self, device_info: QBluetoothDeviceInfo, service_uuid: QBluetoothUuid,
+                 characteristic_uuids: List[QBluetoothUuid], parent: QObject = None):
+        super(BluetoothGattLink, self).__init__(service_uuid, characteristic_uuids, parent=parent)
+
+        self.__controller = QLowEnergyController(device_info, self)
+        self.__controller.stateChanged.connect(self.__controller_stateChanged)
+        self.__service: Union[QLowEnergyService, None] = None
+
+        # Characteristics of the current connection by index, and the cached index of each characteristic handle
+        self.__characteristics: List[QLowEnergyCharacteristic] = []
+        self.__index_by_handle: Dict[int, int] = {}
+
+    # endregion
+
+    # region GattLink Implementation
+
+    def connectToDevice(self) -> None:
+        if self._state == LinkState.UnconnectedState:
+            self.__controller.connectToDevice()
+
+    def disconnectFromDevice(self) -> None:
+        self.__controller.disconnectFromDevice()
+
+    def read(self, index: int) -> None:
+        self.__service.readCharacteristic(self.__characteristics[index])
+
+    def write(self, index: int, value: bytes) -> None:
+        self.__service.writeCharacteristic(self.__characteristics[index], QByteArray(value))
+
+    def subscribe(self, index: int, enable: bool = True) -> None:
+        cccd = self.__characteristics[index].descriptor(
+            QBluetoothUuid(QBluetoothUuid.ClientCharacteristicConfiguration))
+        if not cccd.isValid():
+            raise RuntimeError(f"Characteristic {self._characteristicUuids[index].toString()} has no client "
+                               f"configuration descriptor.")
+        self.__service.writeDescriptor(cccd, b'\x01\x00' if enable else b'\x00\x00')
+
+    def value(self, index: int) -> bytes:
+        return bytes(self.__characteristics[index].value())
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __createService(self):
+        self.__service = self.__controller.createServiceObject(self._serviceUuid, self)
+        if self.__service is None:
+            self.error.emit(f"Service {self._serviceUuid.toString()} not found.")
+            self.__controller.disconnectFromDevice()
+            return
+
+        self.__service.characteristicChanged.connect(self.__service_characteristicChanged)
+        self.__service.characteristicRead.connect(self.__service_characteristicRead)
+        self.__service.stateChanged.connect(self.__service_stateChanged)
+        if self.__service.state() == QLowEnergyService.ServiceDiscovered:
+            self.__resolveCharacteristics()
+        else:
+            self.__service.discoverDetails()
+
+    def __resolveCharacteristics(self):
+        characteristics = [self.__service.characteristic(uuid) for uuid in self._characteristicUuids]
+        missing = [uuid.toString() for uuid, char in zip(self._characteristicUuids, characteristics)
+                   if not char.isValid()]
+        if len(missing) > 0:
+            self.error.emit(f"Characteristics {', '.join(missing)} not found.")
+            self.__controller.disconnectFromDevice()
+            return
+
+        index_by_handle = {char.handle(): index for index, char in enumerate(characteristics)}
+        if index_by_handle != self.__index_by_handle:
+            if len(self.__index_by_handle) > 0:
+                logging.info(f"Service {self._serviceUuid.toString()} changed layout; rebuilt characteristic handles.")
+            self.__index_by_handle = index_by_handle
+        self.__characteristics = characteristics
+        self._setState(LinkState.ReadyState)
+
+    # endregion
+
+    # region Slots
+
+    @pyqtSlot(QLowEnergyController.ControllerState, name="__controller_stateChanged")
+    def __controller_stateChanged(self, state: QLowEnergyController.ControllerState):
+        if state == QLowEnergyController.UnconnectedState:
+            if self.__service is not None:
+                self.__service.deleteLater()
+                self.__service = None
+            self.__characteristics = []
+            self._setState(LinkState.UnconnectedState)
+
+        elif state == QLowEnergyController.ConnectingState:
+            self._setState(LinkState.ConnectingState)
+
+        elif state == QLowEnergyController.ConnectedState:
+            self._setState(LinkState.DiscoveringState)
+            if self._serviceUuid in self.__controller.services():
+                self.__createService()  # Attribute table still known; no service discovery needed
+            else:
+                self.__controller.discoverServices()
+
+        elif state == QLowEnergyController.DiscoveringState:
+            self._setState(LinkState.DiscoveringState)
+
+        elif state == QLowEnergyController.DiscoveredState:
+            if self.__service is None:
+                self.__createService()
+
+        elif state == QLowEnergyController.ClosingState:
+            self._setState(LinkState.ConnectingState)
+
+    @pyqtSlot(QLowEnergyService.ServiceState, name="__service_stateChanged")
+    def __service_stateChanged(self, state: QLowEnergyService.ServiceState):
+        if state == QLowEnergyService.ServiceDiscovered:
+            self.__resolveCharacteristics()
+        elif state == QLowEnergyService.DiscoveryRequired:
+            self.__service.discoverDetails()
+
+    @pyqtSlot(QLowEnergyCharacteristic, QByteArray, name="__service_characteristicChanged")
+    def __service_characteristicChanged(self, char: QLowEnergyCharacteristic, value: QByteArray):
+        index = self.__index_by_handle.get(char.handle())
+        if index is not None:
+            self.notified.emit(index, bytes(value))
+
+    @pyqtSlot(QLowEnergyCharacteristic, QByteArray, name="__service_characteristicRead")
+    def __service_characteristicRead(self, char: QLowEnergyCharacteristic, value: QByteArray):
+        index = self.__index_by_handle.get(char.handle())
+        if index is not None:
+            self.readCompleted.emit(index, bytes(value))
+
+    # endregion
@@ -0,0 +1,232 @@
+"""Contains the LoopbackGattLink class definition.
+
+    LoopbackGattLink is a hardware-free stand-in for the GATT link to an AthEngDCMk1 module. It emulates the module's
+    firmware in process: sampling rate and system time characteristics, buffer size notifications, and sensor data
+    frames read one by one, with the connection and discovery delays of a real link. The link can be dropped and the
+    device made unreachable on demand, which makes it suitable for exercising the driver's reconnect and state restore.
+
+    Typical usage example:
+    link = LoopbackGattLink()
+    driver = AthEngDCMk1(LoopbackGattLink.deviceInfo(0), link=link, parent=mySensorServiceItemModel)
+    mySensorServiceItemModel.addServiceDriver(driver)
+    driver.connectToDevice()
+    ...
+    link.dropLink()
+"""
+
+import struct
+import time
+from collections import deque
+from typing import List
+
+import numpy as np
+from PyQt5.QtBluetooth import QBluetoothAddress, QBluetoothDeviceInfo
+from PyQt5.QtCore import QObject, QTimer, pyqtSlot
+
+from drivers import GattLink as gl
+from drivers.AthEngDCMk1 import AthEngDCMk1
+
+
+class LoopbackGattLink(gl.GattLink):
+    """GattLink to an emulated AthEngDCMk1 module.
+
+    Like a bonded device, the emulated device has its attribute table discovered on the first connection only; later
+    connections take connect_ms. Subscriptions and sampling stop when the link drops, as on the device, and the device
+    clock keeps running.
+
+    Keyword Args:
+        connect_ms: time to establish a connection
+        discovery_ms: additional time of the first connection, spent discovering the service
+        seed: seed for the random number generator used to synthesize the signals
+        parent: the driver owning the link
+    """
+
+    __SAMPLES_PER_FRAME = 20  # 8 + 10 * 20 bytes fit in one ATT payload
+    __TIMER_INTERVAL_MS = 20
+
+    # region Static Methods
+
+    @staticmethod
+    def deviceInfo(index: int) -> QBluetoothDeviceInfo:
+        """Returns placeholder device info for the index-th loopback device."""
+        device_info = QBluetoothDeviceInfo(QBluetoothAddress(f"00:00:00:00:01:{index:02X}"), f"Loopback {index}", 0)
+        device_info.setServiceUuids([AthEngDCMk1.matchUuid()], QBluetoothDeviceInfo.DataComplete)
+        return device_info
+
+    # endregion
+
+    # region Class Initializer
+
+    def __init__(self, connect_ms: int = 50, discovery_ms: int = 1500, seed: int = None, parent: QObject = None):
+        super(LoopbackGattLink, self).__init__(AthEngDCMk1.matchUuid(), AthEngDCMk1.CHARACTERISTIC_UUIDS,
+                                               parent=parent)
+        self.__connect_ms = connect_ms
+        self.__discovery_ms = discovery_ms
+        self.__discovered = False
+        self.__reachable = True
+
+        # Emulated firmware state
+        self.__rng = np.random.default_rng(seed)
+        self.__base_pf = self.__rng.uniform(380.0, 650.0, AthEngDCMk1.NUM_CHANNELS)
+        self.__amplitude_pf = self.__rng.uniform(5.0, 40.0, AthEngDCMk1.NUM_CHANNELS)
+        self.__clock_offset_us = 0
+        self.__values = [b""] * len(AthEngDCMk1.CHARACTERISTIC_UUIDS)
+        self.__values[AthEngDCMk1.SAMP_RATE] = AthEngDCMk1.samplingRateCode(0.0)
+        self.__subscribed = set()
+        self.__frames = deque()
+        self.__next_frame_us = 0
+        self.__frames_sent = 0
+        self.__frames_dropped = 0
+
+        self.__frameTimer = QTimer(parent=self)
+        self.__frameTimer.setInterval(type(self).__TIMER_INTERVAL_MS)
+        self.__frameTimer.timeout.connect(self.__frameTimer_timeout)
+
+    # endregion
+
+    # region GattLink Implementation
+
+    def connectToDevice(self) -> None:
+        if self._state != gl.LinkState.UnconnectedState:
+            return
+        self._setState(gl.LinkState.ConnectingState)
+        QTimer.singleShot(self.__connect_ms, self.__connected)
+
+    def disconnectFromDevice(self) -> None:
+        if self._state != gl.LinkState.UnconnectedState:
+            self.__linkDown()
+
+    def read(self, index: int) -> None:
+        self.__checkReady()
+        if index == AthEngDCMk1.SENSOR_DATA:
+            # Reads beyond the buffered frames return an empty, zero-timestamped frame
+            if len(self.__frames) > 0:
+                value = self.__frames.popleft()
+                self.__frames_sent += 1
+            else:
+                value = bytes(8 + 2 * AthEngDCMk1.NUM_CHANNELS)
+        elif index == AthEngDCMk1.SYS_TIME:
+            value = struct.pack("<q", self.__deviceTimeUs())
+        else:
+            value = self.__values[index]
+        QTimer.singleShot(0, lambda: self.__deliver(index, value))
+
+    def write(self, index: int, value: bytes) -> None:
+        self.__checkReady()
+        value = bytes(value)
+        if index == AthEngDCMk1.SYS_TIME:
+            self.__clock_offset_us = struct.unpack("<q", value[:8])[0] - int(round(time.time() * 1.E6))
+        elif index == AthEngDCMk1.SAMP_RATE:
+            self.__values[index] = value
+            self.__startSampling(AthEngDCMk1.samplingRateFromCode(value))
+        else:
+            self.__values[index] = value
+
+    def subscribe(self, index: int, enable: bool = True) -> None:
+        self.__checkReady()
+        if enable:
+            self.__subscribed.add(index)
+        else:
+            self.__subscribed.discard(index)
+
+    def value(self, index: int) -> bytes:
+        return self.__values[index]
+
+    # endregion
+
+    # region Instance Methods
+
+    def dropLink(self) -> None:
+        """Drops the connection as if the device went out of range; the driver sees an unexpected disconnect."""
+        if self._state != gl.LinkState.UnconnectedState:
+            self.__linkDown()
+
+    def setReachable(self, reachable: bool) -> None:
+        """Sets whether connection attempts succeed. Attempts to reach an unreachable device fail after connect_ms."""
+        self.__reachable = reachable
+
+    def framesSent(self) -> int:
+        """Returns the number of sensor data frames read by the driver."""
+        return self.__frames_sent
+
+    def framesDropped(self) -> int:
+        """Returns the number of sensor data frames sampled by the device but lost with a dropped link."""
+        return self.__frames_dropped
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __checkReady(self):
+        if self._state != gl.LinkState.ReadyState:
+            raise RuntimeError("Loopback link not connected.")
+
+    def __deviceTimeUs(self) -> int:
+        return int(round(time.time() * 1.E6)) + self.__clock_offset_us
+
+    def __startSampling(self, rate_hz: float):
+        self.__frames.clear()
+        if rate_hz == 0.0:
+            self.__frameTimer.stop()
+            return
+        self.__next_frame_us = self.__deviceTimeUs()
+        self.__frameTimer.start()
+
+    def __linkDown(self):
+        # The device drops its subscriptions, stops sampling, and discards the frames not yet read
+        self.__subscribed.clear()
+        self.__frameTimer.stop()
+        self.__frames_dropped += len(self.__frames)
+        self.__frames.clear()
+        self.__values[AthEngDCMk1.SAMP_RATE] = AthEngDCMk1.samplingRateCode(0.0)
+        self._setState(gl.LinkState.UnconnectedState)
+
+    def __generateFrames(self, rate_hz: float) -> List[bytes]:
+        period_us = 1.E6 / rate_hz
+        frame_us = period_us * type(self).__SAMPLES_PER_FRAME
+        frames = []
+        while self.__next_frame_us + frame_us <= self.__deviceTimeUs():
+            t_s = (self.__next_frame_us + period_us * np.arange(type(self).__SAMPLES_PER_FRAME)) / 1.E6
+            gait = np.sin(2.0 * np.pi * t_s[:, np.newaxis] + np.arange(AthEngDCMk1.NUM_CHANNELS))
+            noise = self.__rng.normal(0.0, 0.5, (type(self).__SAMPLES_PER_FRAME, AthEngDCMk1.NUM_CHANNELS))
+            raw = np.round((self.__base_pf + self.__amplitude_pf * gait + noise) * 10.0).astype("<u2")
+            frames.append(struct.pack("<q", int(round(self.__next_frame_us))) + raw.tobytes())
+            self.__next_frame_us += frame_us
+        return frames
+
+    # endregion
+
+    # region Slots
+
+    @pyqtSlot(name="__connected")
+    def __connected(self):
+        if self._state != gl.LinkState.ConnectingState:
+            return
+        if not self.__reachable:
+            self._setState(gl.LinkState.UnconnectedState)
+            return
+        if self.__discovered:
+            self._setState(gl.LinkState.ReadyState)
+            return
+
+        self._setState(gl.LinkState.DiscoveringState)
+        QTimer.singleShot(self.__discovery_ms, self.__discoveryFinished)
+
+    @pyqtSlot(name="__discoveryFinished")
+    def __discoveryFinished(self):
+        if self._state == gl.LinkState.DiscoveringState:
+            self.__discovered = True
+            self._setState(gl.LinkState.ReadyState)
+
+    def __deliver(self, index: int, value: bytes):
+        if self._state == gl.LinkState.ReadyState:
+            self.readCompleted.emit(index, value)
+
+    @pyqtSlot(name="__frameTimer_timeout")
+    def __frameTimer_timeout(self):
+        rate_hz = AthEngDCMk1.samplingRateFromCode(self.__values[AthEngDCMk1.SAMP_RATE])
+        self.__frames.extend(self.__generateFrames(rate_hz))
+        if AthEngDCMk1.BUFF_SIZE in self.__subscribed and len(self.__frames) > 0:
+            self.notified.emit(AthEngDCMk1.BUFF_SIZE, struct.pack("<H", len(self.__frames)))
+
+    # endregion
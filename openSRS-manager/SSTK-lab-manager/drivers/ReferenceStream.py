@@ -0,0 +1,253 @@
+"""Contains the ReferenceStream class definition.
+
+    ReferenceStream is a SensorServiceDriver that receives an external reference signal, typically joint angles from a
+    motion capture bridge, as UDP datagrams on a local port. Each named signal in the stream becomes a SensorChannel,
+    so reference channels are plotted, recorded, and exported like device channels.
+
+    Each datagram holds one JSON object with the samples' host timestamps in microseconds since epoch and a value or
+    list of values per channel. Channels are created the first time their name is received:
+
+        {"timestamp_us": [1700000000000000, 1700000000008333], "values": {"R_FLX": [12.5, 12.9]}, "units": "deg"}
+
+    "timestamp_us" may be omitted, in which case the samples are stamped with the arrival time of the datagram (only
+    sensible for one sample per datagram), and "units" is optional. reference_replay.py replays a recorded trial in
+    this format and stands in for the motion capture bridge when testing.
+
+    The stream can be aligned with the SRS channels: for each chosen (reference channel, SRS channel) pair a
+    LagEstimator keeps a running estimate of the lag between them, and the lag of the most correlated pair is applied
+    to the reference channels' timestamps on export (see SensorServiceDriver.alignmentOffsetUs). Exported sessions are
+    then aligned without an offline cross-correlation step.
+
+    Typical usage example:
+    referenceStream = ReferenceStream(5005, parent=mySensorServiceItemModel)
+    mySensorServiceItemModel.addServiceDriver(referenceStream)
+    referenceStream.addLagEstimator(referenceStream.sensorChannels()[0], srsChannel)
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, List, Union
+
+import numpy as np
+from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QBluetoothUuid
+from PyQt5.QtCore import QObject, Qt, pyqtSlot
+from PyQt5.QtNetwork import QHostAddress, QUdpSocket
+from PyQt5.QtWidgets import QAction, QMenu
+
+import LagEstimator as le
+import Profiler as prof
+import SensorChannel as sc
+import SensorServiceDriver as ssd
+import SensorServiceItem as ssi
+
+
+class ReferenceStream(ssd.SensorServiceDriver):
+    """SensorServiceDriver receiving reference channels over local UDP.
+
+    Args:
+        port: local UDP port to listen on
+
+    Keyword Args:
+        parent: SensorServiceItemModel managing and monitoring the driver
+
+    Raises:
+        OSError: the port cannot be bound
+    """
+
+    DEFAULT_PORT = 5005
+    DEFAULT_UNITS = "deg"
+
+    __REFERENCE_SERVICE_UUID = QBluetoothUuid("90eff100-0000-1000-8000-00805f9b34fb")
+
+    # region SensorServiceDriver Static Implementation
+
+    @staticmethod
+    def deviceClass() -> str:
+        return "Reference Stream"
+
+    @staticmethod
+    def driverName() -> str:
+        return "ReferenceStream Driver Version 0.1"
+
+    @staticmethod
+    def matchUuid() -> QBluetoothUuid:
+        return ReferenceStream.__REFERENCE_SERVICE_UUID
+
+    @staticmethod
+    def supportedSamplingRates() -> List[float]:
+        return []
+
+    # endregion
+
+    # region Class Initializer
+
+    def __init__(self, port: int = DEFAULT_PORT, parent: QObject = None):
+        super(ReferenceStream, self).__init__(QBluetoothDeviceInfo(), parent=parent)
+
+        self.__port = port
+        self.__display_text = f"{type(self).deviceClass()} [{self.deviceAddress()}]"
+        self.__channels: Dict[str, sc.SensorChannel] = {}
+        self.__lagEstimators: List[le.LagEstimator] = []
+
+        self.__socket = QUdpSocket(self)
+        if not self.__socket.bind(QHostAddress(QHostAddress.LocalHost), port):
+            raise OSError(f"Could not bind UDP port {port}: {self.__socket.errorString()}")
+        self.__socket.readyRead.connect(self.__socket_readyRead)
+        self._setDriverState(ssd.DriverState.ReadyState)
+
+    # endregion
+
+    # region SensorServiceItem Implementation
+
+    def data(self, role: Qt.ItemDataRole = None) -> Any:
+        __doc__ = ssi.SensorServiceItem.data.__doc__  # Inherit docstring
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return self.__display_text
+        elif role == Qt.ToolTipRole:
+            lines = [f"{self.deviceName()} ({self.deviceAddress()})"]
+            for estimator in self.__lagEstimators:
+                lag_us = estimator.lagUs()
+                pair = f"{estimator.referenceChannel().display_name} vs {estimator.srsChannel().display_name}"
+                if lag_us is None:
+                    lines.append(f"{pair}: estimating lag...")
+                else:
+                    lines.append(f"{pair}: lag {lag_us / 1000.:.1f} ms (|r| {estimator.peakCorrelation():.2f})")
+            return "\n".join(lines)
+        return super(ReferenceStream, self).data(role)
+
+    # endregion
+
+    # region SensorServiceDriver Implementation
+
+    def alignmentOffsetUs(self) -> int:
+        __doc__ = ssd.SensorServiceDriver.alignmentOffsetUs.__doc__  # Inherit docstring
+        ready = [estimator for estimator in self.__lagEstimators if estimator.ready()]
+        if len(ready) == 0:
+            return 0
+        return max(ready, key=lambda estimator: estimator.peakCorrelation()).lagUs()
+
+    def deviceAddress(self):
+        return f"udp:{self.__port}"
+
+    def deviceName(self):
+        return type(self).deviceClass()
+
+    def deviceServices(self):
+        return [type(self).matchUuid()]
+
+    def samplingRate(self) -> float:
+        # Samples are timestamped by the sender
+        return 0.0
+
+    def setSamplingRate(self, rate_hz: float) -> None:
+        raise RuntimeError(f"Sampling rate of {type(self).deviceClass()} is set by the sender.")
+
+    # endregion
+
+    # region Instance Methods
+
+    def addLagEstimator(self, reference_channel: sc.SensorChannel, srs_channel: sc.SensorChannel) -> le.LagEstimator:
+        """Starts estimating the lag between one of the stream's channels and an SRS channel."""
+        if reference_channel not in self._sensorChannels:
+            raise ValueError(f"{reference_channel.display_name} is not a channel of {self.deviceAddress()}.")
+
+        estimator = le.LagEstimator(reference_channel, srs_channel, parent=self)
+        self.__lagEstimators.append(estimator)
+        logging.info(f"Estimating lag of {srs_channel.display_name} relative to {reference_channel.display_name}.")
+        return estimator
+
+    def clearLagEstimators(self) -> None:
+        for estimator in self.__lagEstimators:
+            estimator.detach()
+        self.__lagEstimators = []
+
+    def close(self) -> None:
+        """Stops listening and detaches the lag estimators."""
+        self.__socket.close()
+        self.clearLagEstimators()
+        self._setDriverState(ssd.DriverState.UnconnectedState)
+
+    def lagEstimators(self) -> List[le.LagEstimator]:
+        return self.__lagEstimators
+
+    def port(self) -> int:
+        return self.__port
+
+    # endregion
+
+    # region Protected Instance Methods
+
+    def _initContextMenu(self) -> QMenu:
+        context_menu = QMenu("Reference Stream")
+
+        align_menu = QMenu("Align With", context_menu)
+        context_menu.addMenu(align_menu)
+        clear_action = QAction("Clear Alignment", context_menu)
+        context_menu.addAction(clear_action)
+        context_menu.addSeparator()
+        close_action = QAction("Disconnect", context_menu)
+        context_menu.addAction(close_action)
+
+        context_menu.aboutToShow.connect(lambda: self.__populateAlignMenu(align_menu))
+        context_menu.aboutToShow.connect(lambda: clear_action.setEnabled(len(self.__lagEstimators) > 0))
+        context_menu.aboutToShow.connect(
+            lambda: close_action.setEnabled(self._driverState == ssd.DriverState.ReadyState))
+        align_menu.triggered.connect(lambda action: self.addLagEstimator(*action.data()))
+        clear_action.triggered.connect(self.clearLagEstimators)
+        close_action.triggered.connect(self.close)
+
+        return context_menu
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __ingestDatagram(self, datagram: bytes) -> None:
+        message = json.loads(datagram)
+        values: Dict[str, Union[float, List[float]]] = message["values"]
+        if "timestamp_us" in message:
+            timestamps_us = np.atleast_1d(np.asarray(message["timestamp_us"], dtype=np.int64))
+        else:
+            timestamps_us = np.array([int(round(time.time() * 1.E6))], dtype=np.int64)
+
+        for name, channel_values in values.items():
+            channel_values = np.atleast_1d(np.asarray(channel_values, dtype=np.float64))
+            if len(channel_values) != len(timestamps_us):
+                raise ValueError(f"{len(channel_values)} values of {name} for {len(timestamps_us)} timestamps.")
+
+            s_ch = self.__channels.get(name)
+            if s_ch is None:
+                s_ch = sc.SensorChannel(name, message.get("units", type(self).DEFAULT_UNITS), parent=self)
+                self.__channels[name] = s_ch
+                self._addSensorChannel(s_ch)
+            s_ch.add_samples(timestamps_us, channel_values)
+
+    def __populateAlignMenu(self, align_menu: QMenu) -> None:
+        # One submenu per reference channel listing the SRS channels it can be aligned with
+        align_menu.clear()
+        pairs = {(estimator.referenceChannel(), estimator.srsChannel()) for estimator in self.__lagEstimators}
+        srs_channels = [s_ch for s_ch in self.parent().sensorChannels() if s_ch.parent() is not self]
+        for reference_channel in self._sensorChannels:
+            channel_menu = align_menu.addMenu(reference_channel.display_name)
+            for srs_channel in srs_channels:
+                action = channel_menu.addAction(f"{srs_channel.display_name} ({srs_channel.parent().deviceAddress()})")
+                action.setData((reference_channel, srs_channel))
+                action.setEnabled((reference_channel, srs_channel) not in pairs)
+        align_menu.setEnabled(len(self._sensorChannels) > 0 and len(srs_channels) > 0)
+
+    # endregion
+
+    # region Slots
+
+    @pyqtSlot(name="__socket_readyRead")
+    @prof.profiled()
+    def __socket_readyRead(self):
+        while self.__socket.hasPendingDatagrams():
+            datagram = self.__socket.receiveDatagram()
+            try:
+                self.__ingestDatagram(bytes(datagram.data()))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logging.warning(f"Dropped malformed datagram on {self.deviceAddress()}: {e}")
+
+    # endregion
@@ -6,6 +6,7 @@ from typing import List
 from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QLowEnergyService, QBluetoothUuid, QLowEnergyCharacteristic
 from PyQt5.QtCore import QObject, pyqtSlot, QByteArray, Qt
 
+import Profiler as prof
 import SensorChannel as sc
 import SensorServiceDriver as ssd
 
@@ -133,6 +134,7 @@ class SS16G3V197(ssd.SensorServiceDriver):
     # region Slots
 
     @pyqtSlot(QLowEnergyCharacteristic, QByteArray, name="__dataCharacteristic_characteristicChanged")
+    @prof.profiled()
     def __dataCharacteristic_characteristicChanged(self, char: QLowEnergyCharacteristic, data: QByteArray):
         if char.uuid() == self.__dataCharacteristic.uuid():
             parsed_data = [x * 0.1 for x in struct.unpack(">HHHHHHHHHH", data)]
@@ -0,0 +1,225 @@
+"""Contains the SimulatedDevice class definition.
+
+    SimulatedDevice is a hardware-free stand-in for an AthEngDCMk1 module. It synthesizes frames in the AthEngDCMk1
+    sensor data format on a QTimer and ingests them through the same decode path as the real driver, which makes it
+    suitable for benchmarking and exercising the application without Bluetooth hardware.
+
+    Typical usage example:
+    driver = SimulatedDevice(SimulatedDevice.deviceInfo(0), parent=mySensorServiceItemModel)
+    mySensorServiceItemModel.addServiceDriver(driver)
+    driver.setSamplingRate(250.0)
+"""
+
+import struct
+import time
+from typing import List
+
+import numpy as np
+from PyQt5.QtBluetooth import QBluetoothAddress, QBluetoothDeviceInfo, QBluetoothUuid
+from PyQt5.QtCore import QObject, QTimer, pyqtSlot
+from PyQt5.QtWidgets import QAction
+
+import Profiler as prof
+import SensorChannel as sc
+import SensorServiceDriver as ssd
+from drivers.AthEngDCMk1 import AthEngDCMk1
+
+
+class SimulatedDevice(ssd.SensorServiceDriver):
+    """SensorServiceDriver that generates AthEngDCMk1-formatted sensor data instead of reading it from a device.
+
+    Samples are timestamped on a virtual clock that runs speedup times faster than the wall clock, so long sessions
+    can be simulated in a fraction of the time. Frames are generated on a QTimer and, like the real device, are
+    delivered late rather than dropped when the event loop falls behind.
+
+    The device clock that stamps the frames may be given an offset and skew from the virtual (host) clock. Like the real
+    driver, the simulation then exchanges times with the device every few seconds, with random round-trip delays, to fit
+    the driver's clock model.
+
+    Keyword Args:
+        speedup: ratio of simulated time to wall clock time
+        seed: seed for the random number generator used to synthesize the signals
+        clock_offset_us: offset of the device clock from the host clock in microseconds
+        clock_skew_ppm: rate error of the device clock in parts per million
+        parent: SensorServiceItemModel managing and monitoring the driver
+    """
+
+    __SIM_SERVICE_UUID = QBluetoothUuid("90effff0-0000-1000-8000-00805f9b34fb")
+    __SAMPLES_PER_FRAME = 48
+    __NUM_CHANNELS = 5
+    __TIMER_INTERVAL_MS = 10
+    __CLOCK_SYNC_INTERVAL_US = 5 * 1000000
+
+    # region SensorServiceDriver Static Implementation
+
+    @staticmethod
+    def deviceClass() -> str:
+        return "Simulated DCMk1"
+
+    @staticmethod
+    def driverName() -> str:
+        return "SimulatedDevice Driver Version 0.1"
+
+    @staticmethod
+    def matchUuid() -> QBluetoothUuid:
+        return SimulatedDevice.__SIM_SERVICE_UUID
+
+    @staticmethod
+    def supportedSamplingRates() -> List[float]:
+        return AthEngDCMk1.supportedSamplingRates()
+
+    # endregion
+
+    # region Static Methods
+
+    @staticmethod
+    def deviceInfo(index: int) -> QBluetoothDeviceInfo:
+        """Returns placeholder device info for the index-th simulated device."""
+        return QBluetoothDeviceInfo(QBluetoothAddress(f"00:00:00:00:00:{index:02X}"), f"Simulated {index}", 0)
+
+    # endregion
+
+    # region Class Initializer
+
+    def __init__(self, device_info: QBluetoothDeviceInfo, speedup: float = 1.0, seed: int = None,
+                 clock_offset_us: int = 0, clock_skew_ppm: float = 0.0, parent: QObject = None):
+        super(SimulatedDevice, self).__init__(device_info, parent=parent)
+
+        self.__device_address = device_info.address()
+        self.__device_name = device_info.name()
+        self.__device_services = [type(self).matchUuid()]
+
+        # Signal synthesis state
+        self.__rng = np.random.default_rng(seed)
+        self.__base_pf = self.__rng.uniform(380.0, 650.0, type(self).__NUM_CHANNELS)
+        self.__amplitude_pf = self.__rng.uniform(5.0, 40.0, type(self).__NUM_CHANNELS)
+        self.__phase = self.__rng.uniform(0.0, 2.0 * np.pi, type(self).__NUM_CHANNELS)
+        self.__stride_hz = self.__rng.uniform(0.8, 1.2)
+
+        # Virtual clock
+        self.__speedup = speedup
+        self.__sampling_rate_hz = 0.0
+        self.__clock_us = 0
+        self.__virtual_start_us = 0
+        self.__real_start_s = 0.0
+
+        # Device clock
+        self.__clock_offset_us = clock_offset_us
+        self.__clock_skew = clock_skew_ppm * 1.E-6
+        self.__next_sync_us = 0
+
+        self.__frameTimer = QTimer(parent=self)
+        self.__frameTimer.setInterval(type(self).__TIMER_INTERVAL_MS)
+        self.__frameTimer.timeout.connect(self.__frameTimer_timeout)
+
+        self._contextMenu.triggered.connect(self._contextMenu_triggered)
+        self.connectToDevice()
+
+    # endregion
+
+    # region SensorServiceDriver Implementation
+
+    def deviceAddress(self):
+        return self.__device_address.toString()
+
+    def deviceName(self):
+        return self.__device_name
+
+    def deviceServices(self):
+        return self.__device_services
+
+    def samplingRate(self) -> float:
+        if self._driverState != ssd.DriverState.ReadyState:
+            return 0.0
+        return self.__sampling_rate_hz
+
+    def setSamplingRate(self, rate_hz: float) -> None:
+        if not self._driverState == ssd.DriverState.ReadyState:
+            raise RuntimeError("Driver/device not ready to set sampling rate.")
+
+        if rate_hz not in type(self).supportedSamplingRates():
+            raise ValueError(f"Sampling rate {rate_hz} not supported by {type(self).driverName()}.")
+
+        self.__sampling_rate_hz = rate_hz
+        if rate_hz == 0.0:
+            self.__frameTimer.stop()
+            return
+
+        self.__clock_us = int(round(time.time() * 1.E6))
+        self.__virtual_start_us = self.__clock_us
+        self.__real_start_s = time.perf_counter()
+        self.__next_sync_us = self.__clock_us
+        self.__frameTimer.start()
+
+    # endregion
+
+    # region Instance Methods
+
+    def connectToDevice(self) -> None:
+        if self._driverState != ssd.DriverState.UnconnectedState:
+            return
+
+        for i in range(type(self).__NUM_CHANNELS):
+            self._addSensorChannel(sc.SensorChannel(f"Channel {i}", "pF", parent=self))
+        self._setDriverState(ssd.DriverState.ReadyState)
+
+    def disconnectFromDevice(self) -> None:
+        self.__frameTimer.stop()
+        self.__sampling_rate_hz = 0.0
+        self._clearSensorChannels()
+        self._setDriverState(ssd.DriverState.UnconnectedState)
+
+    def simulatedTimeUs(self) -> int:
+        """Returns the virtual clock time of the next frame to be generated, in microseconds since epoch."""
+        return self.__clock_us
+
+    # endregion
+
+    # region Private Instance Methods
+
+    def __deviceTimeUs(self, virtual_us: float) -> int:
+        elapsed_us = virtual_us - self.__virtual_start_us
+        return int(round(virtual_us + self.__clock_offset_us + self.__clock_skew * elapsed_us))
+
+    def __exchangeTime(self) -> None:
+        # The device reads its clock somewhere in the middle of a round trip of random length
+        delay_us = self.__rng.uniform(5.E3, 40.E3)
+        device_us = self.__deviceTimeUs(self.__clock_us + delay_us * self.__rng.uniform(0.3, 0.7))
+        self._clockModel.addExchange(self.__clock_us, device_us, self.__clock_us + int(delay_us))
+
+    def __generateFrame(self) -> bytes:
+        period_us = 1.E6 / self.__sampling_rate_hz
+        t_s = (self.__clock_us + period_us * np.arange(type(self).__SAMPLES_PER_FRAME)) / 1.E6
+        gait = np.sin(2.0 * np.pi * self.__stride_hz * t_s[:, np.newaxis] + self.__phase)
+        noise = self.__rng.normal(0.0, 0.5, (type(self).__SAMPLES_PER_FRAME, type(self).__NUM_CHANNELS))
+        values_pf = self.__base_pf + self.__amplitude_pf * gait + noise
+        raw = np.clip(np.round(values_pf * 10.0), 0, np.iinfo(np.uint16).max).astype("<u2")
+        return struct.pack("<q", self.__deviceTimeUs(self.__clock_us)) + raw.tobytes()
+
+    # endregion
+
+    # region Slots
+
+    @pyqtSlot(QAction, name="_contextMenu_triggered")
+    def _contextMenu_triggered(self, action: QAction):
+        if action.data() == "connect":
+            self.connectToDevice()
+        elif action.data() == "disconnect":
+            self.disconnectFromDevice()
+
+    @pyqtSlot(name="__frameTimer_timeout")
+    @prof.profiled()
+    def __frameTimer_timeout(self):
+        # Emit every frame the virtual clock has completed since the last timeout
+        virtual_now_us = self.__virtual_start_us + (time.perf_counter() - self.__real_start_s) * self.__speedup * 1.E6
+        frame_us = int(round(type(self).__SAMPLES_PER_FRAME * 1.E6 / self.__sampling_rate_hz))
+        while self.__clock_us + frame_us <= virtual_now_us:
+            if self.__clock_us >= self.__next_sync_us:
+                self.__exchangeTime()
+                self.__next_sync_us += type(self).__CLOCK_SYNC_INTERVAL_US
+
+            epoch_us, samples = AthEngDCMk1.decodeFrame(self.__generateFrame())
+            self._ingestFrame(epoch_us, samples)
+            self.__clock_us += frame_us
+
+    # endregion
@@ -0,0 +1,106 @@
+"""Contains the VirtualDevice class definition.
+
+    VirtualDevice is a SensorServiceDriver without hardware that holds the DerivedChannels defined by the user, so that
+    derived channels appear in the sensor tree and are plotted, refreshed, and exported like device channels. The
+    SensorServiceItemModel creates a single VirtualDevice when the first derived channel is added.
+
+    Typical usage example:
+    virtualDevice = VirtualDevice(parent=mySensorServiceItemModel)
+    mySensorServiceItemModel.addServiceDriver(virtualDevice)
+    virtualDevice.addDerivedChannel(DerivedChannel("DFX - PFX", "{R_DFX} - {R_PFX}", channels, parent=virtualDevice))
+"""
+
+from typing import Any, List
+
+from PyQt5.QtBluetooth import QBluetoothDeviceInfo, QBluetoothUuid
+from PyQt5.QtCore import QObject, Qt
+from PyQt5.QtWidgets import QMenu
+
+import DerivedChannel as dc
+import SensorServiceDriver as ssd
+import SensorServiceItem as ssi
+
+
+class VirtualDevice(ssd.SensorServiceDriver):
+    """SensorServiceDriver holding DerivedChannels.
+
+    Keyword Args:
+        parent: SensorServiceItemModel managing and monitoring the driver
+    """
+
+    __VIRTUAL_SERVICE_UUID = QBluetoothUuid("90eff000-0000-1000-8000-00805f9b34fb")
+
+    # region SensorServiceDriver Static Implementation
+
+    @staticmethod
+    def deviceClass() -> str:
+        return "Derived Channels"
+
+    @staticmethod
+    def driverName() -> str:
+        return "VirtualDevice Driver Version 0.1"
+
+    @staticmethod
+    def matchUuid() -> QBluetoothUuid:
+        return VirtualDevice.__VIRTUAL_SERVICE_UUID
+
+    @staticmethod
+    def supportedSamplingRates() -> List[float]:
+        return []
+
+    # endregion
+
+    # region Class Initializer
+
+    def __init__(self, parent: QObject = None):
+        super(VirtualDevice, self).__init__(QBluetoothDeviceInfo(), parent=parent)
+        self._setDriverState(ssd.DriverState.ReadyState)
+
+    # endregion
+
+    # region SensorServiceItem Implementation
+
+    def contextMenu(self) -> QMenu:
+        __doc__ = ssi.SensorServiceItem.contextMenu.__doc__  # Inherit docstring
+        return None
+
+    def data(self, role: Qt.ItemDataRole = None) -> Any:
+        __doc__ = ssi.SensorServiceItem.data.__doc__  # Inherit docstring
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return type(self).deviceClass()
+        return super(VirtualDevice, self).data(role)
+
+    # endregion
+
+    # region SensorServiceDriver Implementation
+
+    def deviceAddress(self):
+        return "virtual"
+
+    def deviceName(self):
+        return type(self).deviceClass()
+
+    def deviceServices(self):
+        return [type(self).matchUuid()]
+
+    def samplingRate(self) -> float:
+        # Derived channels are sampled at the rate of their driving input
+        return 0.0
+
+    def setSamplingRate(self, rate_hz: float) -> None:
+        raise RuntimeError(f"Sampling rate of {type(self).deviceClass()} follows their inputs.")
+
+    # endregion
+
+    # region Instance Methods
+
+    def addDerivedChannel(self, derived_channel: dc.DerivedChannel) -> None:
+        derived_channel.setParent(self)
+        self._addSensorChannel(derived_channel)
+
+    def removeDerivedChannel(self, derived_channel: dc.DerivedChannel) -> None:
+        derived_channel.detach()
+        derived_channel.clear_samples()
+        self._removeSensorChannel(derived_channel)
+
+    # endregion
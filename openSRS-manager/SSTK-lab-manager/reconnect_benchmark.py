@@ -0,0 +1,164 @@
+"""Reconnect benchmark for the AthEngDCMk1 driver.
+
+    Connects AthEngDCMk1 drivers to loopback devices (drivers.LoopbackGattLink), records, and drops the links
+    repeatedly, keeping each device unreachable for an outage before it can be reached again. For every reconnect it
+    reports how long the link was down and how long the gap in the recorded data is, and checks that the channels and
+    the samples recorded before the drops were kept and that sampling resumed at the same rate.
+
+    Typical usage example (run from the SSTK-lab-manager directory, like run.py):
+    python reconnect_benchmark.py --drops 5 --interval 3 --outage-ms 400 --output reconnect.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+
+import SensorServiceItemModel as ssim
+import SensorServiceDriver as ssd
+from benchmark import summarize
+from drivers.AthEngDCMk1 import AthEngDCMk1
+from drivers.LoopbackGattLink import LoopbackGattLink
+
+
+class ReconnectBenchmark:
+    """Drives one benchmark session and collects its measurements.
+
+    Args:
+        model: SensorServiceItemModel the drivers are added to
+        devices: number of loopback devices
+        rate_hz: sampling rate of each device
+        drops: number of times each link is dropped
+        interval_s: time between drops
+        outage_ms: time each device stays unreachable after a drop
+        connect_ms: connection time of the loopback links
+        discovery_ms: service discovery time of the first connection of the loopback links
+    """
+
+    def __init__(self, model: ssim.SensorServiceItemModel, devices: int, rate_hz: float, drops: int,
+                 interval_s: float, outage_ms: int, connect_ms: int, discovery_ms: int):
+        self.__model = model
+        self.__rate_hz = rate_hz
+        self.__drops_left = drops
+        self.__outage_ms = outage_ms
+
+        self.__links: List[LoopbackGattLink] = []
+        self.__drivers: List[AthEngDCMk1] = []
+        for i in range(devices):
+            link = LoopbackGattLink(connect_ms=connect_ms, discovery_ms=discovery_ms, seed=i)
+            driver = AthEngDCMk1(LoopbackGattLink.deviceInfo(i), link=link, parent=model)
+            model.addServiceDriver(driver)
+            self.__links.append(link)
+            self.__drivers.append(driver)
+
+        self.__connect_start_s = time.perf_counter()
+        self.__connect_ms: List[float] = []
+        self.__samples_before_drop: List[int] = []
+        self.__channels_kept = True
+        self.__samples_kept = True
+
+        self.__dropTimer = QTimer()
+        self.__dropTimer.setInterval(int(interval_s * 1000))
+        self.__dropTimer.timeout.connect(self.__dropTimer_timeout)
+
+    def start(self) -> None:
+        for driver in self.__drivers:
+            driver.connectToDevice()
+        QTimer.singleShot(10, self.__waitReady)
+
+    def results(self) -> dict:
+        link_gaps_ms = [(restored - lost) / 1000. for d in self.__drivers for lost, restored, _ in d.reconnectGaps()]
+        data_gaps_ms = [gap / 1000. for d in self.__drivers for _, _, gap in d.reconnectGaps() if gap is not None]
+        return {
+            "first_connect_ms": summarize(self.__connect_ms),
+            "reconnects": sum(len(d.reconnectGaps()) for d in self.__drivers),
+            "link_gap_ms": summarize(link_gaps_ms),
+            "data_gap_ms": summarize(data_gaps_ms),
+            "frames_read": sum(link.framesSent() for link in self.__links),
+            "frames_lost_in_drops": sum(link.framesDropped() for link in self.__links),
+            "channels_kept": self.__channels_kept,
+            "samples_kept": self.__samples_kept,
+            "rate_restored": all(d.samplingRate() == self.__rate_hz for d in self.__drivers),
+        }
+
+    def __waitReady(self):
+        if any(d.driverState() != ssd.DriverState.ReadyState for d in self.__drivers):
+            QTimer.singleShot(10, self.__waitReady)
+            return
+
+        self.__connect_ms.append((time.perf_counter() - self.__connect_start_s) * 1000.)
+        for driver in self.__drivers:
+            driver.setSamplingRate(self.__rate_hz)
+        self.__model.startRecordingAllServices()
+        self.__dropTimer.start()
+
+    def __dropTimer_timeout(self):
+        if self.__drops_left == 0:
+            self.__finish()
+            return
+        self.__drops_left -= 1
+
+        self.__samples_before_drop = [len(d.sensorChannels()[0].sample_buffer) for d in self.__drivers]
+        for link in self.__links:
+            link.setReachable(False)
+            link.dropLink()
+        QTimer.singleShot(self.__outage_ms, lambda: [link.setReachable(True) for link in self.__links])
+
+    def __finish(self):
+        self.__dropTimer.stop()
+        self.__channels_kept = all(len(d.sensorChannels()) == AthEngDCMk1.NUM_CHANNELS and
+                                   d.driverState() == ssd.DriverState.ReadyState for d in self.__drivers)
+        self.__samples_kept = all(len(d.sensorChannels()[0].sample_buffer) > before
+                                  for d, before in zip(self.__drivers, self.__samples_before_drop))
+        self.__model.stopRecordingAllServices()
+        QApplication.instance().quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconnect benchmark of the AthEngDCMk1 driver on loopback devices.")
+    parser.add_argument("--devices", type=int, default=1, help="number of loopback devices (default: 1)")
+    parser.add_argument("--rate", type=float, default=100.0, help="sampling rate per device in Hz (default: 100)")
+    parser.add_argument("--drops", type=int, default=5, help="number of link drops (default: 5)")
+    parser.add_argument("--interval", type=float, default=3.0, help="seconds between drops (default: 3)")
+    parser.add_argument("--outage-ms", type=int, default=400,
+                        help="time each device stays unreachable after a drop in ms (default: 400)")
+    parser.add_argument("--connect-ms", type=int, default=50, help="loopback connection time in ms (default: 50)")
+    parser.add_argument("--discovery-ms", type=int, default=1500,
+                        help="loopback service discovery time of the first connection in ms (default: 1500)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    model = ssim.SensorServiceItemModel()
+    benchmark = ReconnectBenchmark(model, args.devices, args.rate, args.drops, args.interval, args.outage_ms,
+                                   args.connect_ms, args.discovery_ms)
+    QTimer.singleShot(0, benchmark.start)
+    app.exec_()
+
+    results = {"parameters": vars(args)}
+    results.update(benchmark.results())
+
+    for metric in ["first_connect_ms", "link_gap_ms", "data_gap_ms"]:
+        stats = results[metric]
+        if stats["count"] == 0:
+            print(f"{metric:>18}: none")
+            continue
+        print(f"{metric:>18}: mean {stats['mean']:8.1f}  p50 {stats['p50']:8.1f}  max {stats['max']:8.1f}  "
+              f"(n={stats['count']})")
+    for key in ["reconnects", "frames_read", "frames_lost_in_drops", "channels_kept", "samples_kept", "rate_restored"]:
+        print(f"{key:>18}: {results[key]}")
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
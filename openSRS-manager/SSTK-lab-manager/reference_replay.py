@@ -0,0 +1,96 @@
+"""Replays a recorded reference signal to a ReferenceStream, standing in for a motion capture bridge.
+
+    Reads joint angles from a MotionMonitor export (.exp) or from a CSV with a time index in its first column (for
+    example a preprocessed trial), and sends them in real time as UDP datagrams in the drivers.ReferenceStream format.
+    Samples are restamped onto the host clock starting now, optionally shifted by --delay-ms to simulate a reference
+    that is not aligned with the SRS channels.
+
+    Typical usage example (run from the SSTK-lab-manager directory, like run.py):
+    python reference_replay.py WALK01.exp --port 5005 --columns R_FLX R_IEV --delay-ms 120
+"""
+
+import argparse
+import json
+import socket
+import time
+
+import numpy as np
+import pandas as pd
+
+# MotionMonitor column names and the names used by the analysis scripts
+EXP_COLUMN_NAMES = {"L_Foot_Inversion": "L_IEV", "L_Foot_Flexion": "L_FLX", "R_Foot_Inversion": "R_IEV",
+                    "R_Foot_Flexion": "R_FLX"}
+
+
+def readExp(file_path: str) -> pd.DataFrame:
+    """Reads a MotionMonitor export into a DataFrame indexed by seconds since the start of the recording."""
+    with open(file_path) as exp_file:
+        header = [exp_file.readline() for _ in range(4)]
+    rate_hz = float(header[3].split("\t")[0])
+
+    data = pd.read_csv(file_path, delimiter="\t", skiprows=9, header=0, usecols=lambda x: x in EXP_COLUMN_NAMES)
+    data = data.rename(columns=EXP_COLUMN_NAMES)
+    data.index = np.arange(len(data)) / rate_hz
+    return data
+
+
+def readCsv(file_path: str) -> pd.DataFrame:
+    """Reads a CSV with a time index into a DataFrame indexed by seconds since the first row."""
+    data = pd.read_csv(file_path, header=0, index_col=0, parse_dates=True)
+    if isinstance(data.index, pd.DatetimeIndex):
+        elapsed_us = data.index.as_unit("us").asi8
+    else:  # Numeric index in microseconds, as exported by the lab manager
+        elapsed_us = data.index.to_numpy(dtype=np.int64)
+    data.index = (elapsed_us - elapsed_us[0]) / 1.E6
+    return data.select_dtypes(include="number")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded reference signal to a ReferenceStream over UDP.")
+    parser.add_argument("file", help="MotionMonitor export (.exp) or CSV with a time index")
+    parser.add_argument("--host", default="127.0.0.1", help="destination address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=5005, help="destination UDP port (default: 5005)")
+    parser.add_argument("--columns", nargs="+", help="columns to send (default: all)")
+    parser.add_argument("--batch", type=int, default=10, help="samples per datagram (default: 10)")
+    parser.add_argument("--delay-ms", type=float, default=0.0,
+                        help="offset added to the timestamps, simulating a misaligned reference (default: 0)")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed (default: 1)")
+    parser.add_argument("--loop", action="store_true", help="replay the file until interrupted")
+    args = parser.parse_args()
+
+    data = readExp(args.file) if args.file.lower().endswith(".exp") else readCsv(args.file)
+    if args.columns is not None:
+        data = data[args.columns]
+    data = data.dropna()
+    elapsed_s = data.index.to_numpy(dtype=np.float64) / args.speed
+    duration_s = elapsed_s[-1] + np.median(np.diff(elapsed_s))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    print(f"Replaying {len(data)} samples of {', '.join(data.columns)} to {args.host}:{args.port}...")
+
+    start_s = time.time()
+    start_perf_s = time.perf_counter()
+    try:
+        while True:
+            timestamps_us = np.round((start_s + elapsed_s + args.delay_ms / 1000.) * 1.E6).astype(np.int64)
+            for first in range(0, len(data), args.batch):
+                last = min(first + args.batch, len(data))
+                send_at_s = start_perf_s + elapsed_s[last - 1] - elapsed_s[0]
+                time.sleep(max(send_at_s - time.perf_counter(), 0.0))
+
+                message = {"timestamp_us": timestamps_us[first:last].tolist(),
+                           "values": {name: data[name].iloc[first:last].tolist() for name in data.columns}}
+                sock.sendto(json.dumps(message).encode(), (args.host, args.port))
+
+            if not args.loop:
+                break
+            start_s += duration_s
+            start_perf_s += duration_s
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Tests of DerivedChannel.compileExpression's expression validation.
+
+    Run from the SSTK-lab-manager directory:
+    python -m pytest test_DerivedChannel.py
+"""
+
+import numpy as np
+import pytest
+
+import DerivedChannel as dc
+
+
+class _Device:
+    def deviceAddress(self) -> str:
+        return "00:11:22:33:44:55"
+
+
+class _Channel:
+    """Stands in for a SensorChannel; compileExpression only uses its display name and device."""
+
+    def __init__(self, display_name: str):
+        self.display_name = display_name
+
+    def parent(self) -> _Device:
+        return _Device()
+
+
+CHANNELS = [_Channel("Channel 0"), _Channel("Channel 1")]
+
+
+def evaluate(expression: str, *values: np.ndarray) -> np.ndarray:
+    code, inputs = dc.compileExpression(expression, CHANNELS)
+    return eval(code, {"__builtins__": {}, **dc.EXPRESSION_FUNCTIONS}, {f"_in{i}": v for i, v in enumerate(values)})
+
+
+def test_small_constant_exponents_are_allowed():
+    values = np.array([1.0, 2.0, 3.0])
+    np.testing.assert_allclose(evaluate("{Channel 0} ** 2", values), values ** 2)
+    np.testing.assert_allclose(evaluate("{Channel 0} ** -0.5", values), values ** -0.5)
+    np.testing.assert_allclose(evaluate("({Channel 0} * 2) ** 8", values), (values * 2) ** 8)
+
+
+@pytest.mark.parametrize("expression", [
+    "{Channel 0} * 9**9**9**9",
+    "{Channel 0} * 2 ** 9",
+    "{Channel 0} ** -9",
+    "{Channel 0} ** {Channel 1}",
+    "{Channel 0} ** (1 + 1)",
+    "{Channel 0} ** True",
+])
+def test_large_or_non_constant_exponents_are_rejected(expression):
+    with pytest.raises(ValueError, match="exponent"):
+        dc.compileExpression(expression, CHANNELS)
+
+
+@pytest.mark.parametrize("expression", [
+    "{Channel 0} * (((((((((9**8)**8)**8)**8)**8)**8)**8)**8)**8)",
+    "{Channel 0} * 2 ** 8",
+    "{Channel 0} + (-3) ** 2",
+    "{Channel 0} * abs(9 ** 8) ** 8",
+])
+def test_constant_bases_are_rejected(expression):
+    with pytest.raises(ValueError, match="base"):
+        dc.compileExpression(expression, CHANNELS)
+
+
+def test_power_function_stays_in_numpy_arithmetic():
+    values = np.array([1.0, 2.0])
+    np.testing.assert_allclose(evaluate("power({Channel 0}, {Channel 1})", values, np.array([3.0, 10.0])),
+                               [1.0, 1024.0])
+    with np.errstate(over="ignore"):
+        assert np.isinf(evaluate("power({Channel 0}, 9) * power(9.0, 9 * 9 * 9 * 9)", values)).all()
@@ -0,0 +1,90 @@
+"""Tests of the AthEngDCMk1 driver's automatic reconnect, on a loopback device (drivers.LoopbackGattLink).
+
+    reconnect_benchmark.py measures the same reconnects at length; these tests check one drop quickly.
+
+    Run from the SSTK-lab-manager directory:
+    python -m pytest test_reconnect.py
+"""
+
+import os
+import time
+from typing import Callable
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+import SensorServiceDriver as ssd
+import SensorServiceItemModel as ssim
+from drivers.AthEngDCMk1 import AthEngDCMk1
+from drivers.LoopbackGattLink import LoopbackGattLink
+
+RATE_HZ = 100.0
+TIMEOUT_S = 10.0
+
+
+@pytest.fixture(scope="module")
+def app() -> QApplication:
+    return QApplication.instance() or QApplication([])
+
+
+def waitUntil(condition: Callable[[], bool], timeout_s: float = TIMEOUT_S) -> None:
+    """Runs the Qt event loop until condition() holds; fails the test after timeout_s."""
+    deadline = time.perf_counter() + timeout_s
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        QApplication.processEvents()
+        time.sleep(0.005)
+
+
+def waitFor(duration_s: float) -> None:
+    """Runs the Qt event loop for duration_s."""
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline:
+        QApplication.processEvents()
+        time.sleep(0.005)
+
+
+def test_channels_samples_and_rate_survive_a_dropped_link(app):
+    model = ssim.SensorServiceItemModel()
+    link = LoopbackGattLink(connect_ms=10, discovery_ms=50, seed=0)
+    driver = AthEngDCMk1(LoopbackGattLink.deviceInfo(0), link=link, parent=model)
+    model.addServiceDriver(driver)
+    driver.connectToDevice()
+    waitUntil(lambda: driver.driverState() == ssd.DriverState.ReadyState)
+
+    driver.setSamplingRate(RATE_HZ)
+    model.startRecordingAllServices()
+    channels = list(driver.sensorChannels())
+    waitUntil(lambda: len(channels[0].sample_buffer) >= 50)
+
+    # Keep the device unreachable for a while, so that the driver retries before it reconnects
+    counts_before = [len(s_ch.sample_buffer) for s_ch in channels]
+    first_before = [s_ch.sample_buffer.first()["timestamp_us"] for s_ch in channels]
+    link.setReachable(False)
+    link.dropLink()
+    assert driver.driverState() == ssd.DriverState.PreparingState
+    waitFor(0.2)
+    link.setReachable(True)
+    waitUntil(lambda: len(driver.reconnectGaps()) == 1 and driver.reconnectGaps()[0][2] is not None)
+    waitUntil(lambda: len(channels[0].sample_buffer) >= counts_before[0] + 50)
+
+    assert driver.driverState() == ssd.DriverState.ReadyState
+    assert driver.sensorChannels() == channels
+    assert all(len(s_ch.sample_buffer) > count for s_ch, count in zip(channels, counts_before))
+    assert [s_ch.sample_buffer.first()["timestamp_us"] for s_ch in channels] == first_before
+    assert driver.samplingRate() == RATE_HZ
+    assert link.value(AthEngDCMk1.SAMP_RATE) == AthEngDCMk1.samplingRateCode(RATE_HZ)
+
+    # The data resumes at the recorded rate: the samples after the gap are 1 / RATE_HZ apart
+    lost_us, restored_us, gap_us = driver.reconnectGaps()[0]
+    assert restored_us > lost_us and gap_us > 0
+    resumed = channels[0].sample_buffer.since(restored_us)
+    assert len(resumed) > 1
+    assert np.mean(np.diff(resumed["timestamp_us"])) == pytest.approx(1.E6 / RATE_HZ, rel=0.05)
+
+    # Stopping moves the samples into a recording session, so it comes after the checks above
+    model.stopRecordingAllServices()
+    driver.disconnectFromDevice()